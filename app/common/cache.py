@@ -0,0 +1,158 @@
+"""
+The module for caching data on disk across runs.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+
+def write_atomic(path, data):
+    """ Write a file atomically (i.e. readers never see a partial file). """
+
+    dir_path = os.path.dirname(path)
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _tree_size(path):
+    size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                size += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                pass
+    return size
+
+
+class DiskCache:
+    """ A size-bounded LRU cache of entries stored on disk.
+
+    Each entry is a directory identified by a key (e.g. a digest), which
+    can contain any number of files. The entries used less recently are
+    evicted when the size of the cache exceeds the maximum size.
+    """
+
+    # the file tracking the last access to an entry
+    _ACCESS_MARKER = '.access'
+
+    def __init__(self, cache_dir, namespace, max_size=None):
+        """
+        Args:
+            cache_dir (str): The root directory of the cache.
+            namespace (str): The sub-directory containing the entries.
+            max_size (int): The maximum size of the cache (bytes).
+                If omitted, the cache is unbounded.
+        """
+
+        self._path = os.path.join(os.path.abspath(cache_dir), namespace)
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(self._path, exist_ok=True)
+
+    @property
+    def path(self):
+        return self._path
+
+    def entry_path(self, key):
+        """ Returns the directory of an entry (created if missing) and mark
+        the entry as the most recently used. """
+
+        path = os.path.join(self._path, key)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, DiskCache._ACCESS_MARKER), 'a'):
+            os.utime(os.path.join(path, DiskCache._ACCESS_MARKER))
+        return path
+
+    def read(self, key, name):
+        """ Returns the content of a file of an entry, or None if the file
+        is not cached. """
+
+        path = os.path.join(self._path, key, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.entry_path(key)
+        return data
+
+    def write(self, key, name, data):
+        """ Store a file in an entry. """
+
+        write_atomic(os.path.join(self.entry_path(key), name), data)
+
+    def _entries(self):
+        """ Returns the entries as (last access, key) sorted from the least
+        recently used. """
+
+        entries = list()
+        for key in os.listdir(self._path):
+            marker = os.path.join(self._path, key, DiskCache._ACCESS_MARKER)
+            try:
+                entries.append((os.path.getmtime(marker), key))
+            except OSError:
+                entries.append((0, key))
+        return sorted(entries)
+
+    def _remove(self, key):
+        logger.debug('Evicting [{0}] from the cache [{1}]'.format(
+            key, self._path))
+        shutil.rmtree(os.path.join(self._path, key), ignore_errors=True)
+
+    def evict(self):
+        """ Evict the least recently used entries until the size of the
+        cache is within the maximum size. The most recently used entry is
+        never evicted. """
+
+        if self._max_size is None:
+            return
+
+        evict_caches([self], self._max_size)
+
+
+def evict_caches(caches, max_size):
+    """ Evict the least recently used entries of some caches (e.g. the
+    namespaces of the same cache directory) until their total size is
+    within a maximum size shared by all of them. The most recently used
+    entry of each cache is never evicted.
+
+    Args:
+        caches (list): The caches (DiskCache).
+        max_size (int): The maximum total size of the caches (bytes).
+    """
+
+    for cache in caches:
+        cache._lock.acquire()
+    try:
+        entries, size = list(), 0
+        for cache in caches:
+            cache_entries = cache._entries()
+            for access, key in cache_entries:
+                entry_size = _tree_size(os.path.join(cache.path, key))
+                size += entry_size
+                if key != cache_entries[-1][1]:
+                    entries.append((access, entry_size, cache, key))
+
+        for _, entry_size, cache, key in sorted(
+                entries, key=lambda entry: entry[:2]):
+            if size <= max_size:
+                break
+            cache._remove(key)
+            size -= entry_size
+    finally:
+        for cache in reversed(caches):
+            cache._lock.release()
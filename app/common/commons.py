@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 import zipfile
@@ -8,10 +9,58 @@ import getpass
 _BASE_ERROR_MSG = 'See logs for further details.'
 
 
-def unpack_archive(archive_path, output_path):
+def unpack_archive(archive, output_path):
+    """ Extract an archive.
 
-    with zipfile.ZipFile(archive_path, 'r') as archive:
+    Args:
+        archive: The path to the archive or an already opened ZipFile.
+        output_path (str): The path where the archive is extracted.
+    """
+
+    if isinstance(archive, zipfile.ZipFile):
         archive.extractall(output_path)
+    else:
+        with zipfile.ZipFile(archive, 'r') as archive:
+            archive.extractall(output_path)
+
+
+def digest_fileobj(fileobj, digest=None, chunk_size=65536):
+    """ Update a digest (default: SHA-256) with the content of a file
+    object (e.g. a member of a .CSAR archive). """
+
+    if digest is None:
+        digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest
+
+
+def digest_file(path, digest=None, chunk_size=65536):
+    """ Update a digest (default: SHA-256) with the content of a file. """
+
+    with open(path, 'rb') as f:
+        return digest_fileobj(f, digest=digest, chunk_size=chunk_size)
+
+
+def digest_tree(root_path, digest=None):
+    """ Update a digest (default: SHA-256) with the content of a directory.
+
+    Files are visited in a stable order, and both their path (relative to
+    the root) and their content contribute to the digest.
+    """
+
+    if digest is None:
+        digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(root_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            digest.update(
+                os.path.relpath(file_path, root_path).encode('utf-8'))
+            digest.update(b'\0')
+            digest_file(file_path, digest=digest)
+            digest.update(b'\0')
+    return digest
 
 
 @contextmanager
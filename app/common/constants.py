@@ -2,7 +2,16 @@ APP_REPOSITORY = 'https://github.com/matteobogo/toskose'
 
 DEFAULT_OUTPUT_PATH = 'toskose_out'
 
+# number of container nodes "toskosed" concurrently
+DEFAULT_TOSKOSING_JOBS = 1
+
+# maximum size of the cache of extracted .CSAR archives (bytes)
+DEFAULT_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+
 DEFAULT_TOSKOSE_CONFIG_FILENAME = 'toskose.yml'
+
+# the snapshot of the toskosed model (for incremental re-toskosing)
+DEFAULT_SNAPSHOT_FILENAME = 'toskose-snapshot.json'
 DEFAULT_TOSKOSE_CONFIG_SCHEMA_PATH = 'config_schema.json'
 
 # Docker Compose
@@ -20,6 +29,19 @@ DEFAULT_SUPERVISORD_LOG_LEVEL = 'INFO'
 DEFAULT_TOSKOSE_UNIT_BASE_IMAGE = 'diunipisocc/toskose-unit'
 DEFAULT_TOSKOSE_UNIT_BASE_TAG = 'latest'
 
+# the app's context of a unit is split in layers, from the least to the most
+# volatile (see Dockerfile-unit), each laid out as /toskose in the image
+DEFAULT_UNIT_ARTIFACTS_LAYER = 'layers/artifacts/'
+DEFAULT_UNIT_SCRIPTS_LAYER = 'layers/scripts/'
+DEFAULT_UNIT_CONFIG_LAYER = 'layers/config/'
+DEFAULT_UNIT_LAYERS = (
+    DEFAULT_UNIT_ARTIFACTS_LAYER,
+    DEFAULT_UNIT_SCRIPTS_LAYER,
+    DEFAULT_UNIT_CONFIG_LAYER,
+)
+DEFAULT_UNIT_APPS_DIR = 'apps/'
+DEFAULT_UNIT_CONFIG_DIR = 'supervisord/config/'
+
 DEFAULT_TOSKOSE_IMAGE_TAG = 'latest'
 
 port = DEFAULT_SUPERVISORD_INIT_PORT
@@ -74,6 +96,7 @@ DEFAULT_TOSKOSE_MANAGER_VOLUME_NAME = 'toskose-manager-volume'
 DEFAULT_MANAGER_CONFIG_DIR = 'config/'
 DEFAULT_MANAGER_MANIFEST_DIR = 'manifest/'
 DEFAULT_MANAGER_IMPORTS_DIR = 'imports/'
+DEFAULT_MANAGER_PLAN_FILENAME = 'plan.yml'
 
 DEFAULT_MANAGER_API = {
     'alias': DEFAULT_MANAGER_ALIAS,
@@ -81,4 +81,10 @@ class AppContextGenerationError(BaseToskoseException):
     """ Raised when the app context generation failed. """
 
     def __init__(self, message):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class PlanningError(BaseToskoseException):
+    """ Raised when no valid deployment plan exists for the application. """
+
+    def __init__(self, message):
+        super().__init__(message)
@@ -6,16 +6,22 @@ import os
 import copy
 
 import app.common.constants as constants
+from app.common.exception import ValidationError
 from app.common.logging import LoggingFacility
 from app.loader import Loader
 
 logger = LoggingFacility.get_instance().get_logger()
 
 
-def generate_image_name_interactive(autocomplete_data=None):
+def generate_image_name_interactive(autocomplete_data=None, interactive=True):
     """ Generate a full name [repository]/<user>/<name><:tag>
     for a Docker Image interactively.
 
+    Args:
+        autocomplete_data (dict): The data already available.
+        interactive (bool): Ask the user for the missing data. Otherwise,
+            a missing name is an error and a missing tag is "latest".
+
     Returns:
         full_name (str): The generated full name of the Docker Image.
         data: A dict containing data about the generated image name,
@@ -34,11 +40,16 @@ def generate_image_name_interactive(autocomplete_data=None):
         registry_password = autocomplete_data.get('registry_password')
 
     if full_name is None:
+        if not interactive:
+            logger.error('Missing the name of a toskosed image in the \
+                non-interactive mode.')
+            raise ValidationError('Missing the name of a toskosed image')
         while not full_name:
             full_name = input('Enter the [repository/]image-name: ')
 
     if tag is None:
-        tag = input('Enter the TAG name [ENTER for latest]: ')
+        tag = input('Enter the TAG name [ENTER for latest]: ') \
+            if interactive else None
         if not tag:
             logger.info('No tag was provided. "latest" will be used.')
             tag = 'latest'
@@ -56,7 +67,8 @@ def generate_image_name_interactive(autocomplete_data=None):
     }
 
 
-def generate_default_config(tosca_model, config_path=None, output_path=None):
+def generate_default_config(tosca_model, config_path=None, output_path=None,
+                            interactive=True):
     """ Generate a default toskose YAML configuration
     and dump it in a directory.
 
@@ -65,6 +77,8 @@ def generate_default_config(tosca_model, config_path=None, output_path=None):
         config_path: A path containing a toskose configuration.
         output_path (str): The path in which the generated configuration
             will be dumped.
+        interactive (bool): Ask the user for the missing data that cannot
+            be generated (e.g. the names of the toskosed images).
     """
 
     def _autocomplete_config(config, name, is_manager=False):
@@ -117,7 +131,8 @@ def generate_default_config(tosca_model, config_path=None, output_path=None):
 
         config.update({'docker':
                       generate_image_name_interactive(
-                        autocomplete_data=config['docker'])})
+                        autocomplete_data=config['docker'],
+                        interactive=interactive)})
 
     loader = Loader()
     config = dict()
@@ -2,17 +2,61 @@
 The module where the app's context is built.
 """
 
+import hashlib
+import io
 import os
 import shutil
+import tarfile
+import tempfile
 from itertools import zip_longest
 
+import ruamel.yaml
+
 import app.common.constants as constants
 from app.common.logging import LoggingFacility
-from app.supervisord.configurator import build_config
+from app.supervisord.configurator import (DEFAULT_CONFIG_NAME, build_config,
+                                          generate_config)
 from app.tosca.model.artifacts import File
+from app.tosca.planner import dump_plan, generate_plan
 
 logger = LoggingFacility.get_instance().get_logger()
 
+_DOCKERIGNORE = '.dockerignore'
+
+# the apps are writable by the programs run by supervisord (any user)
+_APPS_MODE = 0o777
+
+# the modification time of the entries of the streamed contexts, so that
+# the same content always produces the same layers
+_CONTEXT_MTIME = 0
+
+
+def _unit_path(layer, *paths):
+    """ Returns a path of the app's context of a unit, within a layer
+    (e.g. constants.DEFAULT_UNIT_SCRIPTS_LAYER). """
+
+    return os.path.join(layer.rstrip('/'), *paths)
+
+
+def _entry_mode(path, source):
+    """ Returns the permissions of an entry of an app's context, which are
+    preserved in the image (i.e. no further chmod is needed). """
+
+    if any(_within(path, _unit_path(layer, constants.DEFAULT_UNIT_APPS_DIR))
+           for layer in constants.DEFAULT_UNIT_LAYERS):
+        return _APPS_MODE
+    if source is None:
+        return 0o755
+    if isinstance(source, bytes):
+        return 0o644
+    return 0o755
+
+
+def _within(path, dir_path):
+    path = path.replace(os.sep, '/')
+    dir_path = dir_path.rstrip('/')
+    return path == dir_path or path.startswith(dir_path + '/')
+
 
 def multi_copy(srcs, dsts, make_srcs=False, make_dsts=True, fixed_head=False):
     """ copying multiple paths between each other
@@ -75,32 +119,93 @@ def _build_manager_context(context_path, manifests=None,
     multi_copy(imports, imports_dirs)
 
 
-def _build_unit_context(context_path, container):
+def _fetch(csar, path):
+    """ Make sure a file referenced by the TOSCA model is available on disk,
+    extracting it from the .CSAR archive if necessary. """
+
+    if csar is not None:
+        csar.fetch(path)
+    return path
+
+
+def _unit_context_layout(container):
+    """ Generate the layout of the app's context of a container node.
+
+    Each entry is a tuple (path, source), where the path is relative to the
+    container's context and the source is either None (a directory), the
+    path of a file referenced by the TOSCA model or the content (bytes)
+    of a generated file.
+
+    The content is split in layers, from the least to the most volatile
+    (the artifacts, then the scripts and the logs), so that a change of a
+    script doesn't invalidate the cached layer of the artifacts. Within its
+    layer, each entry is laid out at its final path in /toskose (e.g.
+    layers/scripts/apps/<component_name>/scripts), so that each layer is
+    copied as it is. The supervisord configuration is the last layer
+    (see build_app_context_archives).
+    """
+
+    apps_dir = constants.DEFAULT_UNIT_APPS_DIR.rstrip('/')
+    artifacts_layer = constants.DEFAULT_UNIT_ARTIFACTS_LAYER
+    scripts_layer = constants.DEFAULT_UNIT_SCRIPTS_LAYER
+
+    # the layers are copied even if empty
+    yield os.path.dirname(_unit_path(artifacts_layer)), None
+    for layer in (artifacts_layer, scripts_layer):
+        yield _unit_path(layer), None
+        yield _unit_path(layer, apps_dir), None
 
     # searching the software nodes hosted on the current container
     # note: toskose-manager node doesn't host any sw node
     for software in container.hosted:
-        software_dir = os.path.join(context_path, software.name)
-
-        # generate hosted component root dir
-        # /<component_name>
-        # /toskose
-        # in the initializer script, during the "toskoserization"
-        # of the new images
 
-        # copy artifacts
+        # artifacts
+        # /toskose/apps/<component_name>/artifacts
+        software_dir = _unit_path(artifacts_layer, apps_dir, software.name)
+        yield software_dir, None
         artifacts_dir = os.path.join(software_dir, 'artifacts')
-        os.makedirs(artifacts_dir)
+        yield artifacts_dir, None
         for artifact in software.artifacts:
-            shutil.copy2(
-                artifact.file_path,
-                os.path.join(
-                    artifacts_dir,
-                    os.path.basename(artifact.file_path)))
-
-        # copy scripts (lifecycle operations)
+            yield os.path.join(
+                artifacts_dir,
+                os.path.basename(artifact.file_path)), artifact.file_path
+
+        # scripts (lifecycle operations)
+        # /toskose/apps/<component_name>/scripts
+        software_dir = _unit_path(scripts_layer, apps_dir, software.name)
+        yield software_dir, None
         interfaces_dir = os.path.join(software_dir, 'scripts')
-        os.makedirs(interfaces_dir)
+        yield interfaces_dir, None
+        for _, inter_group_content in software.interfaces.items():
+            # multiple interfaces groups can co-exists, not only the "standard"
+            for _, interface_content in inter_group_content.items():
+                script_path = interface_content['cmd'].file_path
+                yield os.path.join(
+                    interfaces_dir,
+                    os.path.basename(script_path)), script_path
+
+        # logs
+        logs_dir = os.path.join(software_dir, 'logs')
+        yield logs_dir, None
+        yield os.path.join(logs_dir, '{0}.log'.format(software.name)), b''
+
+
+def _unit_config_dirs():
+    """ Generate the directories of the supervisord configuration layer,
+    the last one containing the configuration file. """
+
+    config_dir = _unit_path(constants.DEFAULT_UNIT_CONFIG_LAYER)
+    yield config_dir
+    for name in constants.DEFAULT_UNIT_CONFIG_DIR.rstrip('/').split('/'):
+        config_dir = os.path.join(config_dir, name)
+        yield config_dir
+
+
+def _add_interfaces_envs(container):
+    """ Add the inputs of the lifecycle operations of the software nodes
+    hosted on a container node as env variables of the container. """
+
+    for software in container.hosted:
 
         # e.g.
         # interfaces:
@@ -112,16 +217,9 @@ def _build_unit_context(context_path, container):
         #         branch: { get_input: api_branch } # function
 
         for _, inter_group_content in software.interfaces.items():
-            # multiple interfaces groups can co-exists, not only the "standard"
             for interface_name, interface_content in \
                     inter_group_content.items():
 
-                shutil.copy2(
-                    interface_content['cmd'].file_path,
-                    os.path.join(
-                        interfaces_dir,
-                        os.path.basename(interface_content['cmd'].file_path)))
-
                 # add interface's inputs name:path as an env variable
                 if 'inputs' in interface_content:
                     for k, v in interface_content['inputs'].items():
@@ -139,18 +237,239 @@ def _build_unit_context(context_path, container):
 
                         container.add_env('INPUT_{}'.format(k.upper()), v)
 
-        # initialize logs
-        logger.debug('Initializing logs for component [{0}] \
-            hosted on container [{1}]'.format(
-            software.name,
-            container.name))
-        logs_path = os.path.join(software_dir, 'logs')
-        log_name = '{0}.log'.format(software.name)
-        os.makedirs(logs_path)
-        open(os.path.join(logs_path, log_name), 'w').close
 
+def add_interfaces_envs(tosca_model):
+    """ Add the inputs of the lifecycle operations as env variables of
+    every container node hosting software nodes, whether its app's context
+    is built or not (e.g. unaffected by the changes of the app).
 
-def build_app_context(context_path, tosca_model):
+    Args:
+        - tosca_model (object): The model representing the Tosca application.
+    """
+
+    for container in tosca_model.containers:
+        if not container.is_manager:
+            _add_interfaces_envs(container)
+
+
+def _manager_plan(tosca_model):
+    """ Returns the deployment plan of the app, as read by the manager. """
+
+    return ruamel.yaml.safe_dump(
+        dump_plan(generate_plan(tosca_model)),
+        default_flow_style=False).encode('utf-8')
+
+
+def _manager_context_layout(tosca_model):
+    """ Generate the layout of the app's context of the toskose-manager.
+    (see _unit_context_layout) """
+
+    yield os.path.join(
+        constants.DEFAULT_MANAGER_CONFIG_DIR,
+        constants.DEFAULT_MANAGER_PLAN_FILENAME), _manager_plan(tosca_model)
+
+    imports_dir = os.path.join(
+        constants.DEFAULT_MANAGER_MANIFEST_DIR,
+        constants.DEFAULT_MANAGER_IMPORTS_DIR)
+    for path, dir_path in [
+            (tosca_model.toskose_config_path,
+             constants.DEFAULT_MANAGER_CONFIG_DIR),
+            (tosca_model.manifest_path,
+             constants.DEFAULT_MANAGER_MANIFEST_DIR)] + \
+            [(path, imports_dir)
+             for entry in tosca_model.imports for path in entry.values()]:
+        yield os.path.join(dir_path, os.path.basename(path)), path
+
+
+def _build_unit_context(context_path, container, csar=None):
+
+    for entry, source in _unit_context_layout(container):
+        path = os.path.join(context_path, entry)
+        if source is None:
+            os.makedirs(path)
+        elif isinstance(source, bytes):
+            with open(path, 'wb') as f:
+                f.write(source)
+        else:
+            shutil.copy2(_fetch(csar, source), path)
+        os.chmod(path, _entry_mode(entry, source))
+        logger.debug('Added [{0}] in [{1}]'.format(
+            os.path.basename(path), context_path))
+
+    _add_interfaces_envs(container)
+
+
+class _DigestReader:
+    """ A file object updating a digest with the data read from it. """
+
+    def __init__(self, fileobj, digest):
+        self._fileobj = fileobj
+        self._digest = digest
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        return data
+
+
+class BuildContext:
+    """ The app's context of a container node, streamed to the container
+    runtime engine as a tar archive.
+
+    The tar archive is assembled in a single pass: the files referenced by
+    the TOSCA model are read from the .CSAR archive (or from the disk)
+    and the generated files (e.g. supervisord.conf, logs) from memory,
+    without copying anything in temporary directories. The archive itself
+    is the only copy of the context on disk (a temporary file).
+    """
+
+    # the name of the template dockerfile within the archive
+    DOCKERFILE = '.toskose.dockerfile'
+
+    def __init__(self, name, csar=None):
+        """
+        Args:
+            name (str): The name of the container node.
+            csar (object): The .CSAR archive (CsarArchive) containing the
+                files referenced by the TOSCA model.
+        """
+
+        self.name = name
+        self._csar = csar
+        self._entries = []
+
+    def add(self, path, source):
+        """ Add an entry to the context (see _unit_context_layout). """
+
+        self._entries.append((path, source))
+
+    def _open(self, source):
+        """ Open a file referenced by the TOSCA model, reading it from the
+        .CSAR archive, if it is contained in it. """
+
+        member = self._csar.find_member(source) \
+            if self._csar is not None else None
+        if member is not None:
+            return self._csar.archive.getinfo(member).file_size, \
+                self._csar.archive.open(member)
+        return os.path.getsize(source), open(source, 'rb')
+
+    def archive(self, dockerfile, fileobj=None):
+        """ Assemble the context as a tar archive.
+
+        Args:
+            dockerfile (str): The path of the template dockerfile, which is
+                added to the archive. (see BuildContext.DOCKERFILE)
+            fileobj (object): The file object in which the archive is
+                written. If omitted, a temporary file is used, i.e. the
+                context is copied on disk exactly once (a spooled file
+                would be rolled over to disk anyway, as the Docker client
+                asks for its fileno() to compute its length).
+
+        Returns:
+            The file object containing the archive (rewinded) and the
+            SHA-256 digest of the context content.
+        """
+
+        if fileobj is None:
+            fileobj = tempfile.TemporaryFile()
+
+        # the template dockerfile is not copied in the image
+        dockerignore = '{0}\n{1}\n'.format(
+            BuildContext.DOCKERFILE, _DOCKERIGNORE).encode('utf-8')
+        entries = self._entries + [
+            (BuildContext.DOCKERFILE, dockerfile),
+            (_DOCKERIGNORE, dockerignore),
+        ]
+
+        digest = hashlib.sha256()
+        with tarfile.open(fileobj=fileobj, mode='w') as tar:
+            for path, source in entries:
+                info = tarfile.TarInfo(path.replace(os.sep, '/'))
+                info.mtime = _CONTEXT_MTIME
+                digest.update(info.name.encode('utf-8'))
+                digest.update(b'\0')
+
+                info.mode = _entry_mode(path, source)
+                if source is None:
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                elif isinstance(source, bytes):
+                    info.size = len(source)
+                    digest.update(source)
+                    tar.addfile(info, io.BytesIO(source))
+                else:
+                    info.size, f = self._open(source)
+                    with f:
+                        tar.addfile(info, _DigestReader(f, digest))
+                digest.update(b'\0')
+
+        fileobj.seek(0)
+        logger.debug('Assembled the app\'s context of [{}]'.format(
+            self.name))
+        return fileobj, digest.hexdigest()
+
+
+def build_app_context_archives(tosca_model, csar=None, containers=None):
+    """
+    Generate the app's context of each container node as a BuildContext,
+    which is streamed to the container runtime engine.
+
+    The layout of each context is the same generated by build_app_context.
+
+    Args:
+        - tosca_model (object): The model representing the Tosca application.
+        - csar (object): The .CSAR archive (CsarArchive) of the application.
+        - containers (set): The names of the container nodes whose context
+            is generated. If omitted, all the container nodes.
+
+    Returns:
+        contexts: A dict containing the BuildContext of each container node,
+            as container name => BuildContext.
+    """
+
+    if tosca_model is None:
+        raise TypeError('The TOSCA model must be provided.')
+
+    logger.debug('Building [{0}] app context'.format(tosca_model.name))
+
+    contexts = dict()
+    for container in tosca_model.containers:
+        if containers is not None and container.name not in containers:
+            continue
+
+        context = BuildContext(container.name, csar=csar)
+
+        # toskose-manager container
+        if container.is_manager:
+            layout = _manager_context_layout(tosca_model)
+        else:
+            layout = _unit_context_layout(container)
+
+        for path, source in layout:
+            context.add(path, source)
+
+        if not container.is_manager:
+            _add_interfaces_envs(container)
+
+            # generate the Supervisord's configuration file
+            config = io.StringIO()
+            generate_config(container).write(config)
+            for config_dir in _unit_config_dirs():
+                context.add(config_dir, None)
+            context.add(
+                os.path.join(config_dir, DEFAULT_CONFIG_NAME),
+                config.getvalue().encode('utf-8'))
+
+            logger.debug('Generated supervisord.conf for \
+                container node [{}]'.format(container.name))
+
+        contexts[container.name] = context
+
+    return contexts
+
+
+def build_app_context(context_path, tosca_model, csar=None):
     """
     Generate the app's context.
 
@@ -158,25 +477,41 @@ def build_app_context(context_path, tosca_model):
     by a container runtime engine.
     (e.g. Docker) for building the "toskosed" images.
 
-    An example of an app's context for a TOSCA-based application:
+    An example of an app's context for a TOSCA-based application
+    (where the content of each unit is split in layers, each laid out
+    as /toskose in the image):
 
     /
-    --/<component_name>
-    --/...
-    --/<component_name>
-    --/toskose
-    ----/apps
-    ------/<component_name>
-    --------/<artifacts>          (artifacts associated to the component)
-    --------/<scripts>            (scripts for the lifecycle operations)
-    --------/<logs>               (logs associated to the component)
-    ------/...
-    ------/<component_name>
-    ----/supervisord
-    ------/bundle                 (supervisord exec + interpreter)
-    ------/config
-    --------/supervisord.conf     (the supervisord configuration)
-    ------/logs                   (supervisord logs)
+    --/layers
+    ----/artifacts
+    ------/apps
+    --------/<component_name>
+    ----------/<artifacts>        (artifacts associated to the component)
+    --------/...
+    ----/scripts
+    ------/apps
+    --------/<component_name>
+    ----------/<scripts>          (scripts for the lifecycle operations)
+    ----------/<logs>             (logs associated to the component)
+    --------/...
+    ----/config
+    ------/supervisord
+    --------/config
+    ----------/supervisord.conf   (the supervisord configuration)
+
+    i.e. in the image:
+
+    /toskose
+    --/apps
+    ----/<component_name>
+    ------/<artifacts>
+    ------/<scripts>
+    ------/<logs>
+    --/supervisord
+    ----/bundle                   (supervisord exec + interpreter)
+    ----/config
+    ------/supervisord.conf
+    ----/logs                     (supervisord logs)
 
     Note:   the structure above will be "merged" during the docker build
             process with a base structure already present in the toskose-unit
@@ -191,6 +526,9 @@ def build_app_context(context_path, tosca_model):
         - context_path (str): The path in which the docker's app context
             will be placed.
         - tosca_model (object): The model representing the Tosca application.
+        - csar (object): The .CSAR archive (CsarArchive) of the application.
+            If given, artifacts and scripts are extracted from the archive
+            only when they are copied in the app's context.
     """
 
     if not os.path.exists(context_path):
@@ -224,16 +562,26 @@ def build_app_context(context_path, tosca_model):
                     [list(entry.values()) for entry in tosca_model.imports],
                     [])
             )
+
+            # the deployment plan, run by the manager
+            with open(os.path.join(
+                    node_dir,
+                    constants.DEFAULT_MANAGER_CONFIG_DIR,
+                    constants.DEFAULT_MANAGER_PLAN_FILENAME), 'wb') as f:
+                f.write(_manager_plan(tosca_model))
         else:
             _build_unit_context(
                 context_path=node_dir,
-                container=container
+                container=container,
+                csar=csar
             )
 
             # generate the Supervisord's configuration file
+            config_dir = os.path.join(node_dir, list(_unit_config_dirs())[-1])
+            os.makedirs(config_dir)
             build_config(
                 container=container,
-                context_path=node_dir)
+                context_path=config_dir)
 
             logger.debug('Generated supervisord.conf for \
                 container node [{}]'.format(container.name))
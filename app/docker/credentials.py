@@ -0,0 +1,214 @@
+"""
+The module for providing the credentials of Docker Registries.
+
+The credentials of a registry are looked up (once per session) in:
+    1. the toskose configuration (the registry_password of the toskosed
+       images, where the user is the one of the image name);
+    2. the environment variables TOSKOSE_REGISTRY_USERNAME and
+       TOSKOSE_REGISTRY_PASSWORD, for the registry TOSKOSE_REGISTRY only
+       (e.g. docker.io or registry.example.com:5000);
+    3. the Docker configuration (config.json), including the credential
+       helpers/stores.
+The user is asked for them only when the registry denies the access, and
+only in the interactive mode, otherwise the operation fails fast. The user
+is asked once per registry, even by concurrent operations.
+"""
+
+import os
+import threading
+
+from docker import auth as docker_auth
+from docker.errors import DockerException
+
+from app.common.commons import (CommonErrorMessages, create_auth,
+                                create_auth_interactive)
+from app.common.exception import (DockerAuthenticationFailedError,
+                                  OperationAbortedByUser)
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+ENV_REGISTRY = 'TOSKOSE_REGISTRY'
+ENV_REGISTRY_USERNAME = 'TOSKOSE_REGISTRY_USERNAME'
+ENV_REGISTRY_PASSWORD = 'TOSKOSE_REGISTRY_PASSWORD'
+
+
+def registry_of(image):
+    """ Returns the registry hosting an image (e.g. 'docker.io'). """
+
+    registry, _ = docker_auth.resolve_repository_name(image)
+    return registry
+
+
+class CredentialProvider:
+    """ The credentials of the Docker Registries, cached per registry for
+    the session. """
+
+    def __init__(self, interactive=True, environ=None,
+                 docker_config_path=None):
+        """
+        Args:
+            interactive (bool): Ask the user for the credentials denied by
+                a registry. Otherwise, the denied access is an error.
+            environ (dict): The environment variables (default: os.environ).
+            docker_config_path (str): The path to the Docker configuration
+                (default: the Docker client's one).
+        """
+
+        self._interactive = interactive
+        self._environ = os.environ if environ is None else environ
+        self._docker_config_path = docker_config_path
+        self._docker_config = None
+        self._configured = dict()
+        self._credentials = dict()
+        self._confirmed = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def interactive(self):
+        return self._interactive
+
+    def configure(self, image, password):
+        """ Set the password of the registry hosting an image, where the
+        user is the one of the image name (e.g. user/name).
+
+        Args:
+            image (str): The name of the image.
+            password (str): The password for the Docker Registry.
+        """
+
+        registry, repository = docker_auth.resolve_repository_name(image)
+        if '/' not in repository:
+            logger.warning('Cannot detect the user of [{0}]: its registry \
+                password is ignored.'.format(image))
+            return
+        with self._lock:
+            self._configured[registry] = create_auth(
+                repository.split('/')[0], password)
+            self._credentials.pop(registry, None)
+
+    def _from_environment(self, registry):
+        username = self._environ.get(ENV_REGISTRY_USERNAME)
+        password = self._environ.get(ENV_REGISTRY_PASSWORD)
+        if not username or not password:
+            return None
+        scope = self._environ.get(ENV_REGISTRY)
+        if not scope:
+            logger.warning('Ignoring the credentials of [{0}], as {1} is \
+                not set'.format(username, ENV_REGISTRY))
+            return None
+        # the credentials are never sent to other registries
+        # (e.g. pulling public images from the Docker Hub)
+        scope = docker_auth.resolve_index_name(
+            docker_auth.convert_to_hostname(scope))
+        if scope != registry:
+            return None
+        return create_auth(username, password)
+
+    def _from_docker_config(self, registry):
+        try:
+            if self._docker_config is None:
+                self._docker_config = docker_auth.load_config(
+                    config_path=self._docker_config_path)
+            found = docker_auth.resolve_authconfig(
+                self._docker_config, registry=registry)
+        except DockerException as err:
+            logger.warning('Failed to read the Docker credentials of \
+                [{0}]: {1}'.format(registry, err))
+            return None
+        if not found:
+            return None
+        # the keys are capitalized by the credential stores
+        found = {key.lower(): value for key, value in found.items()}
+        if not found.get('username'):
+            return None
+        return create_auth(found['username'], found.get('password'))
+
+    def credentials(self, image):
+        """ Returns the credentials for the registry hosting an image, or
+        None if there are none (i.e. anonymous access). The user is never
+        asked for them.
+
+        Args:
+            image (str): The name of the image.
+        """
+
+        registry = registry_of(image)
+        with self._lock:
+            if registry not in self._credentials:
+                found = self._configured.get(registry)
+                if found is None:
+                    found = self._from_environment(registry)
+                if found is None:
+                    found = self._from_docker_config(registry)
+                self._credentials[registry] = found
+                if found is not None:
+                    logger.debug('Using the credentials of [{0}] for \
+                        [{1}]'.format(found['username'], registry))
+            return self._credentials[registry]
+
+    def confirm(self, image, tag='latest'):
+        """ Ask the user to confirm an image that may require the
+        authentication to its registry (e.g. it may not exist). The user is
+        asked once per registry, even by concurrent operations, and the
+        answer holds for all the images of the registry.
+
+        Args:
+            image (str): The name of the image.
+            tag (str): The tag of the image (default: 'latest').
+
+        Raises:
+            OperationAbortedByUser: If the user aborts the operation.
+        """
+
+        registry = registry_of(image)
+        with self._lock:
+            if registry not in self._confirmed:
+                res = ''
+                while res not in ('YES', 'NO'):
+                    res = (input('[{0}:{1}] is correct? [Yes] Continue \
+                    [No] Abort\n'.format(image, tag))).upper()
+                self._confirmed[registry] = res == 'YES'
+
+            if not self._confirmed[registry]:
+                logger.error(
+                    'Docker image [{0}:{1}] cannot be found, the operation \
+                    is aborted by the user.\n(Hint: Check the TOSCA manifest.)'
+                    .format(image, tag))
+                raise OperationAbortedByUser(
+                    CommonErrorMessages._DEFAULT_OPERATION_ABORTING_ERROR_MSG)
+
+    def refresh(self, image, denied=None):
+        """ Returns new credentials for the registry hosting an image,
+        after the given ones have been denied. The user is asked for them
+        once, even when they are denied to concurrent operations.
+
+        Args:
+            image (str): The name of the image.
+            denied (dict): The credentials denied by the registry.
+
+        Raises:
+            DockerAuthenticationFailedError: If the credentials cannot be
+                asked (non-interactive mode).
+        """
+
+        registry = registry_of(image)
+        with self._lock:
+            current = self._credentials.get(registry)
+            if current is not None and current is not denied:
+                # already asked by another operation
+                return current
+            if not self._interactive:
+                logger.error('Access to [{0}] denied for [{1}] (no \
+                    valid credentials in the non-interactive mode)'.format(
+                        registry, image))
+                raise DockerAuthenticationFailedError(
+                    'Authentication to [{}] failed. Abort.'.format(registry))
+
+            logger.info('Authenticate with the Docker Repository \
+                [{}]..'.format(registry))
+            self._credentials[registry] = create_auth_interactive(
+                user_text='Enter the username: ',
+                pw_text='Enter the password: '
+            )
+            return self._credentials[registry]
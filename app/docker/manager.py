@@ -2,25 +2,35 @@
 The Docker Manager module for handling operations with the Docker Engine.
 """
 
+import hashlib
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future
 from enum import Enum, auto
 
 from docker import DockerClient
 from docker.errors import APIError, BuildError, ImageNotFound
 
 import app.common.constants as constants
-from app.common.commons import CommonErrorMessages, create_auth_interactive
+from app.common.commons import CommonErrorMessages, digest_file, digest_tree
 from app.common.exception import (DockerAuthenticationFailedError,
-                                  DockerOperationError, FatalError,
-                                  OperationAbortedByUser)
+                                  DockerOperationError, FatalError)
 from app.common.logging import LoggingFacility
+from app.docker.credentials import CredentialProvider
+from app.docker.pipeline import ToskosingStage, stage
+from app.docker.push import push_image
 
 logger = LoggingFacility.get_instance().get_logger()
 
 DOCKERFILE_TEMPLATES_PATH = 'dockerfiles'
 DOCKERFILE_TOSKOSE_UNIT_TEMPLATE = 'Dockerfile-unit'
 DOCKERFILE_TOSKOSE_MANAGER_TEMPLATE = 'Dockerfile-manager'
-MAX_PUSH_ATTEMPTS = 3
+# the lines of the build output reported on failure
+BUILD_LOG_TAIL = 20
+
+# the label storing the fingerprint of the sources of a "toskosed" image
+TOSKOSE_FINGERPRINT_LABEL = 'toskose.fingerprint'
 
 SUPPORTED_SHELLS = [
     '/bin/bash', '/bin/sh', '/bin/zsh',
@@ -75,13 +85,69 @@ def separate_full_image_name(full_name):
     return result
 
 
+class PullRegistry:
+    """ The images pulled during a session (e.g. a run of the
+    "toskosing" process), so that each image is pulled at most once, even
+    when it's shared by concurrent "toskosing" processes. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pulls = dict()
+
+    def pull(self, image, tag, pull):
+        """ Pull an image, unless it's already pulled (or being pulled).
+
+        Args:
+            image (str): The name of the image.
+            tag (str): The tag of the image.
+            pull (function): Pull the image, returning it.
+
+        Returns:
+            The pulled image (as returned by pull).
+        """
+
+        key = (image, tag)
+        with self._lock:
+            pulled = self._pulls.get(key)
+            owner = pulled is None
+            if owner:
+                pulled = self._pulls[key] = Future()
+
+        if owner:
+            try:
+                pulled.set_result(pull())
+            except Exception as err:
+                # the next requests try again
+                with self._lock:
+                    self._pulls.pop(key, None)
+                pulled.set_exception(err)
+        else:
+            logger.debug('[{0}:{1}] image already pulled'.format(image, tag))
+
+        return pulled.result()
+
+    def clear(self):
+        with self._lock:
+            self._pulls.clear()
+
+
 class DockerManager():
 
-    def __init__(self, docker_url=None, verbose=False):
+    def __init__(self, docker_url=None, verbose=False, credentials=None):
+        """
+        Args:
+            docker_url (str): The URL for connecting to the Docker Engine.
+            verbose (bool): Print the output of the building processes.
+            credentials (object): The provider of the Docker Registries'
+                credentials (default: an interactive CredentialProvider).
+        """
 
         self._client = DockerClient(base_url=docker_url)
         self._docker_url = docker_url
         self._verbose = verbose
+        self._pulls = PullRegistry()
+        self._credentials = credentials if credentials is not None \
+            else CredentialProvider()
 
         try:
             self._client.ping()
@@ -155,13 +221,59 @@ class DockerManager():
 
                 return ' '.join(commands)
 
-    def _pull_image_with_auth(self, image, tag):
+    def _local_image(self, image, tag):
+        """ Returns the local image if it's the same image of the remote
+        Docker Registry (i.e. the pull can be skipped), otherwise None.
+
+        Args:
+            image (str): The name of the image.
+            tag (str): The tag of the image.
+        """
 
+        full_name = '{0}:{1}'.format(image, tag)
         try:
-            return self._client.images.pull(image, tag)
-        except ImageNotFound:
-            # it should be an authentication error
-            return self._image_authentication(image, tag)
+            local = self._client.images.get(full_name)
+            remote = self._client.images.get_registry_data(full_name)
+        except (ImageNotFound, APIError) as err:
+            # e.g. missing image, authentication required, offline
+            logger.debug('Cannot compare [{0}] with the registry: {1}'.format(
+                full_name, err))
+            return None
+
+        digests = {
+            repo_digest.split('@', 1)[1]
+            for repo_digest in local.attrs.get('RepoDigests') or []
+            if '@' in repo_digest}
+        if remote.id in digests:
+            logger.info('[{0}] image is up to date (digest: {1})'.format(
+                full_name, remote.id))
+            return local
+        return None
+
+    def _pull(self, image, tag, pull):
+        """ Pull an image (once per session), unless the local image is
+        already up to date. """
+
+        def pull_once():
+            local = self._local_image(image, tag)
+            if local is not None:
+                return local
+            return pull()
+
+        return self._pulls.pull(image, tag, pull_once)
+
+    def _pull_image_with_auth(self, image, tag):
+
+        def pull():
+            try:
+                return self._client.images.pull(
+                    image, tag, auth_config=self._credentials.credentials(
+                        image))
+            except ImageNotFound:
+                # it should be an authentication error
+                return self._image_authentication(image, tag)
+
+        return self._pull(image, tag, pull)
 
     def _image_authentication(self, src_image, src_tag=None, auth=None):
         """ Handling Docker authentication if the image
@@ -178,27 +290,23 @@ class DockerManager():
 
         logger.warning('[{0}:{1}] image may not exist or authentication \
         is required'.format(src_image, src_tag))
-        res = ''
-        while res != 'YES':
-            res = (input('[{0}:{1}] is correct? [Yes] Continue \
-            [No] Abort\n'.format(src_image, src_tag))).upper()
-            if res == 'NO':
-                logger.error(
-                    'Docker image [{0}:{1}] cannot be found, the operation \
-                    is aborted by the user.\n(Hint: Check the TOSCA manifest.)'
-                    .format(src_image, src_tag))
-                raise OperationAbortedByUser(
-                    CommonErrorMessages._DEFAULT_OPERATION_ABORTING_ERROR_MSG)
+        if not self._credentials.interactive:
+            logger.error('Docker image [{0}:{1}] cannot be pulled in the \
+                non-interactive mode.\n(Hint: Check the TOSCA manifest and \
+                the credentials of the Docker Registry.)'.format(
+                    src_image, src_tag))
+            raise DockerAuthenticationFailedError(
+                'Authentication failed. Abort.')
+
+        if auth is None:
+            auth = self._credentials.credentials(src_image)
+        # asked once per registry, even by concurrent "toskosing" processes
+        self._credentials.confirm(src_image, src_tag)
 
         attempts = 3
         while attempts > 0:
-            logger.info('Authenticate with the Docker Repository..')
             try:
-                if auth is None:
-                    auth = create_auth_interactive(
-                        user_text='Enter the username: ',
-                        pw_text='Enter the password: '
-                    )
+                auth = self._credentials.refresh(src_image, denied=auth)
                 return self._client.images.pull(
                     src_image,
                     tag=src_tag,
@@ -208,7 +316,7 @@ class DockerManager():
 
             except (APIError) as err:
                 msg = str(err).upper()
-                if 'UNAUTHORIZED' or 'NOT FOUND' in msg:
+                if 'UNAUTHORIZED' in msg or 'NOT FOUND' in msg:
                     logger.info('Invalid username/password.')
                 else:
                     logger.exception(err)
@@ -226,77 +334,87 @@ class DockerManager():
             raise DockerAuthenticationFailedError(
                 'Authentication failed. Abort.')
 
-    def _push_image(self, image, tag=None, auth=None, attempts=0):
+    def _push_image(self, image, tag=None, auth=None):
         """ Push an image to a remote Docker Registry.
 
         Args:
             image (str): The name of the Docker Image to be pushed.
             tag (str): An optional tag for the Docker Image (default: 'latest')
             auth: An optional Dict for the authentication.
-            attempts (int): The number of unsuccessful authentication attempts.
         """
 
         if tag is None:
             tag = 'latest'
+        if auth is None:
+            auth = self._credentials.credentials(image)
 
-        if attempts == MAX_PUSH_ATTEMPTS:
-            err = 'Reached max attempts for pushing \
-            [{0}] with tag [{1}]'.format(
-                image, tag)
-            logger.error(err)
-            raise FatalError(err)
-
-        logger.info('Pushing [{0}] with tag [{1}]'.format(image, tag))
-
-        result = self._client.images.push(
+        return push_image(
+            self._client,
             image,
             tag=tag,
-            auth_config=auth,
-            stream=True,
-            decode=True
-        )
-
-        # Access Denied detection
-        for line in result:
-            # an error is occurred
-            if 'error' in line:
-                # access denied
-                if 'denied' or 'unauthorized' in line['error']:
-                    logger.info(
-                        'Access to the repository denied. \
-                        Authentication failed.')
-                    auth = create_auth_interactive()
-                    self._push_image(
-                        image,
-                        tag=tag,
-                        auth=auth,
-                        attempts=(attempts + 1))
-                else:
-                    logger.error(
-                        'Unknown error during push of [{0}]: {1}'.format(
-                            image, line['error']))
-                    raise FatalError(
-                        CommonErrorMessages._DEFAULT_FATAL_ERROR_MSG)
+            auth=auth,
+            authenticate=lambda denied: self._credentials.refresh(
+                image, denied=denied))
 
-        logger.info('Image [{0}] with tag [{1}] successfully pushed.'.format(
-            image, tag))
+    def _stream_build(self, events, name):
+        """ Consume the output of the building process as it arrives.
 
-    def _validate_build(self, build_logs):
-        """ Validate the output of the building process.
+        The progress of the build is logged (and printed in verbose mode)
+        line by line, while only the last BUILD_LOG_TAIL lines are kept
+        for reporting a failure. The build is abandoned at the first
+        error.
 
         Args:
-            build_logs (str): The output logs of a docker
-                image building process.
+            events (generator): The (decoded) events of a docker image
+                building process.
+            name (str): The name of the image being built (the prefix of
+                the progress lines).
+
+        Returns:
+            The ID of the built image.
         """
 
-        for log in build_logs:
-            if 'stream' in log and self._verbose:
-                print(log['stream'])
-            if 'error' in log:
-                logger.error('Error building the Docker Image:\
-                \n{}'.format(log['error']))
-                raise DockerOperationError('Failed to "toskosing" \
+        tail = deque(maxlen=BUILD_LOG_TAIL)
+        image_id = None
+        try:
+            for event in events:
+                if 'stream' in event:
+                    for line in event['stream'].splitlines():
+                        if not line.strip():
+                            continue
+                        tail.append(line)
+                        if line.startswith('Step '):
+                            logger.info('[{0}] {1}'.format(name, line))
+                        else:
+                            logger.debug('[{0}] {1}'.format(name, line))
+                        if self._verbose:
+                            print('[{0}] {1}'.format(name, line))
+
+                elif 'error' in event or 'errorDetail' in event:
+                    error = event.get('error') or \
+                        event['errorDetail'].get('message')
+                    logger.error('Error building the Docker Image [{0}]:\
+                    \n{1}\n{2}'.format(name, '\n'.join(tail), error))
+                    raise DockerOperationError('Failed to "toskosing" \
+                    the Docker Image. Abort.')
+
+                elif 'aux' in event:
+                    image_id = event['aux'].get('ID', image_id)
+
+                elif 'status' in event:
+                    # e.g. the pulling of the base images
+                    logger.debug('[{0}] {1}'.format(name, event['status']))
+        finally:
+            # stop consuming the output of an abandoned build
+            if hasattr(events, 'close'):
+                events.close()
+
+        if image_id is None:
+            logger.error('Error building the Docker Image [{0}]: no image \
+                was produced\n{1}'.format(name, '\n'.join(tail)))
+            raise DockerOperationError('Failed to "toskosing" \
                 the Docker Image. Abort.')
+        return image_id
 
     def _toskose_image_availability(self, toskose_image, toskose_tag='latest'):
         """ Check the availability of the official Docker Toskose image used
@@ -308,9 +426,12 @@ class DockerManager():
         """
 
         try:
-            _ = self._client.images.pull(
+            self._pull(
                 toskose_image,
-                tag=toskose_tag)
+                toskose_tag,
+                lambda: self._client.images.pull(
+                    toskose_image,
+                    tag=toskose_tag))
         except ImageNotFound:
             logger.error(
                 'Failed to retrieve the official Toskose image [{0}:{1}]. \
@@ -325,7 +446,8 @@ class DockerManager():
         """ Remove previous toskosed images.
 
         Note: docker rmi doesn't remove an image if there are multiple tags
-              referencing it.
+              referencing it. Its untagged parents are never removed, as
+              they are the layers cached for the next build.
 
         Args:
             image (str): The name of the Docker image.
@@ -355,7 +477,10 @@ class DockerManager():
 
             full_name = '{0}:{1}'.format(image, tag)
             if full_name in image_found.tags:
-                self._client.images.remove(image=full_name, force=True)
+                # the untagged parents (i.e. the cached layers of the
+                # previous build) are kept for the next build
+                self._client.images.remove(
+                    image=full_name, force=True, noprune=True)
                 logger.info('Removed [{0}] reference from [{1}] image'.format(
                     full_name, image))
                 try:
@@ -369,9 +494,69 @@ class DockerManager():
         except ImageNotFound:
             logger.info('No previous image found.')
 
+    def _toskosing_fingerprint(self, context_digest, build_args):
+        """ Compute the fingerprint of the sources of a "toskosed" image.
+
+        The fingerprint covers the build context (including the template
+        dockerfile) and the digests of the images given as build arguments
+        (i.e. the source image and the Toskose base image).
+
+        Args:
+            context_digest (str): The digest of the build context.
+            build_args (dict): The build arguments, as name => image.
+        """
+
+        digest = hashlib.sha256(context_digest.encode('utf-8'))
+        for name, image in sorted(build_args.items()):
+            try:
+                image = self._client.images.get(image).id
+            except (ImageNotFound, APIError):
+                logger.debug('Cannot inspect [{}] image'.format(image))
+            digest.update('{0}={1}'.format(name, image).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def _is_toskosed(self, image, tag, fingerprint):
+        """ Check if a local "toskosed" image matches the given fingerprint.
+
+        Args:
+            image (str): The name of the "toskosed" image.
+            tag (str): The tag of the "toskosed" image.
+            fingerprint (str): The fingerprint of the image sources.
+        """
+
+        try:
+            found = self._client.images.get('{0}:{1}'.format(image, tag))
+        except ImageNotFound:
+            return False
+
+        return found.labels.get(TOSKOSE_FINGERPRINT_LABEL) == fingerprint
+
+    def _build_toskosed(self, src_image, src_tag, dst_image, dst_tag,
+                        build_args, build_context, fingerprint, pipeline):
+        """ Build a "toskosed" image, labelled with its fingerprint. """
+
+        with stage(pipeline, ToskosingStage.BUILD, name=dst_image):
+            # TODO can be removed? is it really necessary?
+            self._remove_previous_toskosed(dst_image, dst_tag)
+            logger.info('Toskosing [{0}:{1}] image'.format(
+                src_image, src_tag))
+
+            # the build output is streamed, not buffered
+            events = self._client.api.build(
+                tag='{0}:{1}'.format(dst_image, dst_tag),
+                buildargs=build_args,
+                labels={TOSKOSE_FINGERPRINT_LABEL: fingerprint},
+                rm=True,    # remove intermediate containers
+                decode=True,
+                **build_context
+            )
+            self._stream_build(events, dst_image)
+
     def toskose_image(self, src_image, src_tag, dst_image, dst_tag, context,
                       process_type, app_name, toskose_dockerfile=None,
-                      toskose_image=None, toskose_tag=None, enable_push=True):
+                      toskose_image=None, toskose_tag=None, enable_push=True,
+                      pipeline=None):
         """  The process of "toskosing" the component(s) of a multi-component
             TOSCA-defined application.
 
@@ -402,7 +587,9 @@ class DockerManager():
             src_tag (str): The tag of the image to be "toskosed".
             dst_image (str): The name of the "toskosed" image.
             dst_tag (str): The tag of the "toskosed" image.
-            context (str): The path of the application context.
+            context (str|object): The path of the application context,
+                or the application context streamed by means of a
+                BuildContext.
             process_type (enum): The type of "toskosing" process.
                 [unit/manager/free]
             app_name (str): The name of the TOSCA application.
@@ -413,6 +600,9 @@ class DockerManager():
             toskose_tag (str): The tag of the Docker Toskose base-image.
             enable_push (bool): enable/disable pushing of the "toskosed" image.
                 (default: True)
+            pipeline (object): The pipeline bounding the concurrency of the
+                pull/build/push stages, shared among concurrent "toskosing"
+                processes. (default: None, stages are not bounded)
         """
 
         if toskose_dockerfile is not None:
@@ -459,41 +649,63 @@ class DockerManager():
             raise ValueError('Cannot recognize the "toskosing" process \
             {}'.format(process_type))
 
-        if toskose_image is not None:
-            self._toskose_image_availability(toskose_image, toskose_tag)
-
-        # Check if the original image exists and needs authentication
-        # to be fetched.
-        # note: docker client does not distinguish between authentication
-        # error or invalid image name (?)
-        logger.info('Pulling [{0}:{1}]'.format(src_image, src_tag))
-        self._pull_image_with_auth(src_image, src_tag)
+        with stage(pipeline, ToskosingStage.PULL, name=dst_image):
+            if toskose_image is not None:
+                self._toskose_image_availability(toskose_image, toskose_tag)
+
+            # Check if the original image exists and needs authentication
+            # to be fetched.
+            # note: docker client does not distinguish between authentication
+            # error or invalid image name (?)
+            logger.info('Pulling [{0}:{1}]'.format(src_image, src_tag))
+            self._pull_image_with_auth(src_image, src_tag)
+
+        build_args = {
+            'TOSCA_SRC_IMAGE': '{0}:{1}'.format(
+                src_image,
+                src_tag),
+            'TOSKOSE_BASE_IMG': '{0}:{1}'.format(
+                toskose_image,
+                toskose_tag)
+        }
+
+        # the app's context is either a directory or streamed
+        # by means of a BuildContext
+        if isinstance(context, str):
+            context_digest = digest_file(
+                toskose_dockerfile,
+                digest=digest_tree(context)).hexdigest()
+            build_context = {
+                'path': context,
+                'dockerfile': toskose_dockerfile,
+            }
+        else:
+            fileobj, context_digest = context.archive(toskose_dockerfile)
+            build_context = {
+                'fileobj': fileobj,
+                'custom_context': True,
+                'dockerfile': context.DOCKERFILE,
+            }
 
-        # TODO can be removed? is it really necessary?
-        self._remove_previous_toskosed(dst_image, dst_tag)
-        logger.info('Toskosing [{0}:{1}] image'.format(src_image, src_tag))
         try:
-
-            build_args = {
-                'TOSCA_SRC_IMAGE': '{0}:{1}'.format(
-                    src_image,
-                    src_tag),
-                'TOSKOSE_BASE_IMG': '{0}:{1}'.format(
-                    toskose_image,
-                    toskose_tag)
-            }
-            image, build_logs = self._client.images.build(
-                path=context,
-                tag='{0}:{1}'.format(dst_image, dst_tag),
-                buildargs=build_args,
-                dockerfile=toskose_dockerfile,
-                rm=True,    # remove intermediate containers
-            )
-            self._validate_build(build_logs)
+            # skip building the images already toskosed from the same
+            # sources. They are pushed anyway (if enabled), as a previous
+            # push may have failed (the registry skips the existing layers)
+            fingerprint = self._toskosing_fingerprint(
+                context_digest, build_args)
+            if self._is_toskosed(dst_image, dst_tag, fingerprint):
+                logger.info('[{0}:{1}] image is up to date \
+                    (fingerprint: {2}). Skipping build.'.format(
+                    dst_image, dst_tag, fingerprint))
+            else:
+                self._build_toskosed(
+                    src_image, src_tag, dst_image, dst_tag, build_args,
+                    build_context, fingerprint, pipeline)
 
             # push the "toskosed" image
             if enable_push:
-                self._push_image(dst_image, tag=dst_tag)
+                with stage(pipeline, ToskosingStage.PUSH, name=dst_image):
+                    self._push_image(dst_image, tag=dst_tag)
 
             logger.info(
                 '[{0}:{1}] image successfully toskosed in [{2}:{3}].'.format(
@@ -503,5 +715,11 @@ class DockerManager():
             logger.exception(err)
             raise DockerOperationError('Failed to build image')
 
+        finally:
+            if 'fileobj' in build_context:
+                build_context['fileobj'].close()
+
     def close(self):
+        # the next session pulls the images again (if needed)
+        self._pulls.clear()
         self._client.close()
@@ -0,0 +1,115 @@
+"""
+The module for pipelining the stages of concurrent "toskosing" processes.
+
+Each "toskosing" process consists of network-bound stages (e.g. pulling
+and pushing images) and daemon-bound stages (e.g. building images). The
+pipeline bounds the concurrency of each stage separately, so that a
+container can be pushed while another one is built and a third one is
+pulled.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from enum import Enum, auto
+from threading import BoundedSemaphore
+
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+
+class ToskosingStage(Enum):
+    PULL = auto()
+    BUILD = auto()
+    PUSH = auto()
+
+
+@contextmanager
+def _unbounded_stage():
+    yield
+
+
+def stage(pipeline, toskosing_stage, name=None):
+    """ Enter a stage of a "toskosing" process.
+
+    Args:
+        pipeline (object): The pipeline bounding the stage. If None,
+            the stage is not bounded.
+        toskosing_stage (enum): The stage to be entered.
+        name (str): The name of the process entering the stage.
+    """
+
+    if pipeline is None:
+        return _unbounded_stage()
+    return pipeline.stage(toskosing_stage, name=name)
+
+
+class StagePipeline:
+    """ A pool of workers running "toskosing" processes, where each stage
+    has its own concurrency limit. """
+
+    def __init__(self, workers, stage_limits=None):
+        """
+        Args:
+            workers (int): The number of processes running concurrently.
+            stage_limits (dict): The maximum number of processes allowed
+                in each stage (e.g. {ToskosingStage.BUILD: 2}). A missing
+                stage is bounded by the number of workers.
+        """
+
+        if workers < 1:
+            raise ValueError(
+                'The number of workers must be a positive integer')
+        if stage_limits is None:
+            stage_limits = dict()
+
+        self._workers = workers
+        self._semaphores = dict()
+        for toskosing_stage in ToskosingStage:
+            limit = stage_limits.get(toskosing_stage)
+            if limit is None:
+                limit = workers
+            if limit < 1:
+                raise ValueError(
+                    'The limit of the {} stage must be a positive \
+                    integer'.format(toskosing_stage.name))
+            self._semaphores[toskosing_stage] = BoundedSemaphore(limit)
+
+    @contextmanager
+    def stage(self, toskosing_stage, name=None):
+        """ Enter a stage, waiting until a slot of the stage is free. """
+
+        with self._semaphores[toskosing_stage]:
+            logger.debug('[{0}] entered the {1} stage'.format(
+                name, toskosing_stage.name))
+            yield
+
+    def run(self, processes):
+        """ Run the given processes concurrently.
+
+        Args:
+            processes (dict): The processes to be run, as name => callable.
+                Each callable receives the pipeline as the "pipeline"
+                keyword argument.
+
+        Returns:
+            failures: A dict containing the errors of the failed processes,
+                as name => exception.
+        """
+
+        failures = dict()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = {
+                executor.submit(process, pipeline=self): name
+                for name, process in processes.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as err:
+                    logger.error('Failed to toskose [{0}]: {1}'.format(
+                        name, err))
+                    failures[name] = err
+
+        return failures
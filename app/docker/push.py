@@ -0,0 +1,270 @@
+"""
+The module for pushing "toskosed" images to a Docker Registry.
+
+A push is retried when it fails for a transient reason (e.g. a registry
+temporarily unavailable or a connection reset), waiting an exponential
+backoff with jitter between the attempts, so that the concurrent pushes
+of a pipeline do not hit the registry all together. A retried push
+resumes from the layers already uploaded, as the registry skips them
+("Layer already exists"). An access denied asks for new credentials,
+while any other error aborts the push.
+"""
+
+import random
+import time
+from enum import Enum, auto
+
+from docker.errors import APIError
+from requests.exceptions import ConnectionError, Timeout
+
+from app.common.exception import (DockerAuthenticationFailedError,
+                                  DockerOperationError)
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+MAX_PUSH_ATTEMPTS = 5
+MAX_AUTH_ATTEMPTS = 3
+
+# the backoff between the attempts (seconds)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# the interval between the progress reports of a push (seconds)
+PROGRESS_INTERVAL = 5.0
+
+_AUTH_ERRORS = (
+    'denied', 'unauthorized', 'authentication required',
+)
+
+_TRANSIENT_ERRORS = (
+    'timeout', 'timed out', 'connection reset', 'connection refused',
+    'broken pipe', 'eof', 'toomanyrequests',
+    'too many requests', 'service unavailable', 'bad gateway',
+    'gateway timeout', 'internal server error', 'blob upload unknown',
+    'http status: 5', 'no such host', 'temporary failure',
+)
+
+_TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class PushErrorKind(Enum):
+    AUTHENTICATION = auto()
+    TRANSIENT = auto()
+    FATAL = auto()
+
+
+def classify_push_error(message):
+    """ Classify the error message reported by the Docker Engine during
+    a push.
+
+    Args:
+        message (str): The error message.
+
+    Returns:
+        The kind of the error (PushErrorKind).
+    """
+
+    message = (message or '').lower()
+    if any(error in message for error in _AUTH_ERRORS):
+        return PushErrorKind.AUTHENTICATION
+    if any(error in message for error in _TRANSIENT_ERRORS):
+        return PushErrorKind.TRANSIENT
+    return PushErrorKind.FATAL
+
+
+def classify_exception(err):
+    """ Classify an error raised by the Docker client during a push. """
+
+    if isinstance(err, (ConnectionError, Timeout)):
+        return PushErrorKind.TRANSIENT
+    if isinstance(err, APIError):
+        status_code = err.status_code
+        if status_code in (401, 403):
+            return PushErrorKind.AUTHENTICATION
+        if status_code in _TRANSIENT_STATUS_CODES:
+            return PushErrorKind.TRANSIENT
+        return classify_push_error(err.explanation or str(err))
+    return PushErrorKind.FATAL
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP, rnd=random):
+    """ Returns the delay before retrying a failed attempt, i.e. an
+    exponential backoff with full jitter.
+
+    Args:
+        attempt (int): The number of the failed attempt (starting from 0).
+        base (float): The delay of the first attempt (seconds).
+        cap (float): The maximum delay (seconds).
+        rnd (object): The source of randomness (default: random).
+    """
+
+    return rnd.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class PushProgress:
+    """ The progress of a push, i.e. the status of each layer and the
+    amount of data uploaded. """
+
+    def __init__(self, name, interval=PROGRESS_INTERVAL, clock=time.monotonic):
+        self.name = name
+        self.digest = None
+        self._interval = interval
+        self._clock = clock
+        self._start = clock()
+        self._last_report = self._start
+        self._layers = dict()
+        self._uploaded = dict()
+
+    @property
+    def layers(self):
+        """ The status of each layer, as layer => status. """
+        return dict(self._layers)
+
+    @property
+    def pushed(self):
+        """ The layers already in the registry. """
+        return sorted(
+            layer for layer, status in self._layers.items()
+            if status in ('Pushed', 'Layer already exists', 'Mounted from'))
+
+    @property
+    def uploaded(self):
+        """ The amount of data uploaded (bytes). """
+        return sum(self._uploaded.values())
+
+    def throughput(self):
+        """ The average upload throughput (bytes/second). """
+        elapsed = self._clock() - self._start
+        return self.uploaded / elapsed if elapsed > 0 else 0.0
+
+    def update(self, event):
+        """ Update the progress with an event of the push output. """
+
+        layer = event.get('id')
+        status = event.get('status')
+        if layer is not None and status is not None:
+            if status.startswith('Mounted from'):
+                status = 'Mounted from'
+            self._layers[layer] = status
+            current = (event.get('progressDetail') or {}).get('current')
+            if current is not None:
+                self._uploaded[layer] = max(
+                    current, self._uploaded.get(layer, 0))
+
+        aux = event.get('aux')
+        if aux is not None:
+            self.digest = aux.get('Digest', self.digest)
+
+        now = self._clock()
+        if now - self._last_report >= self._interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        logger.info('[{0}] {1}/{2} layers pushed, {3:.1f} MiB uploaded \
+({4:.2f} MiB/s)'.format(
+            self.name, len(self.pushed), len(self._layers),
+            self.uploaded / 2 ** 20, self.throughput() / 2 ** 20))
+
+
+def _push_once(client, image, tag, auth, progress):
+    """ Push an image, consuming the output as it arrives.
+
+    Returns:
+        None if the image is pushed, the error message otherwise.
+    """
+
+    result = client.images.push(
+        image,
+        tag=tag,
+        auth_config=auth,
+        stream=True,
+        decode=True
+    )
+    try:
+        for event in result:
+            if 'error' in event or 'errorDetail' in event:
+                return event.get('error') or \
+                    event['errorDetail'].get('message')
+            progress.update(event)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return None
+
+
+def push_image(client, image, tag='latest', auth=None, authenticate=None,
+               max_attempts=MAX_PUSH_ATTEMPTS, sleep=time.sleep,
+               rnd=random):
+    """ Push an image to a Docker Registry, retrying the transient
+    failures.
+
+    Args:
+        client (object): The Docker client.
+        image (str): The name of the image.
+        tag (str): The tag of the image (default: 'latest').
+        auth (dict): The credentials for the registry (optional).
+        authenticate (function): Returns new credentials, given the ones
+            denied by the registry. If None, an access denied aborts the
+            push.
+        max_attempts (int): The maximum number of attempts for the
+            transient failures.
+        sleep (function): Wait between the attempts (default: time.sleep).
+        rnd (object): The source of the jitter (default: random).
+
+    Returns:
+        The progress of the push (PushProgress).
+
+    Raises:
+        DockerAuthenticationFailedError: If the access to the registry is
+            denied.
+        DockerOperationError: If the push failed.
+    """
+
+    progress = PushProgress('{0}:{1}'.format(image, tag))
+    failures = auth_failures = 0
+    while True:
+        logger.info('Pushing [{0}] with tag [{1}]'.format(image, tag))
+        try:
+            error = _push_once(client, image, tag, auth, progress)
+        except (APIError, ConnectionError, Timeout) as err:
+            error, kind = str(err), classify_exception(err)
+        else:
+            if error is None:
+                progress.report()
+                logger.info(
+                    'Image [{0}] with tag [{1}] successfully pushed.'.format(
+                        image, tag))
+                return progress
+            kind = classify_push_error(error)
+
+        if kind == PushErrorKind.AUTHENTICATION:
+            auth_failures += 1
+            logger.info('Access to the repository denied for [{0}:{1}]: \
+                {2}'.format(image, tag, error))
+            if authenticate is None or auth_failures == MAX_AUTH_ATTEMPTS:
+                raise DockerAuthenticationFailedError(
+                    'Authentication failed pushing [{0}] with tag [{1}]'
+                    .format(image, tag))
+            auth = authenticate(auth)
+
+        elif kind == PushErrorKind.TRANSIENT:
+            failures += 1
+            if failures == max_attempts:
+                err = 'Reached max attempts for pushing [{0}] with tag \
+                    [{1}]: {2}'.format(image, tag, error)
+                logger.error(err)
+                raise DockerOperationError(err)
+            delay = backoff_delay(failures - 1, rnd=rnd)
+            logger.warning('Failed to push [{0}] with tag [{1}] ({2}), \
+                retrying in {3:.1f}s ({4} layers already pushed)'.format(
+                    image, tag, error, delay, len(progress.pushed)))
+            sleep(delay)
+
+        else:
+            logger.error('Unknown error during push of [{0}]: {1}'.format(
+                image, error))
+            raise DockerOperationError(
+                'Failed to push [{0}] with tag [{1}]: {2}'.format(
+                    image, tag, error))
@@ -1,4 +1,5 @@
 import click
+from app.docker.pipeline import ToskosingStage
 from app.toskose import Toskoserizator
 
 
@@ -21,6 +22,57 @@ from app.toskose import Toskoserizator
     is_flag=True,
     help='Enable pushing of Docker images.',
 )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of container nodes toskosed concurrently.',
+    show_default=True
+)
+@click.option(
+    '--pull-jobs',
+    type=click.IntRange(min=1),
+    help='The number of images pulled concurrently. [default: jobs]',
+)
+@click.option(
+    '--build-jobs',
+    type=click.IntRange(min=1),
+    help='The number of images built concurrently. [default: jobs]',
+)
+@click.option(
+    '--push-jobs',
+    type=click.IntRange(min=1),
+    help='The number of images pushed concurrently. [default: jobs]',
+)
+@click.option(
+    '--previous-snapshot',
+    type=click.Path(exists=True, dir_okay=False),
+    help='Toskose only the containers changed since the run that \
+generated this snapshot.',
+)
+@click.option(
+    '--cache-dir',
+    type=click.Path(file_okay=False),
+    help='The directory for caching extracted CSARs across runs.',
+)
+@click.option(
+    '--cache-max-size',
+    type=click.IntRange(min=1),
+    help='The maximum size of the whole cache directory (MB), shared by \
+the cached CSARs, definitions and models. [default: 1024]',
+)
+@click.option(
+    '--fast-parsing',
+    is_flag=True,
+    help='Validate the TOSCA manifest against the TosKer profile only \
+(instead of the full TOSCA validation).',
+)
+@click.option(
+    '--non-interactive',
+    is_flag=True,
+    help='Never ask for the missing data (e.g. the credentials of the \
+Docker Registries), failing instead.',
+)
 @click.option(
     '--docker-url',
     help='The URL for the Docker Engine.',
@@ -29,13 +81,24 @@ from app.toskose import Toskoserizator
 @click.option('--quiet', '-q', is_flag=True, help='Give less output.')
 @click.option('--debug', is_flag=True, help='Enable debug mode.')
 def cli(csar_path, config_path, output_path,
-        enable_push, docker_url, quiet, debug):
+        enable_push, jobs, pull_jobs, build_jobs, push_jobs,
+        previous_snapshot, cache_dir, cache_max_size, fast_parsing,
+        non_interactive, docker_url, quiet, debug):
     """
     A tool for translating a multi-component application defined
     using the TOSCA standardization into a Docker Compose format.
     """
 
-    tsk = Toskoserizator(debug=debug, quiet=quiet)
+    if cache_max_size is not None:
+        cache_max_size *= 1024 * 1024
+
+    tsk = Toskoserizator(
+        debug=debug,
+        quiet=quiet,
+        cache_dir=cache_dir,
+        cache_max_size=cache_max_size,
+        strict_parsing=not fast_parsing,
+        interactive=not non_interactive)
 
     if docker_url:
         tsk.docker_url = docker_url
@@ -44,5 +107,12 @@ def cli(csar_path, config_path, output_path,
         csar_path,
         config_path=config_path,
         output_path=output_path,
-        enable_push=enable_push
+        enable_push=enable_push,
+        jobs=jobs,
+        stage_limits={
+            ToskosingStage.PULL: pull_jobs,
+            ToskosingStage.BUILD: build_jobs,
+            ToskosingStage.PUSH: push_jobs,
+        },
+        previous_snapshot=previous_snapshot
     )
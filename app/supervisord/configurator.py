@@ -111,6 +111,36 @@ def _build_hosted_config(config, container):
     return config
 
 
+def generate_config(container, template=None):
+    """
+    Generate the Supervisord configuration for managing the container.
+
+    Args:
+        container (object): The container node for which the conf
+            is generated.
+        template (str): The path to the Supervisord base template.
+            If omitted the default path is taken.
+
+    Returns:
+        config: The Supervisord configuration (ConfigParser).
+    """
+
+    if template is None:
+        template = os.path.join(
+            DEFAULT_TEMPLATE_DIR,
+            DEFAULT_SUPERVISORD_UNIT_TEMPLATE)
+
+    logger.debug('Building the supervisord.conf for [{0}] node'.format(
+        container.name))
+    config = ConfigParser()
+    config.read(template)
+
+    if container.hosted:
+        config = _build_hosted_config(config, container)
+
+    return config
+
+
 def build_config(container, context_path, config_name=None, template=None):
     """
     Build the Supervisord configuration file for managing the container.
@@ -133,18 +163,8 @@ def build_config(container, context_path, config_name=None, template=None):
                 context_path))
     if config_name is None:
         config_name = DEFAULT_CONFIG_NAME
-    if template is None:
-        template = os.path.join(
-            DEFAULT_TEMPLATE_DIR,
-            DEFAULT_SUPERVISORD_UNIT_TEMPLATE)
 
-    logger.debug('Building the supervisord.conf for [{0}] node'.format(
-        container.name))
-    config = ConfigParser()
-    config.read(template)
-
-    if container.hosted:
-        config = _build_hosted_config(config, container)
+    config = generate_config(container, template=template)
 
     config_path = os.path.join(context_path, config_name)
     with open(config_path, "w") as cfile:
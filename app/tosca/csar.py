@@ -0,0 +1,259 @@
+"""
+The module for accessing the content of a .CSAR archive.
+
+The content of the archive is extracted on demand: the entry definition
+and its imports are extracted up front (they are needed for parsing the
+TOSCA manifest), whereas artifacts and lifecycle scripts are extracted
+only when they are actually used. The content never referenced by the
+topology never touches the disk.
+
+The extracted content can be kept in an on-disk cache keyed by the digest
+of the archive, so that later runs on the same archive reuse it.
+"""
+
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+
+import yaml
+
+from app.common.cache import DiskCache, write_atomic
+from app.common.commons import CommonErrorMessages, digest_file
+from app.common.exception import MalformedCsarError
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+_URL_SCHEMES = ('http://', 'https://', 'file://')
+
+
+def _imports_of(definition):
+    """ Returns the paths of the files imported by a TOSCA definition.
+
+    e.g.
+    imports:
+      - tosker: tosker-types.yaml
+      - types/custom.yaml
+      - custom:
+          file: types/custom.yaml
+    """
+
+    if not isinstance(definition, dict):
+        return []
+
+    paths = list()
+    for entry in definition.get('imports') or []:
+        values = entry.values() if isinstance(entry, dict) else [entry]
+        for value in values:
+            if isinstance(value, dict):
+                value = value.get('file')
+            if isinstance(value, str) and \
+                    not value.lower().startswith(_URL_SCHEMES):
+                paths.append(value)
+    return paths
+
+
+class CsarArchive:
+    """ Lazy access to the content of an opened .CSAR archive. """
+
+    def __init__(self, archive, root_path):
+        """
+        Args:
+            archive (object): The opened .CSAR archive (ZipFile).
+            root_path (str): The path where the content is extracted.
+        """
+
+        self._archive = archive
+        self._root_path = os.path.abspath(root_path)
+        self._members = set(archive.namelist())
+        self._extracted = set()
+        self._lock = threading.Lock()
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def root_path(self):
+        return self._root_path
+
+    def find_member(self, path):
+        """ Returns the name of the archive member extracted in the given
+        path, or None if the path is not contained in the archive. """
+
+        rel_path = os.path.relpath(os.path.abspath(path), self._root_path)
+        member = posixpath.normpath(rel_path.replace(os.sep, '/'))
+        if member.startswith('../') or member not in self._members:
+            return None
+        return member
+
+    def member_name(self, path):
+        """ Returns the name of the archive member extracted in the given
+        path. """
+
+        member = self.find_member(path)
+        if member is None:
+            logger.error('[{0}] is not contained in the .CSAR archive'.format(
+                path))
+            raise MalformedCsarError(
+                CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
+        return member
+
+    def extract(self, member):
+        """ Extract a member of the archive (only once).
+
+        Returns:
+            The path of the extracted member.
+        """
+
+        path = os.path.abspath(
+            os.path.join(self._root_path, *member.split('/')))
+        with self._lock:
+            if member not in self._extracted:
+                if member not in self._members or \
+                        not path.startswith(self._root_path + os.sep):
+                    logger.error(
+                        '[{0}] is not contained in the .CSAR archive'.format(
+                            member))
+                    raise MalformedCsarError(
+                        CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
+                self._extract(self._archive.getinfo(member), path)
+                self._extracted.add(member)
+        return path
+
+    def _extract(self, info, path):
+        """ Extract a member of the archive, unless it was already extracted
+        in the given path (e.g. by a previous run on a cached tree). """
+
+        if info.is_dir():
+            os.makedirs(path, exist_ok=True)
+            return
+        if os.path.isfile(path) and os.path.getsize(path) == info.file_size:
+            logger.debug('Reused [{}]'.format(info.filename))
+            return
+
+        dir_path = os.path.dirname(path)
+        os.makedirs(dir_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as dst, self._archive.open(info) as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.debug('Extracted [{}]'.format(info.filename))
+
+    def fetch(self, path):
+        """ Make sure the file referenced by the model in the given path
+        is extracted.
+
+        Returns:
+            The given path.
+        """
+
+        self.extract(self.member_name(path))
+        return path
+
+    def extract_definitions(self, entry_definition):
+        """ Extract the entry definition and (recursively) its imports.
+
+        Args:
+            entry_definition (str): The name of the entry definition
+                (i.e. the TOSCA manifest) within the archive.
+
+        Returns:
+            The path of the extracted entry definition.
+        """
+
+        pending = [entry_definition]
+        visited = set()
+        while pending:
+            member = pending.pop()
+            if member in visited:
+                continue
+            visited.add(member)
+
+            self.extract(member)
+            try:
+                definition = yaml.safe_load(self._archive.read(member))
+            except yaml.YAMLError as err:
+                logger.exception(err)
+                raise MalformedCsarError(
+                    CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
+
+            base_dir = posixpath.dirname(member)
+            for imported in _imports_of(definition):
+                pending.append(
+                    posixpath.normpath(posixpath.join(base_dir, imported)))
+
+        return os.path.join(self._root_path, *entry_definition.split('/'))
+
+
+class CsarWorkspace:
+    """ The directory where the content of a .CSAR archive is extracted,
+    along with the metadata of the archive (if cached). """
+
+    def __init__(self, root_path, metadata_path=None):
+        """
+        Args:
+            root_path (str): The path where the content is extracted.
+            metadata_path (str): The path where the metadata is cached.
+                If omitted, the metadata is not cached.
+        """
+
+        self._root_path = root_path
+        self._metadata_path = metadata_path
+
+    @property
+    def root_path(self):
+        return self._root_path
+
+    def load_metadata(self):
+        """ Returns the cached metadata, or None if not cached. """
+
+        if self._metadata_path is None or \
+                not os.path.isfile(self._metadata_path):
+            return None
+        try:
+            with open(self._metadata_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as err:
+            logger.warning('Ignoring the cached metadata [{0}]: {1}'.format(
+                self._metadata_path, err))
+            return None
+
+    def store_metadata(self, metadata):
+        """ Cache the metadata of the archive (i.e. the validation result).
+        """
+
+        if self._metadata_path is not None:
+            write_atomic(
+                self._metadata_path, json.dumps(metadata).encode('utf-8'))
+
+
+class CsarCache(DiskCache):
+    """ An on-disk cache of extracted .CSAR archives, keyed by the SHA-256
+    digest of the archive. """
+
+    _NAMESPACE = 'csar'
+    _TREE = 'tree'
+    _METADATA = 'metadata.json'
+
+    def __init__(self, cache_dir, max_size=None):
+        super().__init__(cache_dir, CsarCache._NAMESPACE, max_size=max_size)
+
+    def workspace(self, csar_path):
+        """ Returns the workspace of the given .CSAR archive. """
+
+        digest = digest_file(csar_path).hexdigest()
+        entry_path = self.entry_path(digest)
+        logger.debug('Using the cached workspace [{0}] for [{1}]'.format(
+            entry_path, csar_path))
+        return CsarWorkspace(
+            os.path.join(entry_path, CsarCache._TREE),
+            metadata_path=os.path.join(entry_path, CsarCache._METADATA))
@@ -0,0 +1,89 @@
+"""
+The module for caching the TOSCA definitions imported by a manifest.
+
+toscaparser parses (and re-parses, once for each section of types) every
+imported definition (e.g. tosker-types.yaml) on every run. The parsed
+definitions are cached on disk, keyed by the content hash of the imported
+file, so that a changed import is never served from the cache.
+"""
+
+import hashlib
+import pickle
+import threading
+from contextlib import contextmanager
+
+import toscaparser.imports
+import yaml
+from toscaparser.utils.yamlparser import load_yaml
+
+from app.common.cache import DiskCache
+from app.common.commons import digest_file
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+# serialized definitions depend on the YAML loader producing them
+_LOADER_VERSION = 'pyyaml-{}'.format(yaml.__version__).encode('utf-8')
+
+_loader_lock = threading.RLock()
+
+
+class DefinitionCache(DiskCache):
+    """ An on-disk cache of parsed TOSCA definitions, keyed by the content
+    hash of the definition file. """
+
+    _NAMESPACE = 'definitions'
+    _DEFINITION = 'definition.pickle'
+
+    def __init__(self, cache_dir, max_size=None):
+        super().__init__(
+            cache_dir, DefinitionCache._NAMESPACE, max_size=max_size)
+        self._memo = dict()
+
+    def load(self, path, a_file=True):
+        """ Load a TOSCA definition (a drop-in for toscaparser's loader).
+
+        Remote definitions (i.e. URLs) are never cached.
+        """
+
+        if not a_file:
+            return load_yaml(path, a_file)
+
+        key = digest_file(
+            path, digest=hashlib.sha256(_LOADER_VERSION)).hexdigest()
+        data = self._memo.get(key)
+        if data is None:
+            data = self.read(key, DefinitionCache._DEFINITION)
+        if data is None:
+            definition = load_yaml(path, a_file)
+            if definition is None:
+                return None
+            data = pickle.dumps(definition, pickle.HIGHEST_PROTOCOL)
+            self.write(key, DefinitionCache._DEFINITION, data)
+            logger.debug('Cached the definition [{}]'.format(path))
+        self._memo[key] = data
+
+        # a fresh copy every time, toscaparser modifies the definitions
+        return pickle.loads(data)
+
+
+@contextmanager
+def cached_definitions(cache):
+    """ Make toscaparser load the imported definitions through a cache.
+
+    Args:
+        cache (object): The cache of definitions. If None, the definitions
+            are loaded as usual.
+    """
+
+    if cache is None:
+        yield
+        return
+
+    with _loader_lock:
+        loader = toscaparser.imports.YAML_LOADER
+        toscaparser.imports.YAML_LOADER = cache.load
+        try:
+            yield
+        finally:
+            toscaparser.imports.YAML_LOADER = loader
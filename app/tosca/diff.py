@@ -0,0 +1,182 @@
+"""
+The module for comparing the models of two versions of a TOSCA-based
+application, i.e. for re-toskosing only what is affected by a change.
+
+A snapshot describes each node of a (toskosed) model: its relationships,
+artifacts (including the digest of the files), interfaces, envs, ports,
+etc. Snapshots are plain JSON data, so that the snapshot of a run can be
+stored and compared with the model of a later run.
+"""
+
+import json
+
+from app.common.logging import LoggingFacility
+
+logger = LoggingFacility.get_instance().get_logger()
+
+SNAPSHOT_VERSION = 2
+
+# the fields of a container node affecting its toskosed image
+# (the others affect only its compose service)
+_IMAGE_FIELDS = ('image', 'toskosed_image', 'hosted')
+
+
+def snapshot(tosca_model, csar=None):
+    """ Take a snapshot of a model.
+
+    The snapshot contains the description and the fingerprint of each
+    node (see Template.fingerprint), and the root fingerprint of the
+    application.
+
+    Args:
+        tosca_model (object): The model representing the TOSCA application.
+        csar (object): The .CSAR archive (CsarArchive) of the application.
+            If given, the digests of the files are computed reading them
+            from the archive (nothing is extracted).
+
+    Returns:
+        A JSON-compatible dict describing the model.
+    """
+
+    # the nodes may have been changed after being parsed (e.g. toskosed)
+    tosca_model.invalidate_fingerprints()
+    root = tosca_model.fingerprint(csar=csar)
+
+    # normalized as it would be loaded from a stored snapshot
+    return json.loads(json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'name': tosca_model.name,
+        'fingerprint': root,
+        'fingerprints': {
+            node.name: tosca_model.fingerprint(node.name)
+            for node in tosca_model.nodes},
+        'nodes': {
+            node.name: tosca_model.describe_node(node.name)
+            for node in tosca_model.nodes},
+    }))
+
+
+def load_snapshot(path):
+    """ Load a snapshot stored in a file (see dump_snapshot). """
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('The snapshot {} has an unsupported version'.format(
+            path))
+    return data
+
+
+def dump_snapshot(data, path):
+    """ Store a snapshot in a file. """
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    return path
+
+
+class ModelDiff:
+    """ The changes between two snapshots of a model.
+
+    Attributes:
+        added (set): The names of the added nodes.
+        removed (set): The names of the removed nodes.
+        changed (dict): The changed fields of each changed node,
+            as node name => sorted list of fields.
+        rebuild (set): The names of the container nodes whose toskosed
+            image must be regenerated.
+        recompose (set): The names of the container nodes whose compose
+            service must be regenerated.
+    """
+
+    def __init__(self):
+        self.added = set()
+        self.removed = set()
+        self.changed = dict()
+        self.rebuild = set()
+        self.recompose = set()
+
+    @property
+    def empty(self):
+        return not (self.added or self.removed or self.changed)
+
+    def __str__(self):
+        return 'added=[{}], removed=[{}], changed=[{}], rebuild=[{}]'.format(
+            ', '.join(sorted(self.added)),
+            ', '.join(sorted(self.removed)),
+            ', '.join(sorted(self.changed)),
+            ', '.join(sorted(self.rebuild)))
+
+
+def _affected_containers(name, fields, nodes, diff):
+    """ Map the change of a node to the affected container nodes. """
+
+    node = nodes[name]
+    kind = node.get('kind')
+    if kind == 'container':
+        diff.recompose.add(name)
+        if fields is None or set(fields) & set(_IMAGE_FIELDS):
+            diff.rebuild.add(name)
+    elif kind == 'software':
+        if node.get('host') is not None:
+            diff.rebuild.add(node['host'])
+            diff.recompose.add(node['host'])
+    elif kind == 'volume':
+        # the containers attaching the volume
+        for other_name, other in nodes.items():
+            if other.get('kind') == 'container' and any(
+                    rel[2] == name for rel in other['relationships']):
+                diff.recompose.add(other_name)
+
+
+def diff_models(old, new):
+    """ Compare two snapshots of a model.
+
+    Args:
+        old (dict): The snapshot of the previous model.
+        new (dict): The snapshot of the current model.
+
+    Returns:
+        A ModelDiff describing the changes.
+    """
+
+    diff = ModelDiff()
+    if old['fingerprint'] == new['fingerprint']:
+        logger.debug('Model diff: unchanged')
+        return diff
+
+    old_nodes, new_nodes = old['nodes'], new['nodes']
+    diff.added = set(new_nodes) - set(old_nodes)
+    diff.removed = set(old_nodes) - set(new_nodes)
+    for name in set(old_nodes) & set(new_nodes):
+        if old['fingerprints'][name] == new['fingerprints'][name]:
+            # neither the node nor its dependencies changed
+            continue
+        fields = sorted(
+            field for field in set(old_nodes[name]) | set(new_nodes[name])
+            if old_nodes[name].get(field) != new_nodes[name].get(field))
+        if fields:
+            diff.changed[name] = fields
+
+    for name in diff.added:
+        _affected_containers(name, None, new_nodes, diff)
+    for name in diff.removed:
+        _affected_containers(name, None, old_nodes, diff)
+    for name, fields in diff.changed.items():
+        _affected_containers(name, fields, old_nodes, diff)
+        _affected_containers(name, fields, new_nodes, diff)
+
+    # the manager ships the whole application (manifest, config, plan)
+    if not diff.empty:
+        diff.rebuild.update(
+            name for name, node in new_nodes.items()
+            if node.get('is_manager'))
+
+    # only the current container nodes can be regenerated
+    diff.rebuild &= {name for name, node in new_nodes.items()
+                     if node.get('kind') == 'container'}
+    diff.recompose &= {name for name, node in new_nodes.items()
+                       if node.get('kind') == 'container'}
+
+    logger.debug('Model diff: {}'.format(diff))
+    return diff
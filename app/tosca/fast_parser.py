@@ -0,0 +1,343 @@
+"""
+The fast parser for TOSCA-based applications of the TosKer profile.
+
+toscaparser is a general TOSCA validator: it parses the normative TOSCA
+definitions and the imported ones, and it validates every entity of the
+manifest against them. Toskose consumes only the TosKer node types
+(tosker.nodes.*) and four relationship types, hence the fast parser loads
+the manifest YAML directly and checks it against the precompiled TosKer
+profile (see tosker_profile).
+
+The FastToscaTemplate offers the subset of the toscaparser's ToscaTemplate
+used for building the model, so that the parser builds the same model in
+both modes. The full toscaparser validation remains available (strict
+mode).
+"""
+
+import hashlib
+import os
+import threading
+
+import yaml
+
+from app.common.exception import ParsingError
+from app.common.logging import LoggingFacility
+from app.tosca.tosker_profile import (TOSCA_NODE_TYPES, TOSKER_NODE_TYPES,
+                                      TOSKER_TYPES_DIGEST, compile_node_types)
+
+logger = LoggingFacility.get_instance().get_logger()
+
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+SUPPORTED_VERSIONS = ('tosca_simple_yaml_1_0',)
+
+_SECTIONS = (
+    'tosca_definitions_version', 'tosca_default_namespace', 'template_name',
+    'topology_template', 'template_author', 'template_version',
+    'description', 'imports', 'dsl_definitions', 'node_types',
+    'relationship_types', 'relationship_templates', 'capability_types',
+    'artifact_types', 'data_types', 'interface_types', 'policy_types',
+    'group_types', 'repositories', 'metadata',
+)
+
+_NODE_TEMPLATE_SECTIONS = (
+    'type', 'description', 'metadata', 'directives', 'properties',
+    'attributes', 'requirements', 'capabilities', 'interfaces',
+    'artifacts', 'node_filter', 'copy',
+)
+
+_UNBOUNDED = 'UNBOUNDED'
+
+# the relationships whose targets must offer the required capability
+# (as assumed by the model), e.g. a software node is hosted on a container
+# or on another software node (tosca.capabilities.Container)
+_CAPABILITY_RELATIONSHIPS = (
+    'tosca.relationships.HostedOn',
+    'tosca.relationships.AttachesTo',
+)
+
+# the imported definitions compiled on the fly, by content digest
+_compiled_imports = dict()
+_compiled_imports_lock = threading.Lock()
+
+
+def _load_yaml(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        return content, yaml.load(content, Loader=_YAML_LOADER)
+    except yaml.YAMLError as err:
+        logger.error('Failed to load [{0}]: {1}'.format(path, err))
+        raise ParsingError('The file {} is not a valid YAML file'.format(
+            os.path.basename(path)))
+
+
+def _error(message):
+    logger.error(message)
+    return ParsingError(message)
+
+
+def _import_path(entry):
+    """ Returns the path of an imported definition (or None). """
+
+    if isinstance(entry, str):
+        return entry
+    if isinstance(entry, dict) and len(entry) == 1:
+        value = list(entry.values())[0]
+        if isinstance(value, dict):
+            value = value.get('file')
+        if isinstance(value, str):
+            return value
+    return None
+
+
+def _imported_node_types(base_path, imports):
+    """ Returns the node types of the imported definitions, using the
+    precompiled TosKer profile whenever possible. """
+
+    node_types = dict()
+    for entry in imports or []:
+        path = _import_path(entry)
+        if path is None:
+            raise _error('Invalid import: {}'.format(entry))
+        if '://' in path:
+            raise _error('Remote imports ({}) are supported only by the \
+                strict parsing mode'.format(path))
+
+        content, definition = _load_yaml(os.path.join(base_path, path))
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == TOSKER_TYPES_DIGEST:
+            node_types.update(TOSKER_NODE_TYPES)
+            continue
+
+        with _compiled_imports_lock:
+            if digest not in _compiled_imports:
+                _compiled_imports[digest] = compile_node_types(
+                    definition or {})
+            node_types.update(_compiled_imports[digest])
+    return node_types
+
+
+class _NodeType:
+    """ A node type (including the definitions it inherits). """
+
+    def __init__(self, name, lineage, properties, requirements,
+                 capabilities):
+        self.type = name
+        self.lineage = lineage
+        self.properties = properties
+        # as in toscaparser, [{name: definition}] from the most derived type
+        self.requirements = requirements
+        # the types of the capabilities offered by the node type
+        self.capabilities = capabilities
+
+
+class _TypeSystem:
+    """ The node types available to a manifest. """
+
+    def __init__(self, node_types):
+        self._node_types = dict(TOSCA_NODE_TYPES)
+        self._node_types.update(node_types)
+        self._resolved = dict()
+
+    def __getitem__(self, name):
+        resolved = self._resolved.get(name)
+        if resolved is not None:
+            return resolved
+
+        lineage, properties, requirements, names = [], set(), [], set()
+        capabilities = dict()
+        current = name
+        while current is not None:
+            if current in lineage:
+                raise _error('The node type [{}] derives from itself'.format(
+                    current))
+            node_type = self._node_types.get(current)
+            if node_type is None:
+                raise _error('Unknown node type [{}]'.format(current))
+            lineage.append(current)
+            properties.update(node_type['properties'])
+            for req_name, definition in node_type['requirements']:
+                if req_name not in names:
+                    names.add(req_name)
+                    requirements.append({req_name: definition})
+            for cap_name, cap_type in node_type['capabilities'].items():
+                capabilities.setdefault(cap_name, cap_type)
+            current = node_type['derived_from']
+
+        resolved = _NodeType(name, lineage, properties, requirements,
+                             set(capabilities.values()))
+        self._resolved[name] = resolved
+        return resolved
+
+
+class FastNodeTemplate:
+    """ A node template (a subset of the toscaparser's NodeTemplate). """
+
+    def __init__(self, name, entity_tpl, type_definition):
+        self.name = name
+        self.entity_tpl = entity_tpl
+        self.type_definition = type_definition
+
+    @property
+    def type(self):
+        return self.type_definition.type
+
+    @property
+    def requirements(self):
+        return self.entity_tpl.get('requirements') or []
+
+    def is_derived_from(self, type_str):
+        return type_str in self.type_definition.lineage
+
+    def has_capability(self, capability_type):
+        return capability_type in self.type_definition.capabilities
+
+
+class FastOutput:
+    """ An output of the topology template. """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs or {}
+
+    @property
+    def description(self):
+        return self.attrs.get('description')
+
+    @property
+    def value(self):
+        return self.attrs.get('value')
+
+
+class _TopologyTemplate:
+
+    def __init__(self, tpl):
+        self.tpl = tpl
+
+
+class FastToscaTemplate:
+    """ A TOSCA template of the TosKer profile (a subset of the
+    toscaparser's ToscaTemplate), validated against the TosKer profile.
+
+    Raises:
+        ParsingError: If the manifest is not a valid TOSCA template of the
+            TosKer profile.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        _, self.tpl = _load_yaml(path)
+        if not isinstance(self.tpl, dict):
+            raise _error('The manifest {} is not a TOSCA template'.format(
+                path))
+
+        self._validate_sections()
+
+        base_path = os.path.dirname(os.path.abspath(path))
+        node_types = _imported_node_types(base_path, self.tpl.get('imports'))
+        node_types.update(compile_node_types(self.tpl))
+        types = _TypeSystem(node_types)
+
+        topology = self.tpl.get('topology_template') or {}
+        self.topology_template = _TopologyTemplate(topology)
+        self.nodetemplates = [
+            FastNodeTemplate(name, entity_tpl, self._node_type(
+                types, name, entity_tpl))
+            for name, entity_tpl in
+            (topology.get('node_templates') or {}).items()]
+        self.outputs = [
+            FastOutput(name, attrs)
+            for name, attrs in (topology.get('outputs') or {}).items()]
+
+        nodes = {node.name: node for node in self.nodetemplates}
+        for node in self.nodetemplates:
+            self._validate_requirements(node, nodes)
+
+    @property
+    def description(self):
+        return self.tpl.get('description')
+
+    def _validate_sections(self):
+        version = self.tpl.get('tosca_definitions_version')
+        if version is None:
+            raise _error('Missing required field: tosca_definitions_version')
+        if version not in SUPPORTED_VERSIONS:
+            raise _error('Template version is invalid: [{}] (the fast \
+                parsing mode supports: {})'.format(
+                    version, ', '.join(SUPPORTED_VERSIONS)))
+
+        unknown = sorted(str(k) for k in self.tpl if k not in _SECTIONS)
+        if unknown:
+            raise _error('Unknown fields of the template: {}'.format(
+                ', '.join(unknown)))
+
+    @staticmethod
+    def _node_type(types, name, entity_tpl):
+        if not isinstance(entity_tpl, dict):
+            raise _error('The node template [{}] is invalid'.format(name))
+        if 'type' not in entity_tpl:
+            raise _error('Missing required field: [type] of [{}]'.format(
+                name))
+        unknown = sorted(
+            str(k) for k in entity_tpl if k not in _NODE_TEMPLATE_SECTIONS)
+        if unknown:
+            raise _error('Unknown fields of the node template [{0}]: {1}'
+                         .format(name, ', '.join(unknown)))
+
+        node_type = types[entity_tpl['type']]
+        properties = entity_tpl.get('properties') or {}
+        if isinstance(properties, dict):
+            unknown = sorted(
+                str(k) for k in properties if k not in node_type.properties)
+            if unknown:
+                raise _error('Unknown properties of the node template \
+                    [{0}]: {1}'.format(name, ', '.join(unknown)))
+        return node_type
+
+    @staticmethod
+    def _validate_requirements(node, nodes):
+        definitions = dict()
+        for definition in node.type_definition.requirements:
+            definitions.update(definition)
+
+        counts = dict()
+        for requirement in node.requirements:
+            if not isinstance(requirement, dict) or len(requirement) != 1:
+                raise _error('Invalid requirement of the node template \
+                    [{0}]: {1}'.format(node.name, requirement))
+            name, value = list(requirement.items())[0]
+            definition = definitions.get(name)
+            if definition is None:
+                raise _error('Unknown requirement [{0}] of the node \
+                    template [{1}]'.format(name, node.name))
+
+            target = value.get('node') if isinstance(value, dict) else value
+            if target not in nodes:
+                raise _error('The requirement [{0}] of the node template \
+                    [{1}] targets the missing node [{2}]'.format(
+                        name, node.name, target))
+            capability = definition['capability']
+            if definition['relationship'] in _CAPABILITY_RELATIONSHIPS and \
+                    not nodes[target].has_capability(capability):
+                raise _error('The requirement [{0}] of the node template \
+                    [{1}] must target a node offering [{2}]'.format(
+                        name, node.name, capability))
+
+            if definition['relationship'] == \
+                    'tosca.relationships.AttachesTo':
+                relationship = value.get('relationship') \
+                    if isinstance(value, dict) else None
+                properties = relationship.get('properties') \
+                    if isinstance(relationship, dict) else None
+                if not isinstance(properties, dict) or \
+                        'location' not in properties:
+                    raise _error('Missing the location of the requirement \
+                        [{0}] of the node template [{1}]'.format(
+                            name, node.name))
+
+            counts[name] = counts.get(name, 0) + 1
+            upper = definition['occurrences'][1]
+            if upper != _UNBOUNDED and counts[name] > upper:
+                raise _error('Too many [{0}] requirements of the node \
+                    template [{1}]'.format(name, node.name))
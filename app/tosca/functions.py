@@ -0,0 +1,226 @@
+"""
+The module for resolving the TOSCA functions of TOSCA-based applications.
+
+The functions (get_input, get_property, get_artifact) are collected from
+the node templates and the outputs of the topology template. Then they're
+resolved once each, in topological order: a function referencing a value
+that is (or contains) another function is resolved after it. Cyclic
+references are reported as parsing errors.
+
+e.g.
+# topology_template:
+#   node_templates:
+#     api:
+#       properties:
+#         port: { get_input: api_port }
+#         url: { get_property: [ SELF, port ] }   <= resolved after "port"
+"""
+
+import os
+
+from toscaparser.functions import Function
+
+from app.common.exception import ParsingError
+from app.common.logging import LoggingFacility
+from app.tosca.model.artifacts import File
+
+logger = LoggingFacility.get_instance().get_logger()
+
+# the sections of a node template referenced by each function
+_REFERENCES = {
+    'get_property': 'properties',
+    'get_artifact': 'artifacts',
+}
+
+_NODE_TEMPLATES = 'node_templates'
+_OUTPUTS = 'outputs'
+
+
+class _Call:
+    """ A TOSCA function found in the template. """
+
+    __slots__ = ('path', 'owner', 'parent', 'key', 'function', 'reference')
+
+    def __init__(self, path, owner, parent, key, function):
+        self.path = path
+        self.owner = owner
+        self.parent = parent
+        self.key = key
+        self.function = function
+        self.reference = self._reference()
+
+    def _reference(self):
+        """ The path of the value referenced by the function (if any). """
+
+        if isinstance(self.function, Function):
+            return None
+        for name, section in _REFERENCES.items():
+            if name in self.function:
+                args = self.function[name]
+                if not isinstance(args, list) or not args:
+                    raise ParsingError(
+                        'Invalid arguments of {0} in [{1}]'.format(
+                            name, _format_path(self.path)))
+                target = self.owner if args[0] == 'SELF' else args[0]
+                return (_NODE_TEMPLATES, target, section) + tuple(args[1:])
+        return None
+
+
+def _format_path(path):
+    return '.'.join(str(item) for item in path)
+
+
+def _function_of(value):
+    """ Returns the function (to be resolved) represented by a value. """
+
+    if isinstance(value, Function):
+        # function parsed by toscaparser library
+        return value
+    if isinstance(value, dict) and (
+            'get_input' in value or
+            any(name in value for name in _REFERENCES)):
+        return value
+    return None
+
+
+def _collect_calls(sections):
+    """ Collect the functions (iteratively) from the given sections, as
+    {section name: {owner name: tpl}}. """
+
+    calls = list()
+    pending = [
+        ((section, owner), owner, tpl)
+        for section, tpls in sections.items()
+        for owner, tpl in (tpls or {}).items()]
+    while pending:
+        path, owner, container = pending.pop()
+        if not isinstance(container, dict):
+            continue
+        for key, value in container.items():
+            function = _function_of(value)
+            if function is not None:
+                calls.append(
+                    _Call(path + (key,), owner, container, key, function))
+            elif isinstance(value, dict):
+                pending.append((path + (key,), owner, value))
+    return calls
+
+
+def _dependencies(calls):
+    """ Returns the functions each function depends on, i.e. the functions
+    found where the referenced value is, within it, or on its path. """
+
+    by_path = {call.path: call for call in calls}
+    by_prefix = dict()
+    for call in calls:
+        for i in range(len(call.path)):
+            by_prefix.setdefault(call.path[:i], []).append(call)
+
+    dependencies = dict()
+    for call in calls:
+        depends = list()
+        if call.reference is not None:
+            # a function producing (a parent of) the referenced value
+            for i in range(len(call.reference) + 1):
+                other = by_path.get(call.reference[:i])
+                if other is not None:
+                    depends.append(other)
+            # the functions within the referenced value
+            depends.extend(by_prefix.get(call.reference, ()))
+        dependencies[call.path] = depends
+    return dependencies
+
+
+def _sorted_calls(calls, dependencies):
+    """ Sort the functions topologically (dependencies first).
+
+    Raises:
+        ParsingError: If the references between the functions are cyclic.
+    """
+
+    VISITING, VISITED = 1, 2
+    state = dict()
+    ordered = list()
+    for root in calls:
+        if root.path in state:
+            continue
+        state[root.path] = VISITING
+        work = [(root, iter(dependencies[root.path]))]
+        while work:
+            call, pending = work[-1]
+            for dependency in pending:
+                dependency_state = state.get(dependency.path)
+                if dependency_state == VISITING:
+                    cycle = [c.path for c, _ in work]
+                    cycle = cycle[cycle.index(dependency.path):] + \
+                        [dependency.path]
+                    logger.error('Cyclic TOSCA functions: {}'.format(
+                        ' -> '.join(_format_path(path) for path in cycle)))
+                    raise ParsingError(
+                        'Cyclic references between TOSCA functions: {}'
+                        .format(' -> '.join(
+                            _format_path(path) for path in cycle)))
+                if dependency_state is None:
+                    state[dependency.path] = VISITING
+                    work.append(
+                        (dependency, iter(dependencies[dependency.path])))
+                    break
+            else:
+                work.pop()
+                state[call.path] = VISITED
+                ordered.append(call)
+    return ordered
+
+
+def _lookup(tpl, path):
+    value = tpl
+    for item in path:
+        value = value[item]
+    return value
+
+
+def resolve_functions(tosca_template, inputs, base_path):
+    """ Resolve the TOSCA functions of a TOSCA template (in place).
+
+    Args:
+        tosca_template (object): The (toscaparser) template.
+        inputs (dict): The TOSCA inputs given by the user.
+        base_path (str): The path of the TOSCA-based application.
+
+    Raises:
+        ParsingError: If a function is invalid, references a missing
+            value or the references between functions are cyclic.
+    """
+
+    tpl = tosca_template.topology_template.tpl
+    tosca_inputs = tpl.get('inputs') or {}
+    sections = {_NODE_TEMPLATES: tpl.get(_NODE_TEMPLATES)}
+    if _OUTPUTS in tpl:
+        sections[_OUTPUTS] = tpl[_OUTPUTS]
+
+    calls = _collect_calls(sections)
+    ordered = _sorted_calls(calls, _dependencies(calls))
+
+    for call in ordered:
+        function = call.function
+        try:
+            if isinstance(function, Function):
+                value = function.result()
+            elif call.reference is not None:
+                value = _lookup(tpl, call.reference)
+                if 'get_artifact' in function:
+                    value = File(
+                        None, os.path.abspath(os.path.join(base_path, value)))
+            elif function['get_input'] in inputs:
+                value = inputs[function['get_input']]
+            else:
+                value = tosca_inputs[function['get_input']]['default']
+        except (KeyError, IndexError, TypeError) as err:
+            logger.error('Failed to resolve [{0}]: {1}'.format(
+                _format_path(call.path), err))
+            raise ParsingError(
+                'Failed to resolve the TOSCA function in [{}]'.format(
+                    _format_path(call.path)))
+        call.parent[call.key] = value
+
+    logger.debug('Resolved [{}] TOSCA functions'.format(len(ordered)))
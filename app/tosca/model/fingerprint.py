@@ -0,0 +1,235 @@
+'''
+Fingerprints module
+
+The fingerprint of a node is a digest of its content (properties,
+artifacts, the content of its files, interfaces, ...) combined, as in a
+Merkle tree, with the fingerprints of the nodes it depends on (i.e. the
+targets of its relationships). A node changes its fingerprint whenever it
+changes or any node it (transitively) depends on changes. The root
+fingerprint combines the fingerprints of all the nodes of an application.
+
+The nodes of a cycle of relationships (e.g. two software components
+connected to each other) share the digest of the whole cycle, so that the
+fingerprints never depend on the order they're computed in.
+'''
+import hashlib
+import json
+import os
+
+from app.common.commons import digest_file, digest_fileobj
+from .artifacts import DockerImage, File, ToskosedImage
+from .nodes import Container, Software, Volume
+from .relationships import _get_str_name
+
+
+def _digest_file(path, csar=None):
+    """ Returns the digest of a file referenced by the model, read from
+    the .CSAR archive (without extracting it), if it is contained in it. """
+
+    member = csar.find_member(path) if csar is not None else None
+    if member is None:
+        return digest_file(path)
+    with csar.archive.open(member) as f:
+        return digest_fileobj(f)
+
+
+def _describe(value, base_path, csar=None):
+    """ Returns a JSON-compatible description of a value of the model. """
+
+    if isinstance(value, File):
+        path = value.file_path
+        return {
+            'file': os.path.relpath(path, base_path),
+            'digest': _digest_file(path, csar=csar).hexdigest(),
+        }
+    if isinstance(value, ToskosedImage):
+        # the registry password is never part of a description
+        return {'image': value.full_name, 'base': value.full_name_base}
+    if isinstance(value, DockerImage):
+        return {'image': value.format}
+    if isinstance(value, dict):
+        return {str(k): _describe(v, base_path, csar=csar)
+                for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_describe(v, base_path, csar=csar) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_describe(v, base_path, csar=csar) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _describe_env(env):
+    """ Returns the description of the envs of a container node, where
+    the secrets (e.g. the supervisord password) are replaced by a digest.
+    """
+
+    return {
+        str(name): hashlib.sha256(str(value).encode('utf-8')).hexdigest()
+        if 'PASSWORD' in str(name).upper() else _describe(value, None)
+        for name, value in (env or {}).items()}
+
+
+def _describe_relationship(rel):
+    return [type(rel).__name__, rel.requirement, _get_str_name(rel.to),
+            getattr(rel, 'alias', None), getattr(rel, 'location', None)]
+
+
+def describe_node(node, base_path, csar=None):
+    """ Returns the description of the content of a node, as a
+    JSON-compatible dict field => value.
+
+    Args:
+        node (object): The node.
+        base_path (str): The path the paths of the files are relative to
+            (i.e. the root of the extracted .CSAR archive).
+        csar (object): The .CSAR archive (CsarArchive) of the application.
+            If given, the digests of the files are computed reading them
+            from the archive (nothing is extracted).
+    """
+
+    def describe(value):
+        return _describe(value, base_path, csar=csar)
+
+    description = {
+        'relationships': sorted(
+            (_describe_relationship(rel) for rel in node.relationships),
+            key=str),
+        'artifacts': describe(node.artifacts),
+    }
+
+    if isinstance(node, Container):
+        description.update({
+            'kind': 'container',
+            'image': describe(node.image) if node.artifacts else None,
+            'toskosed_image': describe(node.toskosed_image)
+            if len(node.artifacts) > 1 else None,
+            'hosted': sorted(software.name for software in node.hosted),
+            'is_manager': node.is_manager,
+            'env': _describe_env(node.env),
+            'cmd': describe(node.cmd),
+            'ports': describe(node.ports),
+            'share_data': describe(node.share_data),
+            'hostname': node.hostname,
+            'overlay': sorted(
+                (_describe_relationship(rel) for rel in node._overlay),
+                key=str),
+        })
+    elif isinstance(node, Software):
+        description.update({
+            'kind': 'software',
+            'host': _get_str_name(node.host_container)
+            if node.host_container is not None else None,
+            'interfaces': describe(node.interfaces),
+        })
+    elif isinstance(node, Volume):
+        description.update({
+            'kind': 'volume',
+            'size': describe(node.size),
+            'driver_opt': describe(node.driver_opt),
+        })
+
+    return description
+
+
+def dependencies_of(node):
+    """ Returns the names of the nodes a node depends on. """
+
+    return sorted({_get_str_name(rel.to) for rel in node.relationships})
+
+
+def digest(data):
+    """ Returns the digest of JSON-compatible data. """
+
+    return hashlib.sha256(json.dumps(
+        data, sort_keys=True, separators=(',', ':')).encode('utf-8')) \
+        .hexdigest()
+
+
+def merkle_fingerprints(names, local_digest, dependencies, known=None):
+    """ Compute the fingerprints of some nodes (and of the nodes they
+    depend on).
+
+    Args:
+        names (list): The names of the nodes.
+        local_digest (function): Returns the digest of the content of a
+            node, given its name.
+        dependencies (function): Returns the names of the nodes a node
+            depends on, given its name. The unknown nodes are ignored.
+        known (dict): The fingerprints already computed, as name =>
+            fingerprint. It is updated with the new fingerprints.
+
+    Returns:
+        The fingerprints, as name => fingerprint.
+    """
+
+    fingerprints = known if known is not None else dict()
+
+    # Tarjan's strongly connected components (iterative), the components
+    # are completed in topological order (dependencies first)
+    index, lowlink, stack, on_stack = dict(), dict(), list(), set()
+    for name in names:
+        if name in fingerprints or name in index:
+            continue
+
+        work = [(name, None)]
+        while work:
+            node, pending = work[-1]
+            if pending is None:
+                index[node] = lowlink[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+                pending = iter(dependencies(node))
+                work[-1] = (node, pending)
+
+            for dependency in pending:
+                if dependency in fingerprints:
+                    continue
+                if dependency not in index:
+                    work.append((dependency, None))
+                    break
+                if dependency in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dependency])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = list()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    _fingerprint_component(
+                        sorted(component), local_digest, dependencies,
+                        fingerprints)
+
+    return fingerprints
+
+
+def _fingerprint_component(component, local_digest, dependencies,
+                           fingerprints):
+    members = set(component)
+    external = sorted({
+        fingerprints[dependency]
+        for member in component
+        for dependency in dependencies(member)
+        if dependency not in members and dependency in fingerprints})
+    digests = {member: local_digest(member) for member in component}
+    component_digest = digest([
+        [[member, digests[member]] for member in component]
+        if len(component) > 1 else digests[component[0]],
+        external])
+    for member in component:
+        fingerprints[member] = digest([digests[member], component_digest])
+
+
+def root_fingerprint(fingerprints):
+    """ Returns the root fingerprint of an application, given the
+    fingerprints of all its nodes. """
+
+    return digest(sorted([name, fingerprint]
+                         for name, fingerprint in fingerprints.items()))
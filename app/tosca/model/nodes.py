@@ -1,6 +1,8 @@
 '''
 Nodes module
 '''
+from operator import attrgetter
+
 from app.tosca.model import protocol
 from app.tosca.model.artifacts import (Artifact, Dockerfile,
                                        DockerfileExecutable,
@@ -24,18 +26,29 @@ def _add_to_list(l_name, i):
     return l_name
 
 
+def _slots(o):
+    return (slot for cls in reversed(type(o).__mro__)
+            for slot in getattr(cls, '__slots__', ()))
+
+
 def _str_obj(o):
-    return ', '.join(["{}: {}".format(k, v) for k, v in vars(o).items()])
+    return ', '.join(["{}: {}".format(k, getattr(o, k, None))
+                      for k in _slots(o)])
 
 
 class Root(object):
 
+    __slots__ = ('name', 'tpl', '_depend', '_connection', '_volume',
+                 'artifacts', '_mark', 'up_requirements', 'protocol',
+                 'interfaces')
+
+    # the accessors of the attributes of the node
+    _ATTRIBUTE = {}
+
     def __init__(self, name):
         self.name = name
         self.tpl = None
 
-        self._ATTRIBUTE = {}
-
         # requirements
         self._depend = []
         self._connection = []
@@ -100,7 +113,8 @@ class Root(object):
         return self.name
 
     def __getitem__(self, item):
-        return self._ATTRIBUTE.get(item, lambda: None)()
+        accessor = self._ATTRIBUTE.get(item)
+        return accessor(self) if accessor is not None else None
 
     def __eq__(self, other):
         return self.name == other.name
@@ -114,6 +128,17 @@ class Root(object):
 
 class Container(Root):
 
+    __slots__ = ('id', 'env', 'cmd', 'ports', 'hostname', 'share_data',
+                 'is_manager', 'hosted', '_overlay')
+
+    _ATTRIBUTE = {
+        'id': attrgetter('id'),
+        'ports': attrgetter('ports'),
+        'env_variable': attrgetter('env'),
+        'command': attrgetter('cmd'),
+        'share_data': attrgetter('share_data'),
+    }
+
     def __init__(self, name, is_manager=False):
         super(Container, self).__init__(name)
         # attributes
@@ -126,13 +151,6 @@ class Container(Root):
         self.is_manager = is_manager
         self.hosted = []
 
-        self._ATTRIBUTE = {
-            'id': lambda: self.id,
-            'ports': lambda: self.ports,
-            'env_variable': lambda: self.env,
-            'command': lambda: self.cmd,
-            'share_data': lambda: self.share_data,
-        }
         self._overlay = []
 
         self.interfaces = {'Standard': {'create', 'start', 'stop', 'delete'}}
@@ -195,15 +213,18 @@ class Container(Root):
 
 class Volume(Root):
 
+    __slots__ = ('id', 'size', 'driver_opt')
+
+    _ATTRIBUTE = {
+        'id': attrgetter('id'),
+        'size': attrgetter('size'),
+    }
+
     def __init__(self, name):
         super(Volume, self).__init__(name)
         # attributes
         self.id = None
         self.size = None
-        self._ATTRIBUTE = {
-            'id': lambda: self.id,
-            'size': lambda: self.size
-        }
 
         self.interfaces = {'Standard': {'create', 'delete'}}
 
@@ -233,6 +254,8 @@ class Volume(Root):
 
 class Software(Root):
 
+    __slots__ = ('_host', 'host_container')
+
     def __init__(self, name):
         super(Software, self).__init__(name)
         self.artifacts = []
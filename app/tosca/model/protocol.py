@@ -1,35 +1,123 @@
 '''
 Classes used to represent a Management Protocol
 '''
+import sys
+
 from .relationships import (ATTACHMENT, CONNECTION, DEPENDENCY, ENDPOINT,
                             FEATURE, HOST, STORAGE)
 
 
-class Protocol():
+class ProtocolDefinition():
     '''
-    The Protocol class representation.
+    The (immutable) definition of a Management Protocol, shared by all
+    the nodes of the same type.
 
     Attributes:
+    name          -- the definition name (type:str)
+    states        -- the States (type:(State))
+    transitions   -- the Transitions (type:(Transition))
     initial_state -- the initial state (type:State)
-    current_state -- the current state (type:State)
-    states        -- a list of States (type:[State])
-    transitions   -- the list of transitions (type:[Transition])
     '''
-    def __init__(self):
-        """Create a new Protocol object."""
-        self.states = []
-        self.transitions = []
-        self._initial_state = None
-        self._current_state = None
+    __slots__ = ('_name', '_states', '_transitions', '_initial_state',
+                 '_states_by_name')
+
+    def __init__(self, name, states, transitions, initial_state):
+        """Create a new ProtocolDefinition object.
+
+        The transitions of each state are bound to the state, in the given
+        order, and the definition can't be changed afterwards.
+        """
+        assert initial_state in states
+        self._name = name
+        self._states = tuple(states)
+        self._transitions = tuple(transitions)
+        self._initial_state = initial_state
+        self._states_by_name = {state.name: state for state in self._states}
+        for state in self._states:
+            state._bind(t for t in self._transitions if t.source is state)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def transitions(self):
+        return self._transitions
 
     @property
     def initial_state(self):
         return self._initial_state
 
-    @initial_state.setter
-    def initial_state(self, state):
-        assert isinstance(state, State)
-        self.current_state = self._initial_state = state
+    def find_state(self, state_name):
+        """Find the state object given its name."""
+        return self._states_by_name.get(state_name)
+
+    def run(self, state, operations):
+        """Return the state reached from the given state by executing a
+        sequence of operations, or None if an operation is not allowed."""
+        for operation in operations:
+            transition = state._table.get(operation)
+            if transition is None:
+                return None
+            state = transition.target
+        return state
+
+    def __reduce__(self):
+        # the default definitions are pickled by reference (i.e. shared)
+        if _DEFINITIONS.get(self._name) is self:
+            return _default_definition, (self._name,)
+        return ProtocolDefinition, (
+            self._name, self._states, self._transitions, self._initial_state)
+
+    def __str__(self):
+        return 'States: {}\n\
+                Transitions: {}\n\
+                Initial state: {}' \
+                .format(
+                    ', '.join((str(s) for s in self.states)),
+                    ', '.join((str(t) for t in self.transitions)),
+                    self.initial_state
+        )
+
+
+class Protocol():
+    '''
+    The Management Protocol of a node, i.e. a cursor over a (shared)
+    protocol definition.
+
+    Attributes:
+    definition    -- the protocol definition (type:ProtocolDefinition)
+    initial_state -- the initial state (type:State)
+    current_state -- the current state (type:State)
+    states        -- the States (type:(State))
+    transitions   -- the Transitions (type:(Transition))
+    '''
+    __slots__ = ('_definition', '_current_state')
+
+    def __init__(self, definition):
+        """Create a new Protocol object in the initial state."""
+        self._definition = definition
+        self._current_state = definition.initial_state
+
+    @property
+    def definition(self):
+        return self._definition
+
+    @property
+    def states(self):
+        return self._definition.states
+
+    @property
+    def transitions(self):
+        return self._definition.transitions
+
+    @property
+    def initial_state(self):
+        return self._definition.initial_state
 
     @property
     def current_state(self):
@@ -42,7 +130,14 @@ class Protocol():
 
     def find_state(self, state_name):
         """Find the state object given its name."""
-        return next((s for s in self.states if state_name == s.name), None)
+        return self._definition.find_state(state_name)
+
+    def __getstate__(self):
+        return self._definition, self._current_state.name
+
+    def __setstate__(self, state):
+        self._definition, state_name = state
+        self._current_state = self._definition.find_state(state_name)
 
     def reset(self):
         """Reset the protocol state."""
@@ -86,25 +181,50 @@ class State():
 
     Attributes:
     name        -- the State name (type:str)
-    offers      -- the list of the capability offered in the state
-    requires    -- the list of the requirement required in the state
-    transitions -- the transition list
+    offers      -- the capabilities offered in the state
+    requires    -- the requirements required in the state
+    transitions -- the transitions leaving the state
     """
-    def __init__(self, name, requires=None, offers=None, transitions=None):
+    __slots__ = ('_name', '_requires', '_offers', '_transitions', '_table')
+
+    def __init__(self, name, requires=None, offers=None):
         """Create a new State object."""
-        self.name = name
-        self.requires = requires if requires is not None else []
-        self.offers = offers if offers is not None else []
-        self.transitions = transitions if transitions is not None else []
+        self._name = name
+        self._requires = tuple(requires) if requires is not None else ()
+        self._offers = tuple(offers) if offers is not None else ()
+        self._transitions = ()
+        self._table = {}
+
+    def _bind(self, transitions):
+        """Bind the transitions leaving the state (by its definition)."""
+        self._transitions = tuple(transitions)
+        self._table = {}
+        for transition in self._transitions:
+            self._table.setdefault(transition.full_operation, transition)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def requires(self):
+        return self._requires
+
+    @property
+    def offers(self):
+        return self._offers
+
+    @property
+    def transitions(self):
+        return self._transitions
 
     def next_transition(self, operation):
         """Return the transition reached with the given operation."""
-        return next((t for t in self.transitions
-                     if t.full_operation == operation), None)
+        return self._table.get(operation)
 
     def next_state(self, operation):
         """Return the state reached with the given operation."""
-        transition = self.next_transition(operation)
+        transition = self._table.get(operation)
         return transition.target if transition is not None else None
 
     def __eq__(self, other):
@@ -122,24 +242,50 @@ class Transition():
     The protocol Transition class represention.
 
     Attributes:
-    name -- the name Transition name
     source -- the source state of the Transition
     target -- the target state of the Transition
     interface -- the interface name
     operation -- the operation name to be executed to change the State
+    requires -- the requirements needed to execute the operation
     """
-    def __init__(self, source=None, target=None, interface='Standard',
+    __slots__ = ('_source', '_target', '_interface', '_operation',
+                 '_requires', '_full_operation')
+
+    def __init__(self, source, target, interface='Standard',
                  operation=None, requires=None):
         """Create a new Transition object."""
-        self.source = source
-        self.target = target
-        self.interface = interface
-        self.operation = operation
-        self.requires = requires if requires is not None else []
+        self._source = source
+        self._target = target
+        self._interface = interface
+        self._operation = operation
+        self._requires = tuple(requires) if requires is not None else ()
+        self._full_operation = sys.intern(
+            '.'.join((interface, operation))) if operation is not None \
+            else None
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def interface(self):
+        return self._interface
+
+    @property
+    def operation(self):
+        return self._operation
+
+    @property
+    def requires(self):
+        return self._requires
 
     @property
     def full_operation(self):
-        return '.'.join((self.interface, self.operation))
+        return self._full_operation
 
     def __eq__(self, other):
         return isinstance(other, Transition) and\
@@ -184,36 +330,27 @@ STATES = STATE_DELETED, \
 
 
 # Default protocols
-def get_container_protocol():
-    """Return the default protocol for the Container component."""
-    protocol = Protocol()
-    protocol.states = deleted, created, running = [
+def _container_protocol_definition():
+    deleted, created, running = states = [
         State(CONTAINER_STATE_DELETED),
         State(CONTAINER_STATE_CREATED, offers=[ALIVE]),
         State(CONTAINER_STATE_RUNNING,
               requires=[STORAGE, CONNECTION, DEPENDENCY],
               offers=[ALIVE, HOST, ENDPOINT, FEATURE])
     ]
-    protocol.initial_state = deleted
 
-    protocol.transitions = create, start, stop, delete = [
+    transitions = [
         Transition(deleted, created, operation='create'),
         Transition(created, running, operation='start'),
         Transition(running, created, operation='stop'),
         Transition(created, deleted, operation='delete')
     ]
 
-    deleted.transitions = [create]
-    created.transitions = [delete, start]
-    running.transitions = [stop]
-
-    return protocol
+    return ProtocolDefinition('container', states, transitions, deleted)
 
 
-def get_software_protocol():
-    """Return the default protocol for the Software component."""
-    protocol = Protocol()
-    protocol.states = deleted, created, configured, running = [
+def _software_protocol_definition():
+    deleted, created, configured, running = states = [
         State(SOFTWARE_STATE_DELETED),
         State(SOFTWARE_STATE_CREATED, requires=[ALIVE], offers=[ALIVE]),
         State(SOFTWARE_STATE_CONFIGURED, requires=[ALIVE], offers=[ALIVE]),
@@ -221,59 +358,97 @@ def get_software_protocol():
               requires=[ALIVE, HOST, CONNECTION, DEPENDENCY],
               offers=[ALIVE, HOST, ENDPOINT, FEATURE])
     ]
-    protocol.initial_state = deleted
-
-    protocol.transitions = \
-        create, \
-        configure, \
-        start, \
-        stop, \
-        delete, \
-        delete_conf = \
-        [
-            Transition(
-                deleted, created,
-                operation='create', requires=[HOST]),
-            Transition(
-                created, configured,
-                operation='configure', requires=[HOST]),
-            Transition(
-                configured, running,
-                operation='start', requires=[HOST]),
-            Transition(
-                running, configured,
-                operation='stop', requires=[HOST]),
-            Transition(
-                created, deleted,
-                operation='delete', requires=[HOST]),
-            Transition(
-                configured, deleted,
-                operation='delete', requires=[HOST])
-        ]
-
-    deleted.transitions = [create]
-    created.transitions = [delete, configure]
-    configured.transitions = [start, delete_conf]
-    running.transitions = [stop]
-
-    return protocol
 
+    transitions = [
+        Transition(
+            deleted, created,
+            operation='create', requires=[HOST]),
+        Transition(
+            created, configured,
+            operation='configure', requires=[HOST]),
+        Transition(
+            configured, running,
+            operation='start', requires=[HOST]),
+        Transition(
+            running, configured,
+            operation='stop', requires=[HOST]),
+        Transition(
+            created, deleted,
+            operation='delete', requires=[HOST]),
+        Transition(
+            configured, deleted,
+            operation='delete', requires=[HOST])
+    ]
 
-def get_volume_protocol():
-    """Return the default protocol for the Volume component."""
-    protocol = Protocol()
-    protocol.states = deleted, created = [
+    return ProtocolDefinition('software', states, transitions, deleted)
+
+
+def _volume_protocol_definition():
+    deleted, created = states = [
         State(VOLUME_STATE_DELETED),
         State(VOLUME_STATE_CREATED, offers=[ATTACHMENT])
     ]
-    protocol.initial_state = deleted
 
-    protocol.transitions = create, delete = [
+    transitions = [
         Transition(deleted, created, operation='create'),
         Transition(created, deleted, operation='delete')
     ]
 
-    deleted.transitions = [create]
-    created.transitions = [delete]
+    return ProtocolDefinition('volume', states, transitions, deleted)
+
+
+# the definitions are built once, and shared by all the nodes
+CONTAINER_PROTOCOL = _container_protocol_definition()
+SOFTWARE_PROTOCOL = _software_protocol_definition()
+VOLUME_PROTOCOL = _volume_protocol_definition()
+
+_DEFINITIONS = {
+    definition.name: definition
+    for definition in (CONTAINER_PROTOCOL, SOFTWARE_PROTOCOL, VOLUME_PROTOCOL)
+}
+
+
+def _default_definition(name):
+    return _DEFINITIONS[name]
+
+
+def simulate(protocols, operations):
+    """Simulate a sequence of operations on many protocols at once.
+
+    The current state of the protocols is left untouched. The protocols
+    sharing the same definition and current state are simulated once.
+
+    Args:
+        protocols (iterable): The protocols (e.g. of the nodes of an app).
+        operations (iterable): The full names of the operations
+            (e.g. ['Standard.create', 'Standard.start']).
+
+    Returns:
+        A list with the state reached by each protocol, or None if an
+        operation is not allowed by the protocol.
+    """
+    operations = [sys.intern(operation) for operation in operations]
+    reached = {}
+    results = []
+    for protocol in protocols:
+        key = (id(protocol.definition), id(protocol.current_state))
+        if key not in reached:
+            reached[key] = protocol.definition.run(
+                protocol.current_state, operations)
+        results.append(reached[key])
+    return results
 
-    return protocol
+
+def get_container_protocol():
+    """Return the default protocol for the Container component."""
+    return Protocol(CONTAINER_PROTOCOL)
+
+
+def get_software_protocol():
+    """Return the default protocol for the Software component."""
+    return Protocol(SOFTWARE_PROTOCOL)
+
+
+def get_volume_protocol():
+    """Return the default protocol for the Volume component."""
+    return Protocol(VOLUME_PROTOCOL)
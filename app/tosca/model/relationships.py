@@ -12,6 +12,8 @@ CAPABILITIES = ENDPOINT, FEATURE, HOST, ATTACHMENT =\
 
 class Relationship(object):
 
+    __slots__ = ('origin', 'to', 'requirement', 'capability')
+
     def __init__(self, origin, to, requirement=None, capability=None):
         self.origin = origin
         self.to = to
@@ -35,6 +37,8 @@ def _get_str_full_name(obj):
 
 class ConnectsTo(Relationship):
 
+    __slots__ = ('alias',)
+
     def __init__(self, origin, node, alias=None,
                  requirement=CONNECTION, capability=ENDPOINT):
         super(ConnectsTo, self).__init__(origin, node, requirement, capability)
@@ -54,6 +58,8 @@ class ConnectsTo(Relationship):
 
 class HostedOn(Relationship):
 
+    __slots__ = ()
+
     def __init__(self, origin, node, requirement=HOST, capability=HOST):
         super(HostedOn, self).__init__(origin, node, requirement, capability)
 
@@ -67,6 +73,8 @@ class HostedOn(Relationship):
 
 class AttachesTo(Relationship):
 
+    __slots__ = ('location',)
+
     def __init__(self, origin, node, folder=None, requirement=STORAGE,
                  capability=ATTACHMENT):
         super(AttachesTo, self).__init__(origin, node, requirement, capability)
@@ -85,6 +93,8 @@ class AttachesTo(Relationship):
 
 class DependsOn(Relationship):
 
+    __slots__ = ()
+
     def __init__(self, origin, node, requirement=DEPENDENCY,
                  capability=FEATURE):
         super(DependsOn, self).__init__(origin, node, requirement, capability)
@@ -4,13 +4,24 @@ Template module
 import six
 import os
 
+from . import fingerprint
 from .nodes import Container, Root, Software, Volume
 
+_KINDS = (Container, Software, Volume)
+
 
 class Template:
 
     def __init__(self, name):
         self._nodes = {}
+
+        # the nodes by kind, maintained on push
+        self._kinds = {kind: {} for kind in _KINDS}
+
+        # memoized fingerprints (see fingerprint())
+        self._descriptions = {}
+        self._fingerprints = {}
+
         self.name = name
         self.description = 'No description.'
         self._outputs = []
@@ -36,7 +47,7 @@ class Template:
 
         Returns a generator expression.
         """
-        return (v for k, v in self._nodes.items() if isinstance(v, Container))
+        return (v for v in self._kinds[Container].values())
 
     @property
     def volumes(self):
@@ -44,7 +55,7 @@ class Template:
 
         Returns a generator expression.
         """
-        return (v for k, v in self._nodes.items() if isinstance(v, Volume))
+        return (v for v in self._kinds[Volume].values())
 
     @property
     def software(self):
@@ -52,10 +63,66 @@ class Template:
 
         Returns a generator expression.
         """
-        return (v for k, v in self._nodes.items() if isinstance(v, Software))
+        return (v for v in self._kinds[Software].values())
+
+    def describe_node(self, name, csar=None):
+        """ The (memoized) description of the content of a node, as a
+        JSON-compatible dict (see fingerprint.describe_node). """
+
+        if name not in self._descriptions:
+            self._descriptions[name] = fingerprint.describe_node(
+                self._nodes[name], self.tmp_dir or os.getcwd(), csar=csar)
+        return self._descriptions[name]
+
+    def fingerprint(self, name=None, csar=None):
+        """ The fingerprint of a node, i.e. a digest of its content and of
+        the fingerprints of the nodes it depends on. Without a name, the
+        root fingerprint of the whole application.
+
+        The fingerprints are computed lazily (only for the nodes reachable
+        from the given one) and memoized until a node is pushed or
+        invalidate_fingerprints() is called.
+
+        Args:
+            name (str): The name of the node.
+            csar (object): The .CSAR archive (CsarArchive) of the
+                application, from which the files are read.
+        """
+
+        names = [name] if name is not None else list(self._nodes)
+        for node_name in names:
+            if node_name not in self._nodes:
+                raise ValueError('The node {} doesn\'t exists'.format(
+                    node_name))
+
+        def local_digest(node_name):
+            return fingerprint.digest(self.describe_node(node_name, csar=csar))
+
+        def dependencies(node_name):
+            return [dependency for dependency in
+                    fingerprint.dependencies_of(self._nodes[node_name])
+                    if dependency in self._nodes]
+
+        fingerprint.merkle_fingerprints(
+            names, local_digest, dependencies, known=self._fingerprints)
+        if name is not None:
+            return self._fingerprints[name]
+        return fingerprint.root_fingerprint(self._fingerprints)
+
+    def invalidate_fingerprints(self):
+        """ Forget the memoized fingerprints (e.g. after changing a node
+        or the content of its files). """
+        self._descriptions.clear()
+        self._fingerprints.clear()
 
     def push(self, node):
+        self.invalidate_fingerprints()
         self._nodes[node.name] = node
+        for kind in _KINDS:
+            if isinstance(node, kind):
+                self._kinds[kind][node.name] = node
+            else:
+                self._kinds[kind].pop(node.name, None)
 
     def __getitem__(self, name):
         return self._nodes.get(name, None)
@@ -0,0 +1,184 @@
+"""
+The module for caching the models of TOSCA-based applications across runs.
+
+The model built by the parser (i.e. the Template with its nodes, resolved
+relationships, hosting extensions and function results) is serialized on
+disk, keyed by the content of the manifest, of its imports and by the
+inputs. Later runs on the same application load the model directly,
+without parsing the manifest with toscaparser.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+import yaml
+
+import app
+from app.common.cache import DiskCache
+from app.common.logging import LoggingFacility
+from app.tosca.csar import _imports_of
+from app.tosca.model.artifacts import File
+
+logger = LoggingFacility.get_instance().get_logger()
+
+# bump it when the model classes change in a non-compatible way
+_MODEL_FORMAT = '7'
+
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _rebase_path(path, old_base, new_base):
+    if path is not None and \
+            (path == old_base or path.startswith(old_base + '/')):
+        return new_base + path[len(old_base):]
+    return path
+
+
+def _fields(obj):
+    """ Returns the values of the fields of an object (__dict__/__slots__).
+    """
+
+    fields = list(getattr(obj, '__dict__', {}).values())
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                fields.append(getattr(obj, slot))
+    return fields
+
+
+def _rebase_files(obj, old_base, new_base, visited):
+    """ Rebase the paths of the files referenced by the model. """
+
+    if id(obj) in visited or isinstance(obj, (str, bytes, int, float)):
+        return
+    visited.add(id(obj))
+
+    if isinstance(obj, File):
+        obj.path = _rebase_path(obj.path, old_base, new_base)
+        return
+
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    elif hasattr(obj, '__dict__') or hasattr(type(obj), '__slots__'):
+        children = _fields(obj)
+    else:
+        return
+
+    for child in list(children):
+        _rebase_files(child, old_base, new_base, visited)
+
+
+def rebase_model(tosca_model, base_path):
+    """ Move the model of an application extracted in a different
+    directory (e.g. another temporary dir) to the given directory. """
+
+    old_base = tosca_model.tmp_dir
+    if old_base is None or old_base == base_path:
+        return
+
+    tosca_model.tmp_dir = base_path
+    tosca_model.manifest_path = _rebase_path(
+        tosca_model.manifest_path, old_base, base_path)
+    tosca_model.imports = [
+        {name: _rebase_path(path, old_base, base_path)
+         for name, path in entry.items()}
+        for entry in tosca_model.imports]
+    _rebase_files(tosca_model, old_base, base_path, set())
+
+
+class ModelCache(DiskCache):
+    """ An on-disk cache of the models of TOSCA-based applications. """
+
+    _NAMESPACE = 'models'
+    _MODEL = 'model.pickle'
+    _IMPORTS = 'imports.json'
+
+    def __init__(self, cache_dir, max_size=None):
+        super().__init__(cache_dir, ModelCache._NAMESPACE, max_size=max_size)
+
+    def _imports_of(self, content):
+        """ Returns the files imported by a TOSCA definition.
+
+        The imports are cached by the digest of the definition, so that
+        computing the key of a cached model doesn't parse any YAML.
+        """
+
+        key = hashlib.sha256(content).hexdigest()
+        data = self.read(key, ModelCache._IMPORTS)
+        if data is not None:
+            return json.loads(data.decode('utf-8'))
+
+        try:
+            imports = _imports_of(yaml.load(content, Loader=_YAML_LOADER))
+        except yaml.YAMLError:
+            # reported by the parser
+            return []
+        self.write(key, ModelCache._IMPORTS, json.dumps(imports).encode())
+        return imports
+
+    def model_key(self, manifest_path, inputs=None, strict=True):
+        """ Returns the key of a model, i.e. a digest of the manifest, of
+        (recursively) its imports, of the inputs and of the parsing mode
+        (the models of the fast mode are never served to the strict one).
+        """
+
+        base_path = os.path.dirname(os.path.abspath(manifest_path))
+        contents = dict()
+        pending = [os.path.abspath(manifest_path)]
+        while pending:
+            path = pending.pop()
+            if path in contents or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+            for imported in self._imports_of(contents[path]):
+                pending.append(os.path.normpath(
+                    os.path.join(os.path.dirname(path), imported)))
+
+        digest = hashlib.sha256()
+        for item in (_MODEL_FORMAT, app.__version__,
+                     'strict' if strict else 'fast'):
+            digest.update(item.encode('utf-8') + b'\0')
+        for path in sorted(contents):
+            digest.update(os.path.relpath(path, base_path).encode('utf-8'))
+            digest.update(b'\0' + contents[path] + b'\0')
+        digest.update(json.dumps(
+            inputs or {}, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def load(self, manifest_path, inputs=None, strict=True):
+        """ Returns the cached model of an application, or None if the
+        model is not cached. """
+
+        key = self.model_key(manifest_path, inputs=inputs, strict=strict)
+        data = self.read(key, ModelCache._MODEL)
+        if data is None:
+            return None
+
+        try:
+            tosca_model = pickle.loads(data)
+        except Exception as err:
+            logger.warning('Ignoring the cached model [{0}]: {1}'.format(
+                key, err))
+            return None
+
+        rebase_model(
+            tosca_model, os.path.dirname(os.path.abspath(manifest_path)))
+        # the files may have changed since the model was cached
+        tosca_model.invalidate_fingerprints()
+        tosca_model.manifest_path = manifest_path
+        logger.debug('Loaded the cached model of [{}]'.format(manifest_path))
+        return tosca_model
+
+    def store(self, manifest_path, tosca_model, inputs=None, strict=True):
+        """ Cache the model of an application. """
+
+        key = self.model_key(manifest_path, inputs=inputs, strict=strict)
+        self.write(
+            key,
+            ModelCache._MODEL,
+            pickle.dumps(tosca_model, pickle.HIGHEST_PROTOCOL))
@@ -6,12 +6,14 @@ import os
 import re
 
 from toscaparser.common.exception import ValidationError
-from toscaparser.functions import Function
 from toscaparser.tosca_template import ToscaTemplate
 
 from app.common.commons import CommonErrorMessages
 from app.common.exception import ParsingError
 from app.common.logging import LoggingFacility
+from app.tosca.definitions import cached_definitions
+from app.tosca.fast_parser import FastToscaTemplate
+from app.tosca.functions import resolve_functions
 from app.tosca.model.artifacts import DockerImage, DockerImageExecutable, File
 from app.tosca.model.nodes import Container, Software, Volume
 from app.tosca.model.template import Template
@@ -49,25 +51,31 @@ class ToscaRequirementTypes(object):
     REL_HOST = 'tosca.relationships.HostedOn'
 
 
-def get_attributes(args, nodes):
-    get = nodes
-    for a in args:
-        get = get[a]
-    return get
-
-
 class ToscaParser:
     """ A parser for TOSCA-based applications. """
 
-    def __init__(self):
-        pass
+    def __init__(self, definition_cache=None, model_cache=None, strict=True):
+        """
+        Args:
+            definition_cache (object): The cache of the imported TOSCA
+                definitions (e.g. tosker-types.yaml). If omitted, the
+                definitions are parsed on every run.
+            model_cache (object): The cache of the built models. If
+                omitted, the model is built on every run.
+            strict (bool): Validate the manifest with toscaparser (strict
+                mode), otherwise against the precompiled TosKer profile
+                only (fast mode, see fast_parser).
+        """
+
+        self._definition_cache = definition_cache
+        self._model_cache = model_cache
+        self._strict = strict
 
     @staticmethod
     def _update_hosted_nodes(tpl):
-        for container in tpl.containers:
-            for sw in tpl.software:
-                if sw.host_container == container:
-                    container.add_hosted_node(sw)
+        for sw in tpl.software:
+            if sw.host_container is not None:
+                tpl[sw.host_container.name].add_hosted_node(sw)
 
     @staticmethod
     def _add_pointer(tpl):
@@ -134,7 +142,7 @@ class ToscaParser:
 
         This function walks throught the TOSCA template searching 
         for TOSCA functions placeholders, then it updates the 
-        original template by resolving them.
+        original template by resolving them (see resolve_functions).
 
         e.g.
         # topology_template:
@@ -156,68 +164,12 @@ class ToscaParser:
             inputs (Dict): A dictionary containing TOSCA inputs.
             base_path (str): The path of the TOSCA-based application.
 
+        Raises:
+            ParsingError: If the TOSCA functions can't be resolved
+                (e.g. cyclic references).
         """
 
-        def get(name, value, args):
-            """ Returns the result of a TOSCA function. """
-
-            if 'SELF' == args[0]:
-                args[0] = name
-            return get_attributes(args[1:], nodes[args[0]][value])
-
-        def parse_node(name, node, tosca_inputs):
-            """ Parse a TOSCA node and update the node's attributes by resolving
-            inputs/outputs functions.
-            
-            Args:
-                name (str): The node name.
-                node: A dict containing the attributes associated to the node.
-                    (e.g. type, artifacts, requirements,
-                    interfaces, properties)
-                tosca_inputs: A dict containing the inputs associated
-                    to the TOSCA topology template.
-            """
-            for k, v in node.items():
-                # function parsed by toscaparser library
-                if isinstance(v, Function):
-                    node[k] = v.result()
-                elif isinstance(v, dict):   # otherwise
-                    
-                    # get_property function is found
-                    if 'get_property' in v:
-                        node[k] = get(name, 'properties', v['get_property'])
-
-                    # get_artifact function is found
-                    elif 'get_artifact' in v:
-                        art = get(name, 'artifacts', v['get_artifact'])
-                        node[k] = File(
-                            None,
-                            os.path.abspath(os.path.join(base_path, art)))
-                        
-                    # get_input function is found
-                    elif 'get_input' in v:
-                        if v['get_input'] in inputs:
-                            node[k] = inputs[v['get_input']]
-                        else:
-                            node[k] = tosca_inputs[v['get_input']]['default']
-
-                    else:
-                        parse_node(name, v, tosca_inputs)
-
-        nodes = tosca_template.topology_template.tpl['node_templates']
-
-        tosca_inputs = None
-        if 'inputs' in tosca_template.topology_template.tpl:
-            tosca_inputs = tosca_template.topology_template.tpl['inputs']
-
-        for k, v in nodes.items():
-            parse_node(k, v, tosca_inputs)
-
-        tosca_outputs = None
-        if 'outputs' in tosca_template.topology_template.tpl:
-            tosca_outputs = tosca_template.topology_template.tpl['outputs']
-            for k, v in tosca_outputs.items():
-                parse_node(k, v, tosca_inputs)
+        resolve_functions(tosca_template, inputs, base_path)
 
     def build_model(self, manifest_path, inputs=None):
         """ Build the model representing the TOSCA-based application. """
@@ -229,13 +181,24 @@ class ToscaParser:
         if inputs is None:
             inputs = {}
 
+        if self._model_cache is not None:
+            template = self._model_cache.load(
+                manifest_path, inputs=inputs, strict=self._strict)
+            if template is not None:
+                return template
+
         try:
             manifest_file = os.path.basename(manifest_path)
             app_name, _ = os.path.splitext(manifest_file)
 
-            # toscaparser Model for tosca-based applications
-            # (Built-in validation for node_templates and required fields)
-            tosca = ToscaTemplate(manifest_path)
+            if self._strict:
+                # toscaparser Model for tosca-based applications
+                # (Built-in validation for node_templates and required fields)
+                with cached_definitions(self._definition_cache):
+                    tosca = ToscaTemplate(manifest_path)
+            else:
+                # validated against the TosKer profile only
+                tosca = FastToscaTemplate(manifest_path)
 
             # Note: tosca.path is the path to the manifest file
             base_path = '/'.join(tosca.path.split('/')[:-1])
@@ -492,6 +455,11 @@ class ToscaParser:
             # hosts at least one software node and then it needs to be "toskosed"
             ToscaParser._update_hosted_nodes(template)
 
+            if self._model_cache is not None:
+                self._model_cache.store(
+                    manifest_path, template, inputs=inputs,
+                    strict=self._strict)
+
             return template
 
         except ValueError as err:
@@ -0,0 +1,164 @@
+"""
+The module for planning the deployment of TOSCA-based applications.
+
+Each node is deployed by walking its management protocol from the initial
+state to the deployed state (e.g. create, configure and start a software
+component). An operation can be executed only when the requirements of
+its transition and of the reached state are satisfied, i.e. when the
+nodes targeted by the corresponding relationships offer the required
+capabilities in their current state.
+
+The plan groups the operations in waves: the operations of a wave can run
+in parallel, and each wave starts when the previous one is completed.
+Each operation is scheduled in the earliest wave it can run in.
+"""
+
+from collections import deque
+
+from app.common.exception import PlanningError
+from app.common.logging import LoggingFacility
+from app.tosca.model import protocol
+from app.tosca.model.relationships import _get_str_name
+
+logger = LoggingFacility.get_instance().get_logger()
+
+# the state of a deployed node, for each protocol definition
+DEPLOYED_STATES = {
+    protocol.CONTAINER_PROTOCOL.name: protocol.CONTAINER_STATE_RUNNING,
+    protocol.SOFTWARE_PROTOCOL.name: protocol.SOFTWARE_STATE_RUNNING,
+    protocol.VOLUME_PROTOCOL.name: protocol.VOLUME_STATE_CREATED,
+}
+
+
+def _deployment_operations(definition):
+    """ Returns the (shortest) sequence of transitions leading a node from
+    the initial state to the deployed state. """
+
+    target = definition.find_state(DEPLOYED_STATES[definition.name])
+    paths = {definition.initial_state.name: []}
+    pending = deque([definition.initial_state])
+    while pending:
+        state = pending.popleft()
+        if state is target:
+            return paths[state.name]
+        for transition in state.transitions:
+            if transition.target.name not in paths:
+                paths[transition.target.name] = \
+                    paths[state.name] + [transition]
+                pending.append(transition.target)
+
+    raise PlanningError('The [{}] protocol can\'t reach the [{}] state'.format(
+        definition.name, target.name))
+
+
+class _Deployment:
+    """ The progress of the deployment of a node. """
+
+    __slots__ = ('node', 'protocol', 'transitions', 'step')
+
+    def __init__(self, node, transitions):
+        self.node = node
+        # a fresh cursor, the node's protocol is left untouched
+        self.protocol = protocol.Protocol(node.protocol.definition)
+        self.transitions = transitions
+        self.step = 0
+
+    @property
+    def completed(self):
+        return self.step == len(self.transitions)
+
+    @property
+    def next_transition(self):
+        return self.transitions[self.step]
+
+
+def _is_enabled(deployment, deployments):
+    """ Check if the next operation of a node can be executed. """
+
+    transition = deployment.next_transition
+    requires = set(transition.requires) | set(transition.target.requires)
+    for rel in deployment.node.relationships:
+        if rel.requirement not in requires:
+            continue
+        target = deployments.get(_get_str_name(rel.to))
+        if target is not None and \
+                rel.capability not in target.protocol.current_state.offers:
+            return False
+    return True
+
+
+def generate_plan(tosca_model):
+    """ Generate the deployment plan of a TOSCA-based application.
+
+    The toskose-manager is not part of the plan (it runs the plan).
+
+    Args:
+        tosca_model (object): The model representing the TOSCA application.
+
+    Returns:
+        waves: A list of waves, where each wave is a list of operations as
+            (node name, full operation name).
+    """
+
+    deployments = dict()
+    for node in tosca_model.nodes:
+        if getattr(node, 'is_manager', False) or node.protocol is None:
+            continue
+        deployments[node.name] = _Deployment(
+            node, _deployment_operations(node.protocol.definition))
+
+    # the nodes whose operations may be enabled by a node's progress
+    dependents = {name: set() for name in deployments}
+    for name, deployment in deployments.items():
+        for rel in deployment.node.relationships:
+            target = _get_str_name(rel.to)
+            if target in dependents:
+                dependents[target].add(name)
+
+    waves = list()
+    candidates = set(deployments)
+    while candidates:
+        enabled = [
+            deployments[name] for name in sorted(candidates)
+            if not deployments[name].completed and
+            _is_enabled(deployments[name], deployments)]
+        if not enabled:
+            break
+
+        # the operations of a wave are enabled by the states reached by
+        # the previous waves, then they're executed all together
+        waves.append([
+            (d.node.name, d.next_transition.full_operation)
+            for d in enabled])
+        candidates = set()
+        for deployment in enabled:
+            deployment.protocol.current_state = \
+                deployment.next_transition.target
+            deployment.step += 1
+            candidates.add(deployment.node.name)
+            candidates.update(dependents[deployment.node.name])
+
+    blocked = sorted(
+        name for name, d in deployments.items() if not d.completed)
+    if blocked:
+        logger.error('Failed to plan the deployment of [{}]'.format(
+            ', '.join(blocked)))
+        raise PlanningError(
+            'No valid deployment plan exists for [{}] (unsatisfiable or \
+            cyclic requirements)'.format(', '.join(blocked)))
+
+    logger.debug('Planned [{0}] waves for [{1}]'.format(
+        len(waves), tosca_model.name))
+    return waves
+
+
+def dump_plan(waves):
+    """ Returns the plan as a dict (ready to be serialized). """
+
+    return {
+        'waves': [
+            [{'node': node, 'operation': operation}
+             for node, operation in wave]
+            for wave in waves
+        ]
+    }
@@ -0,0 +1,162 @@
+"""
+The precompiled TosKer profile, i.e. the node types of TOSCA-based
+applications supported by toskose (tosker.nodes.*).
+
+The profile is compiled from the TosKer definitions (tosker-types.yaml),
+so that the fast parser never parses them. A manifest importing different
+definitions (e.g. a newer version of the TosKer types) has its imported
+node types compiled on the fly with compile_node_types().
+"""
+
+# the digest (SHA-256) of the tosker-types.yaml the profile is compiled from
+TOSKER_TYPES_DIGEST = \
+    'baeaec00d951b7588149f5a1619bf52240376f5af4e578879b47948214a6fc8d'
+
+_UNBOUNDED = 'UNBOUNDED'
+
+# the normative TOSCA node types the TosKer types are derived from
+TOSCA_NODE_TYPES = {
+    'tosca.nodes.Root': {
+        'derived_from': None,
+        'properties': [],
+        'requirements': [
+            ['dependency', {
+                'capability': 'tosca.capabilities.Node',
+                'node': 'tosca.nodes.Root',
+                'relationship': 'tosca.relationships.DependsOn',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+        ],
+        'capabilities': {
+            'feature': 'tosca.capabilities.Node',
+        },
+    },
+}
+
+TOSKER_NODE_TYPES = {
+    'tosker.nodes.Root': {
+        'derived_from': 'tosca.nodes.Root',
+        'properties': [],
+        'requirements': [],
+        'capabilities': {},
+    },
+    'tosker.nodes.Container': {
+        'derived_from': 'tosca.nodes.Root',
+        'properties': [
+            'command', 'env_variable', 'os_distribution', 'ports',
+            'share_data', 'supported_sw',
+        ],
+        'requirements': [
+            ['storage', {
+                'capability': 'tosca.capabilities.Attachment',
+                'node': 'tosker.nodes.Volume',
+                'relationship': 'tosca.relationships.AttachesTo',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+            ['connection', {
+                'capability': 'tosca.capabilities.Endpoint',
+                'node': 'tosker.nodes.Root',
+                'relationship': 'tosca.relationships.ConnectsTo',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+            ['dependency', {
+                'capability': 'tosca.capabilities.Node',
+                'node': 'tosker.nodes.Root',
+                'relationship': 'tosca.relationships.DependsOn',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+        ],
+        'capabilities': {
+            'endpoint': 'tosca.capabilities.Endpoint',
+            'feature': 'tosca.capabilities.Node',
+            'host': 'tosca.capabilities.Container',
+        },
+    },
+    'tosker.nodes.Volume': {
+        'derived_from': 'tosker.nodes.Root',
+        'properties': [],
+        'requirements': [],
+        'capabilities': {
+            'attachment': 'tosca.capabilities.Attachment',
+        },
+    },
+    'tosker.nodes.Software': {
+        'derived_from': 'tosker.nodes.Root',
+        'properties': [],
+        'requirements': [
+            ['connection', {
+                'capability': 'tosca.capabilities.Endpoint',
+                'node': 'tosker.nodes.Root',
+                'relationship': 'tosca.relationships.ConnectsTo',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+            ['dependency', {
+                'capability': 'tosca.capabilities.Node',
+                'node': 'tosker.nodes.Root',
+                'relationship': 'tosca.relationships.DependsOn',
+                'occurrences': [0, _UNBOUNDED],
+            }],
+            ['host', {
+                'capability': 'tosca.capabilities.Container',
+                'node': 'tosker.nodes.Container',
+                'relationship': 'tosca.relationships.HostedOn',
+                'occurrences': [1, 1],
+            }],
+        ],
+        'capabilities': {
+            'endpoint': 'tosca.capabilities.Endpoint',
+            'feature': 'tosca.capabilities.Node',
+            'host': 'tosca.capabilities.Container',
+        },
+    },
+}
+
+
+def _occurrences(value):
+    """ Normalize the occurrences of a requirement as [min, max]. """
+
+    if value is None:
+        return [1, 1]
+    if isinstance(value, list):
+        return list(value)
+    return [value, value]
+
+
+def compile_node_types(definition):
+    """ Compile the node types of a TOSCA definition (e.g. the imported
+    definitions or the manifest itself) in the format of the profile.
+
+    Args:
+        definition (dict): The (loaded) TOSCA definition.
+
+    Returns:
+        A dict node type => compiled node type.
+    """
+
+    compiled = dict()
+    for name, node_type in (definition.get('node_types') or {}).items():
+        node_type = node_type or {}
+        requirements = list()
+        for requirement in node_type.get('requirements') or []:
+            for req_name, req in requirement.items():
+                if not isinstance(req, dict):
+                    # short notation, i.e. the capability
+                    req = {'capability': req}
+                requirements.append([req_name, {
+                    'capability': req.get('capability'),
+                    'node': req.get('node'),
+                    'relationship': req.get('relationship'),
+                    'occurrences': _occurrences(req.get('occurrences')),
+                }])
+        capabilities = dict()
+        for cap_name, cap in (node_type.get('capabilities') or {}).items():
+            # short notation, i.e. the capability type
+            capabilities[cap_name] = cap.get('type') \
+                if isinstance(cap, dict) else cap
+        compiled[name] = {
+            'derived_from': node_type.get('derived_from'),
+            'properties': sorted(node_type.get('properties') or {}),
+            'requirements': requirements,
+            'capabilities': capabilities,
+        }
+    return compiled
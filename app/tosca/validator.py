@@ -1,10 +1,8 @@
 import os
-import tempfile
 import zipfile
 import yaml
 
 from app.common.logging import LoggingFacility
-from app.common.commons import unpack_archive
 from app.common.commons import CommonErrorMessages
 from app.common.commons import suppress_stderr
 from app.common.exception import FileNotFoundError
@@ -27,16 +25,23 @@ _required_attrs = [
 ]
 
 
-def _validate_manifest(manifest_path):
+def _validate_manifest(archive, manifest):
+    """ Validate the TOSCA manifest contained in a .CSAR archive.
+
+    Args:
+        archive (object): The opened .CSAR archive (ZipFile).
+        manifest (str): The name of the manifest within the archive.
+    """
     pass
 
 
-def validate_csar(csar_path):
-    """ Validate a TOSCA-based application compressed in a .CSAR archive. """
+def open_csar(csar_path):
+    """ Open a TOSCA-based application compressed in a .CSAR archive.
 
-    # TODO
-    # AGGIUNGI VALIDAZIONE CON SOMMELIER!!!
-    # E'ANCHE IN TESI!
+    Returns:
+        archive: The opened .CSAR archive (ZipFile), which can be shared
+            by the validation and the extraction of the archive.
+    """
 
     # file existence
     if not os.path.isfile(csar_path):
@@ -59,69 +64,86 @@ def validate_csar(csar_path):
         logger.error(err_msg)
         raise FileNotFoundError(err_msg)
 
+    return zipfile.ZipFile(csar_path, 'r')
+
+
+def validate_csar(csar_path, archive=None):
+    """ Validate a TOSCA-based application compressed in a .CSAR archive.
+
+    Args:
+        csar_path (str): The path to the .CSAR archive.
+        archive (object): The .CSAR archive (ZipFile) already opened
+            by open_csar. If omitted, the archive is opened (and closed)
+            by the validation.
+    """
+
+    # TODO
+    # AGGIUNGI VALIDAZIONE CON SOMMELIER!!!
+    # E'ANCHE IN TESI!
+
+    if archive is None:
+        with open_csar(csar_path) as archive:
+            return validate_csar(csar_path, archive=archive)
+
     logger.debug('Validating [{}]'.format(csar_path))
     csar_metadata = {}
 
     # validate csar structure
-    with zipfile.ZipFile(csar_path, 'r') as archive:
-        # TODO fix yaml error and remove it (workaround)
-        with suppress_stderr():
-            filelist = [e.filename for e in archive.filelist]
-
-            if _TOSCA_METADATA_PATH not in filelist:
-                logger.error(
-                    '{0} does not contain a valid TOSCA.meta'.format(
-                        csar_path))
+    # TODO fix yaml error and remove it (workaround)
+    with suppress_stderr():
+        filelist = [e.filename for e in archive.filelist]
+
+        if _TOSCA_METADATA_PATH not in filelist:
+            logger.error(
+                '{0} does not contain a valid TOSCA.meta'.format(
+                    csar_path))
+            raise MalformedCsarError(
+                CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
+
+        # validate TOSCA.meta
+        try:
+
+            # TODO !!!fix!!! YAMLLoadWarning: calling yaml.load()
+            # without Loader=... is deprecated, as the default Loader
+            # is unsafe.
+            # Please read https://msg.pyyaml.org/load for full details.
+            csar_metadata = yaml.load(archive.read(_TOSCA_METADATA_PATH))
+            if type(csar_metadata) is not dict:
+                logger.error('{0} is not a valid dictionary'.format(
+                    _TOSCA_METADATA_PATH))
                 raise MalformedCsarError(
                     CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
 
-            # validate TOSCA.meta
-            try:
+        except yaml.YAMLError as err:
+            logger.exception(err)
+            raise FatalError(CommonErrorMessages._DEFAULT_FATAL_ERROR_MSG)
 
-                # TODO !!!fix!!! YAMLLoadWarning: calling yaml.load()
-                # without Loader=... is deprecated, as the default Loader
-                # is unsafe.
-                # Please read https://msg.pyyaml.org/load for full details.
-                csar_metadata = yaml.load(archive.read(_TOSCA_METADATA_PATH))
-                if type(csar_metadata) is not dict:
-                    logger.error('{0} is not a valid dictionary'.format(
+        # validate tosca metadata
+        for key in _TOSCA_METADATA_REQUIRED_KEYS:
+            if key not in csar_metadata:
+                logger.error(
+                    'Missing {0} in {1}'.format(
+                        key,
                         _TOSCA_METADATA_PATH))
-                    raise MalformedCsarError(
-                        CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
-
-            except yaml.YAMLError as err:
-                logger.exception(err)
-                raise FatalError(CommonErrorMessages._DEFAULT_FATAL_ERROR_MSG)
-
-            # validate tosca metadata
-            for key in _TOSCA_METADATA_REQUIRED_KEYS:
-                if key not in csar_metadata:
-                    logger.error(
-                        'Missing {0} in {1}'.format(
-                            key,
-                            _TOSCA_METADATA_PATH))
-                    raise MalformedCsarError(
-                        CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
-
-            # validate tosca manifest file
-            manifest = csar_metadata.get(_TOSCA_METADATA_MANIFEST_KEY)
-            if manifest is None or manifest not in filelist:
-                logger.error('{0} contains an invalid manifest reference \
-                    or it does not exist'.format(
-                    _TOSCA_METADATA_PATH))
                 raise MalformedCsarError(
                     CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
 
-            # validate other tosca metadata
-            for option in _TOSCA_METADATA_OPTIONAL_KEYS:
-                if option not in csar_metadata:
-                    logger.warning('Missing {0} option in {1}'.format(
-                        option, _TOSCA_METADATA_PATH))
-
-            # validate tosca manifest (yaml)
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                unpack_archive(csar_path, tmp_dir)
-                manifest_path = os.path.join(tmp_dir, manifest)
-                _validate_manifest(manifest_path)
+        # validate tosca manifest file
+        manifest = csar_metadata.get(_TOSCA_METADATA_MANIFEST_KEY)
+        if manifest is None or manifest not in filelist:
+            logger.error('{0} contains an invalid manifest reference \
+                or it does not exist'.format(
+                _TOSCA_METADATA_PATH))
+            raise MalformedCsarError(
+                CommonErrorMessages._DEFAULT_MALFORMED_CSAR_ERROR_MSG)
+
+        # validate other tosca metadata
+        for option in _TOSCA_METADATA_OPTIONAL_KEYS:
+            if option not in csar_metadata:
+                logger.warning('Missing {0} option in {1}'.format(
+                    option, _TOSCA_METADATA_PATH))
+
+        # validate tosca manifest (yaml)
+        _validate_manifest(archive, manifest)
 
     return csar_metadata
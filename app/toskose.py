@@ -4,18 +4,28 @@ The module where the "toskosing" process takes place.
 
 import os
 import tempfile
+from contextlib import contextmanager
+from functools import partial
 
 import app.common.constants as constants
+from app.common.cache import evict_caches
 from app.common.logging import LoggingFacility
-from app.common.exception import (FatalError)
-from app.common.commons import (CommonErrorMessages, unpack_archive)
-from app.tosca.validator import validate_csar
+from app.common.exception import (DockerOperationError, FatalError)
+from app.common.commons import CommonErrorMessages
+from app.tosca.csar import CsarArchive, CsarCache, CsarWorkspace
+from app.tosca.definitions import DefinitionCache
+from app.tosca.diff import (diff_models, dump_snapshot, load_snapshot,
+                            snapshot)
+from app.tosca.model_cache import ModelCache
+from app.tosca.validator import open_csar, validate_csar
 from app.tosca.parser import ToscaParser
+from app.docker.credentials import CredentialProvider
 from app.docker.manager import (DockerManager, ToskosingProcessType)
+from app.docker.pipeline import StagePipeline
 from app.docker.compose import generate_compose
 from app.configuration.validation import ConfigValidator
 from app.configuration.completer import (generate_default_config)
-from app.context import build_app_context
+from app.context import add_interfaces_envs, build_app_context_archives
 from app.updater import toskose_model
 
 
@@ -26,10 +36,50 @@ class Toskoserizator:
     def __init__(self,
                  docker_url=None,
                  debug=False,
-                 quiet=False):
+                 quiet=False,
+                 cache_dir=None,
+                 cache_max_size=None,
+                 strict_parsing=True,
+                 interactive=True):
+        """
+        Args:
+            docker_url (str): The URL for connecting to the Docker Engine.
+            debug (bool): Enable the debug mode.
+            quiet (bool): Give less output.
+            cache_dir (str): The directory where the extracted .CSAR
+                archives, the parsed TOSCA definitions and the built models
+                are cached across runs. If omitted, nothing is cached.
+            cache_max_size (int): The maximum size of the whole cache
+                directory (bytes), shared by the cached archives,
+                definitions and models.
+                (default: constants.DEFAULT_CACHE_MAX_SIZE)
+            strict_parsing (bool): Validate the TOSCA manifest with the
+                full TOSCA validation (toscaparser), otherwise against the
+                TosKer profile only.
+            interactive (bool): Ask the user for the missing data (e.g.
+                the credentials of the Docker Registries). Otherwise,
+                the missing data are errors.
+        """
 
         self._docker_url = docker_url
-        self._docker_manager = DockerManager(docker_url)
+        self._interactive = interactive
+        self._credentials = CredentialProvider(interactive=interactive)
+        self._docker_manager = DockerManager(
+            docker_url, credentials=self._credentials)
+        self._strict_parsing = strict_parsing
+
+        self._csar_cache = None
+        self._definition_cache = None
+        self._model_cache = None
+        self._cache_max_size = None
+        if cache_dir is not None:
+            if cache_max_size is None:
+                cache_max_size = constants.DEFAULT_CACHE_MAX_SIZE
+            # the caches share the maximum size (see _csar_workspace)
+            self._cache_max_size = cache_max_size
+            self._csar_cache = CsarCache(cache_dir)
+            self._definition_cache = DefinitionCache(cache_dir)
+            self._model_cache = ModelCache(cache_dir)
 
         Toskoserizator.setup_logging(debug=debug, quiet=quiet)
 
@@ -78,8 +128,141 @@ class Toskoserizator:
         logger.info('Output dir {0} built'.format(output_path))
         return output_path
 
-    def toskosed(self, csar_path,
-                 config_path=None, output_path=None, enable_push=False):
+    @contextmanager
+    def _csar_workspace(self, csar_path):
+        """ Provide the workspace where the .CSAR archive is extracted.
+
+        The workspace is taken from the cache (if enabled), so that the
+        content extracted by previous runs on the same archive is reused.
+        Otherwise, a temporary workspace is used. A cached workspace is
+        shared by the runs on the same archive, so nothing but the content
+        of the archive is written in it (see toskosed).
+        """
+
+        if self._csar_cache is None:
+            with tempfile.TemporaryDirectory() as tmp_dir_csar:
+                yield CsarWorkspace(tmp_dir_csar)
+        else:
+            try:
+                yield self._csar_cache.workspace(csar_path)
+            finally:
+                evict_caches(
+                    [self._csar_cache, self._definition_cache,
+                     self._model_cache],
+                    self._cache_max_size)
+
+    def _configure_credentials(self, model):
+        """ Provide the registry passwords of the toskose configuration for
+        pushing the toskosed images. """
+
+        for container in model.containers:
+            image = container.toskosed_image
+            if getattr(image, 'registry_password', None):
+                self._credentials.configure(
+                    image.name, image.registry_password)
+
+    @staticmethod
+    def _toskosing_jobs(model, contexts, enable_push):
+        """ Generate the arguments of the "toskosing" job of each container
+            node that needs to be toskosed.
+
+        Args:
+            model (object): The model representing the TOSCA application.
+            contexts (dict): The app's context of each container node
+                to be toskosed.
+            enable_push (bool): Enable/Disable the auto-pushing of toskosed
+                images to Docker Registries.
+        """
+
+        for container in model.containers:
+            if container.name not in contexts:
+                # unaffected by the changes of the app
+                continue
+            if container.is_manager:
+                logger.info('Detected [{}] node [manager].'.format(
+                    container.name))
+                template = ToskosingProcessType.TOSKOSE_MANAGER
+            elif container.hosted:
+                # if the container hosts sw components
+                # then it need to be toskosed
+                logger.info('Detected [{}] node.'.format(
+                    container.name))
+                template = ToskosingProcessType.TOSKOSE_UNIT
+            else:
+                # the container doesn't host any sw component,
+                # left untouched
+                continue
+
+            yield container, dict(
+                src_image=container.image.name,
+                src_tag=container.image.tag,
+                dst_image=container.toskosed_image.name,
+                dst_tag=container.toskosed_image.tag,
+                context=contexts[container.name],
+                process_type=template,
+                app_name=model.name,
+                toskose_image=container.toskosed_image.base_name,
+                toskose_tag=container.toskosed_image.base_tag,
+                enable_push=enable_push
+            )
+
+    def _toskose_containers(self, model, contexts, enable_push,
+                            jobs=None, stage_limits=None):
+        """ Toskose the container nodes of a TOSCA application.
+
+        The container nodes are toskosed in a pipeline, where (with more
+        than one job) the pull/build/push stages of different nodes overlap.
+        With a single job, the nodes are toskosed one at a time. The errors
+        of all the failed nodes are collected before aborting.
+
+        Args:
+            model (object): The model representing the TOSCA application.
+            contexts (dict): The app's context of each container node.
+            enable_push (bool): Enable/Disable the auto-pushing of toskosed
+                images to Docker Registries.
+            jobs (int): The number of container nodes toskosed concurrently.
+                (default: 1)
+            stage_limits (dict): The maximum number of container nodes
+                in each stage of the pipeline (e.g. {ToskosingStage.PUSH: 2}).
+        """
+
+        if jobs is None:
+            jobs = constants.DEFAULT_TOSKOSING_JOBS
+        if jobs < 1:
+            raise ValueError('The number of jobs must be a positive integer')
+
+        toskosing_jobs = Toskoserizator._toskosing_jobs(
+            model, contexts, enable_push)
+
+        logger.info('Toskosing container nodes with [{}] jobs'.format(jobs))
+        pipeline = StagePipeline(jobs, stage_limits=stage_limits)
+        failures = pipeline.run({
+            container.name: partial(
+                self._docker_manager.toskose_image, **job)
+            for container, job in toskosing_jobs
+        })
+
+        if failures:
+            raise DockerOperationError(
+                'Failed to toskose the container nodes: {}'.format(
+                    ', '.join(sorted(failures))))
+
+    @staticmethod
+    def _affected_containers(current_snapshot, previous_snapshot):
+        """ Returns the names of the container nodes to be toskosed, i.e.
+        affected by the changes since the previous snapshot (if any). """
+
+        if previous_snapshot is None:
+            return None
+
+        diff = diff_models(load_snapshot(previous_snapshot), current_snapshot)
+        logger.info('Toskosing the container nodes affected by changes: \
+            [{}]'.format(', '.join(sorted(diff.rebuild))))
+        return diff.rebuild
+
+    def toskosed(self, csar_path, config_path=None, output_path=None,
+                 enable_push=False, jobs=None, stage_limits=None,
+                 previous_snapshot=None):
         """
         Entrypoint for the "toskoserization" process.
 
@@ -89,6 +272,13 @@ class Toskoserizator:
             output_path (str): The path to the output directory.
             enable_push (bool): Enable/Disable the auto-pushing of toskosed
                 images to Docker Registries.
+            jobs (int): The number of container nodes toskosed concurrently.
+                (default: 1)
+            stage_limits (dict): The maximum number of container nodes
+                in each stage of the "toskosing" pipeline.
+            previous_snapshot (str): The path to the snapshot of a previous
+                run. If given, only the container nodes affected by the
+                changes since that run are toskosed.
         Returns:
             The docker-compose file representing the TOSCA-based application.
         """
@@ -109,80 +299,85 @@ class Toskoserizator:
             raise ValueError('The output path {} doesn\'t exists'.format(
                 output_path))
 
-        csar_metadata = validate_csar(csar_path)
-
-        # temporary dir for unpacking data from .CSAR archive
-        # temporary dir for building docker images
-        with tempfile.TemporaryDirectory() as tmp_dir_context:
-            with tempfile.TemporaryDirectory() as tmp_dir_csar:
-                try:
-                    unpack_archive(csar_path, tmp_dir_csar)
-                    manifest_path = os.path.join(
-                        tmp_dir_csar,
-                        csar_metadata['Entry-Definitions'])
-
-                    model = ToscaParser().build_model(manifest_path)
-
-                    if config_path is None:
-                        config_path = generate_default_config(model)
-                    else:
-                        ConfigValidator().validate_config(
-                            config_path,
-                            tosca_model=model)
-
-                        # try to auto-complete config (if necessary)
-                        config_path = generate_default_config(
-                            model,
-                            config_path=config_path)
-
-                    toskose_model(model, config_path)
-                    build_app_context(tmp_dir_context, model)
-
-                    for container in model.containers:
-                        if container.is_manager:
-                            logger.info('Detected [{}] node [manager].'.format(
-                                container.name))
-                            template = ToskosingProcessType.TOSKOSE_MANAGER
-                        elif container.hosted:
-                            # if the container hosts sw components
-                            # then it need to be toskosed
-                            logger.info('Detected [{}] node.'.format(
-                                container.name))
-                            template = ToskosingProcessType.TOSKOSE_UNIT
-                        else:
-                            # the container doesn't host any sw component,
-                            # left untouched
-                            continue
-
-                        ctx_path = os.path.join(
-                            tmp_dir_context,
-                            model.name,
-                            container.name)
-
-                        self._docker_manager.toskose_image(
-                            src_image=container.image.name,
-                            src_tag=container.image.tag,
-                            dst_image=container.toskosed_image.name,
-                            dst_tag=container.toskosed_image.tag,
-                            context=ctx_path,
-                            process_type=template,
-                            app_name=model.name,
-                            toskose_image=container.toskosed_image.base_name,
-                            toskose_tag=container.toskosed_image.base_tag,
-                            enable_push=enable_push
-                        )
-
-                    generate_compose(
-                        tosca_model=model,
-                        output_path=output_path,
-                    )
-
-                    self.quit()
-
-                except Exception as err:
-                    logger.error(err)
-                    raise FatalError(
-                        CommonErrorMessages._DEFAULT_FATAL_ERROR_MSG)
+        # the .CSAR archive is opened once, and it is shared by the
+        # validation and the (lazy) extraction of its content
+        # the files generated by the run (e.g. the completed toskose
+        # configuration) are kept apart from the (cached) workspace
+        with open_csar(csar_path) as archive, \
+                self._csar_workspace(csar_path) as workspace, \
+                tempfile.TemporaryDirectory() as run_dir:
+
+            csar_metadata = workspace.load_metadata()
+            if csar_metadata is None:
+                csar_metadata = validate_csar(csar_path, archive=archive)
+                workspace.store_metadata(csar_metadata)
+            else:
+                logger.info('Reusing the cached validation of [{}]'.format(
+                    csar_path))
+
+            try:
+                # artifacts and scripts are extracted on demand
+                # (the app's contexts are streamed to the Docker Engine)
+                csar = CsarArchive(archive, workspace.root_path)
+                manifest_path = csar.extract_definitions(
+                    csar_metadata['Entry-Definitions'])
+
+                model = ToscaParser(
+                    definition_cache=self._definition_cache,
+                    model_cache=self._model_cache,
+                    strict=self._strict_parsing).build_model(manifest_path)
+
+                generated_config_path = os.path.join(
+                    run_dir, constants.DEFAULT_TOSKOSE_CONFIG_FILENAME)
+                if config_path is None:
+                    config_path = generate_default_config(
+                        model,
+                        output_path=generated_config_path,
+                        interactive=self._interactive)
+                else:
+                    ConfigValidator().validate_config(
+                        config_path,
+                        tosca_model=model)
+
+                    # try to auto-complete config (if necessary)
+                    config_path = generate_default_config(
+                        model,
+                        config_path=config_path,
+                        output_path=generated_config_path,
+                        interactive=self._interactive)
+
+                toskose_model(model, config_path)
+                self._configure_credentials(model)
+
+                # the envs of all the container nodes are generated, as
+                # they are all in the docker-compose file
+                add_interfaces_envs(model)
+
+                current_snapshot = snapshot(model, csar=csar)
+                contexts = build_app_context_archives(
+                    model,
+                    csar=csar,
+                    containers=Toskoserizator._affected_containers(
+                        current_snapshot, previous_snapshot))
+
+                self._toskose_containers(
+                    model, contexts, enable_push,
+                    jobs=jobs, stage_limits=stage_limits)
+
+                generate_compose(
+                    tosca_model=model,
+                    output_path=output_path,
+                )
+
+                dump_snapshot(current_snapshot, os.path.join(
+                    output_path, constants.DEFAULT_SNAPSHOT_FILENAME))
+
+                self.quit()
+
+            except Exception as err:
+                logger.error(err)
+                raise FatalError(
+                    CommonErrorMessages._DEFAULT_FATAL_ERROR_MSG)
 
     def quit(self):
         self._docker_manager.close()
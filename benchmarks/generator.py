@@ -0,0 +1,254 @@
+"""
+Generator of synthetic TOSCA-based applications (TosKer profile).
+
+The generated .CSAR archive contains a topology of container nodes, each
+hosting some software nodes (with their lifecycle scripts and artifacts),
+volume nodes attached to the containers and connections between the
+software nodes. A toskose configuration for the application is generated
+as well.
+
+Usage:
+    python benchmarks/generator.py OUTPUT_DIR [--containers N]
+        [--software N] [--artifacts N] [--artifact-size BYTES]
+        [--connections N] [--volumes N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import zipfile
+
+import yaml
+
+_TOSKER_TYPES = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'data',
+    'tosker-types.yaml'))
+
+_OPERATIONS = ('create', 'configure', 'start', 'stop', 'delete')
+
+_IMAGES = ('maven:3.3-jdk-8', 'node:6', 'python:3.7-slim')
+
+
+class Topology:
+    """ The parameters of a synthetic application.
+
+    Attributes:
+        containers (int): The number of container nodes.
+        software (int): The number of software nodes hosted on each
+            container node.
+        artifacts (int): The number of artifacts of each software node.
+        artifact_size (int): The size (bytes) of each artifact.
+        connections (float): The average number of connections of each
+            software node (to the software nodes defined before it, i.e.
+            the topology is acyclic).
+        volumes (int): The number of volume nodes (attached to the
+            container nodes in a round-robin fashion).
+        seed (int): The seed of the generator.
+    """
+
+    def __init__(self, containers=10, software=2, artifacts=1,
+                 artifact_size=1024, connections=1.0, volumes=0, seed=0):
+        self.containers = containers
+        self.software = software
+        self.artifacts = artifacts
+        self.artifact_size = artifact_size
+        self.connections = connections
+        self.volumes = volumes
+        self.seed = seed
+
+    @property
+    def name(self):
+        return 'synthetic-{0}x{1}'.format(self.containers, self.software)
+
+    def __str__(self):
+        return '{0} containers x {1} software, {2} artifacts x {3} bytes, \
+{4} connections, {5} volumes'.format(
+            self.containers, self.software, self.artifacts,
+            self.artifact_size, self.connections, self.volumes)
+
+
+def _software_name(container, software):
+    return 'sw-{0}-{1}'.format(container, software)
+
+
+def _manifest(topology, rnd):
+    """ Returns the TOSCA manifest of a synthetic application. """
+
+    node_templates = dict()
+    software_names = list()
+    for c in range(topology.containers):
+        container_name = 'container-{}'.format(c)
+        container = {
+            'type': 'tosker.nodes.Container',
+            'properties': {'ports': {8000 + c: {'get_input': 'port'}}},
+            'artifacts': {'my_image': {
+                'file': _IMAGES[c % len(_IMAGES)],
+                'type': 'tosker.artifacts.Image',
+                'repository': 'docker_hub',
+            }},
+        }
+        node_templates[container_name] = container
+
+        for s in range(topology.software):
+            name = _software_name(c, s)
+            requirements = [{'host': container_name}]
+            if software_names and topology.connections > 0:
+                # on average, [connections] targets among the previous nodes
+                count = min(len(software_names), int(topology.connections))
+                if rnd.random() < topology.connections - int(
+                        topology.connections):
+                    count = min(len(software_names), count + 1)
+                for target in sorted(rnd.sample(software_names, count)):
+                    requirements.append({'connection': target})
+
+            node_templates[name] = {
+                'type': 'tosker.nodes.Software',
+                'requirements': requirements,
+                'artifacts': {
+                    'data_{}'.format(a): 'artifacts/{0}/data_{1}.bin'.format(
+                        name, a)
+                    for a in range(topology.artifacts)},
+                'interfaces': {'Standard': {
+                    operation: {
+                        'implementation': 'scripts/{0}/{1}.sh'.format(
+                            name, operation),
+                        'inputs': {'branch': {'get_input': 'branch'}},
+                    } for operation in _OPERATIONS}},
+            }
+            software_names.append(name)
+
+    for v in range(topology.volumes):
+        name = 'volume-{}'.format(v)
+        node_templates[name] = {'type': 'tosker.nodes.Volume'}
+        container = node_templates[
+            'container-{}'.format(v % topology.containers)]
+        container.setdefault('requirements', []).append({'storage': {
+            'node': name,
+            'relationship': {
+                'type': 'tosca.relationships.AttachesTo',
+                'properties': {'location': '/data/{}'.format(name)},
+            },
+        }})
+
+    return {
+        'tosca_definitions_version': 'tosca_simple_yaml_1_0',
+        'description': 'A synthetic application ({}).'.format(topology),
+        'repositories': {'docker_hub': 'https://registry.hub.docker.com/'},
+        'imports': [{'tosker': 'tosker-types.yaml'}],
+        'topology_template': {
+            'inputs': {
+                'port': {'type': 'integer', 'default': 8080},
+                'branch': {'type': 'string', 'default': 'master'},
+            },
+            'node_templates': node_templates,
+        },
+    }
+
+
+def _config(topology):
+    """ Returns the toskose configuration of a synthetic application. """
+
+    nodes = dict()
+    for c in range(topology.containers):
+        name = 'container-{}'.format(c)
+        nodes[name] = {
+            'alias': name,
+            'port': 9000 + c,
+            'user': 'user',
+            'password': 'password',
+            'log_level': 'INFO',
+            'docker': {'name': 'benchmark/{}'.format(name), 'tag': 'latest'},
+        }
+    return {
+        'nodes': nodes,
+        'manager': {
+            'alias': 'toskose-manager',
+            'port': 12000,
+            'user': 'admin',
+            'password': 'admin',
+            'mode': 'production',
+            'secret_key': 'secret',
+            'docker': {'name': 'benchmark/manager', 'tag': 'latest'},
+        },
+    }
+
+
+def generate(output_dir, topology):
+    """ Generate a synthetic application.
+
+    Args:
+        output_dir (str): The directory of the generated files.
+        topology (object): The parameters of the application (Topology).
+
+    Returns:
+        The paths of the .CSAR archive and of the toskose configuration.
+    """
+
+    rnd = random.Random(topology.seed)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _manifest(topology, rnd)
+    manifest_name = '{}.yaml'.format(topology.name)
+
+    csar_path = os.path.join(output_dir, '{}.csar'.format(topology.name))
+    with zipfile.ZipFile(csar_path, 'w', zipfile.ZIP_DEFLATED) as csar:
+        csar.writestr(
+            'TOSCA-Metadata/TOSCA.meta',
+            'TOSCA-Meta-File-Version: 1.0\n'
+            'CSAR-version: 1.1\n'
+            'Created-By: toskose-benchmarks\n'
+            'Entry-Definitions: {0}\n'
+            'Description: {1}\n'.format(manifest_name, topology))
+        csar.writestr(manifest_name, yaml.safe_dump(
+            manifest, default_flow_style=False))
+        csar.write(_TOSKER_TYPES, 'tosker-types.yaml')
+
+        for name, node in manifest['topology_template'][
+                'node_templates'].items():
+            for path in (node.get('artifacts') or {}).values():
+                if isinstance(path, str):
+                    csar.writestr(path, rnd.getrandbits(
+                        8 * topology.artifact_size).to_bytes(
+                            topology.artifact_size, 'little')
+                        if topology.artifact_size else b'')
+            for interface in (node.get('interfaces') or {}).values():
+                for operation in interface.values():
+                    csar.writestr(
+                        operation['implementation'],
+                        '#!/bin/sh\necho "{}"\n'.format(
+                            operation['implementation']))
+
+    config_path = os.path.join(
+        output_dir, '{}-toskose.yml'.format(topology.name))
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(_config(topology), f, default_flow_style=False)
+
+    return csar_path, config_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('output_dir')
+    parser.add_argument('--containers', type=int, default=10)
+    parser.add_argument('--software', type=int, default=2,
+                        help='Software nodes per container node.')
+    parser.add_argument('--artifacts', type=int, default=1,
+                        help='Artifacts per software node.')
+    parser.add_argument('--artifact-size', type=int, default=1024,
+                        help='The size of each artifact (bytes).')
+    parser.add_argument('--connections', type=float, default=1.0,
+                        help='Average connections per software node.')
+    parser.add_argument('--volumes', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    topology = Topology(
+        containers=args.containers, software=args.software,
+        artifacts=args.artifacts, artifact_size=args.artifact_size,
+        connections=args.connections, volumes=args.volumes, seed=args.seed)
+    csar_path, config_path = generate(args.output_dir, topology)
+    print('Generated {0} ({1}) and {2}'.format(
+        csar_path, topology, config_path))
+
+
+if __name__ == '__main__':
+    main()
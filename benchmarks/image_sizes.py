@@ -0,0 +1,177 @@
+"""
+The size of the app's content added to the toskosed unit images.
+
+The app's context of each container node of the test applications is
+generated, and its content is assigned to the layers of the unit template
+(Dockerfile-unit), i.e. to the COPY instructions of the local context.
+The bytes of each layer (the size of the copied files) are compared with
+the recorded ones (image_sizes.json), where the sizes with the template
+preceding the single-layer injection are recorded as well ("before"),
+when the content was copied once and moved (and chmod-ed) once more.
+The bytes rebuilt (and pushed) when only a lifecycle script changes are
+reported as well ("script_change"), i.e. the layers from the one
+containing the scripts onward.
+
+Usage:
+    python benchmarks/image_sizes.py [--save]
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+import tarfile
+import tempfile
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import app.common.constants as constants  # noqa: E402
+from app.context import BuildContext, build_app_context_archives  # noqa: E402
+from app.docker.manager import (DOCKERFILE_TEMPLATES_PATH,  # noqa: E402
+                                DOCKERFILE_TOSKOSE_UNIT_TEMPLATE)
+from app.tosca.parser import ToscaParser  # noqa: E402
+from app.updater import toskose_model  # noqa: E402
+from tests.helpers import compute_manifest_path  # noqa: E402
+
+_SIZES = os.path.join(os.path.dirname(__file__), 'image_sizes.json')
+
+_DATA = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'data'))
+
+APPS = {
+    'thinking': ('thinking/thinking.csar',
+                 'thinking/configurations/toskose.yml'),
+    'thinking-v2': ('thinking-v2/thinking-v2.csar',
+                    'thinking-v2/configurations/toskose.yml'),
+}
+
+UNIT_TEMPLATE = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'app', 'docker',
+    DOCKERFILE_TEMPLATES_PATH, DOCKERFILE_TOSKOSE_UNIT_TEMPLATE))
+
+
+def copy_sources(template):
+    """ Returns the sources of the COPY instructions of the local context
+    of a dockerfile, in order (i.e. a layer each). """
+
+    sources = list()
+    with open(template) as f:
+        for line in f:
+            words = shlex.split(line, comments=True)
+            if not words or words[0].upper() != 'COPY' or \
+                    any(word.startswith('--from') for word in words):
+                continue
+            args = [word for word in words[1:] if not word.startswith('--')]
+            sources.append(args[:-1])
+    return sources
+
+
+def _covers(source, name):
+    source = source.rstrip('/')
+    return source in ('', '.') or name == source or \
+        name.startswith(source + '/')
+
+
+def layer_sizes(context, template):
+    """ Returns the bytes added by each layer of a template, as
+    COPY sources => bytes. """
+
+    sources = copy_sources(template)
+    sizes = [0] * len(sources)
+    fileobj, _ = context.archive(template)
+    with tarfile.open(fileobj=fileobj) as tar:
+        for member in tar.getmembers():
+            if not member.isfile() or member.name in (
+                    BuildContext.DOCKERFILE, '.dockerignore'):
+                continue
+            for i, layer_sources in enumerate(sources):
+                if any(_covers(source, member.name)
+                       for source in layer_sources):
+                    sizes[i] += member.size
+                    break
+    fileobj.close()
+    return {' '.join(layer_sources): size
+            for layer_sources, size in zip(sources, sizes)}
+
+
+def measure(template=UNIT_TEMPLATE):
+    """ Returns the layer sizes of the unit images of the test apps, as
+    app => container => {'layers', 'total'}. """
+
+    results = dict()
+    for app_name, (csar_path, config_path) in APPS.items():
+        constants.port = constants.DEFAULT_SUPERVISORD_INIT_PORT
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = compute_manifest_path(
+                tmp_dir, os.path.join(_DATA, csar_path))
+            model = ToscaParser(strict=False).build_model(manifest_path)
+            toskose_model(model, os.path.join(_DATA, config_path))
+            contexts = build_app_context_archives(model)
+            results[app_name] = dict()
+            for container in model.containers:
+                if container.is_manager or not container.hosted:
+                    continue
+                layers = layer_sizes(contexts[container.name], template)
+                results[app_name][container.name] = {
+                    'layers': layers,
+                    'total': sum(layers.values()),
+                    'script_change': script_change(
+                        contexts[container.name], template, layers),
+                }
+    return results
+
+
+def script_change(context, template, layers):
+    """ Returns the bytes rebuilt when a lifecycle script changes, i.e. the
+    size of the layers from the one containing the scripts onward (the
+    following layers are rebuilt as well, whatever their content). """
+
+    sources = copy_sources(template)
+    fileobj, _ = context.archive(template)
+    with tarfile.open(fileobj=fileobj) as tar:
+        script = next(
+            member.name for member in tar.getmembers()
+            if member.isfile() and '/scripts/' in member.name)
+    fileobj.close()
+    for i, layer_sources in enumerate(sources):
+        if any(_covers(source, script) for source in layer_sources):
+            return sum(list(layers.values())[i:])
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--save', action='store_true',
+                        help='Record the sizes in {}.'.format(
+                            os.path.basename(_SIZES)))
+    args = parser.parse_args()
+
+    recorded = dict()
+    if os.path.exists(_SIZES):
+        with open(_SIZES) as f:
+            recorded = json.load(f)
+
+    results = measure()
+    for app_name, containers in sorted(results.items()):
+        for name, sizes in sorted(containers.items()):
+            before = recorded.get(app_name, {}).get(name, {}).get('before')
+            print('{0:<12} {1:<8} {2:>10} bytes (before: {3} bytes, \
+script change: {4} bytes) {5}'.format(
+                app_name, name, sizes['total'], before,
+                sizes['script_change'], sizes['layers']))
+
+    if args.save:
+        for app_name, containers in results.items():
+            for name, sizes in containers.items():
+                recorded.setdefault(app_name, {}).setdefault(
+                    name, {}).update(sizes)
+        with open(_SIZES, 'w') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+        print('Sizes recorded in {}'.format(_SIZES))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
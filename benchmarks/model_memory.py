@@ -0,0 +1,74 @@
+"""
+Memory footprint of the TOSCA model (bytes per node).
+
+A synthetic topology is built, where each container node hosts a software
+node, attaches a volume node, and the software nodes are chained by
+connections.
+
+Usage:
+    python benchmarks/model_memory.py [--size N]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app.tosca.model.nodes import Container, Software, Volume  # noqa: E402
+from app.tosca.model.template import Template  # noqa: E402
+from app.tosca.parser import ToscaParser  # noqa: E402
+
+
+def build_topology(size):
+    """ Build a synthetic topology with size * 3 nodes. """
+
+    tpl = Template('benchmark')
+    for i in range(size):
+        container = Container('container-{}'.format(i))
+        volume = Volume('volume-{}'.format(i))
+        container.add_volume(volume.name, '/data')
+
+        software = Software('software-{}'.format(i))
+        software.host = container.name
+        if i > 0:
+            software.add_connection('software-{}'.format(i - 1))
+
+        for node in (container, volume, software):
+            node.tpl = tpl
+            tpl.push(node)
+
+    ToscaParser._add_pointer(tpl)
+    ToscaParser._add_back_links(tpl)
+    ToscaParser._add_extension(tpl)
+    ToscaParser._update_hosted_nodes(tpl)
+    return tpl
+
+
+def measure(size):
+    """ Returns the bytes allocated by the model for each node. """
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tpl = build_topology(size)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = len(list(tpl.nodes))
+    return (after - before) / nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=1000,
+                        help='The number of containers (default: 1000).')
+    args = parser.parse_args()
+
+    print('{0} nodes: {1:.0f} bytes/node'.format(
+        args.size * 3, measure(args.size)))
+
+
+if __name__ == '__main__':
+    main()
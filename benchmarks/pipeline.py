@@ -0,0 +1,261 @@
+"""
+Benchmarks of the stages of the toskoserization pipeline.
+
+Each stage (CSAR validation, parsing in both modes, configuration,
+app's context generation, docker-compose generation and the whole
+toskoserization with the Docker Engine stubbed out) is run on synthetic
+applications of increasing size (see generator.py). The time (best of
+the repetitions) and the peak of allocated memory of each stage are
+compared with the stored baselines, and the regressions are reported.
+
+Usage:
+    python benchmarks/pipeline.py [--sizes small,medium] [--repeat N]
+        [--baselines FILE] [--save-baselines] [--tolerance RATIO]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest.mock as mock
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import app.common.constants as constants  # noqa: E402
+from app.common.commons import unpack_archive  # noqa: E402
+from app.configuration.completer import generate_default_config  # noqa: E402
+from app.context import build_app_context  # noqa: E402
+from app.docker.compose import generate_compose  # noqa: E402
+from app.tosca.parser import ToscaParser  # noqa: E402
+from app.tosca.validator import open_csar, validate_csar  # noqa: E402
+from app.toskose import Toskoserizator  # noqa: E402
+from app.updater import toskose_model  # noqa: E402
+from benchmarks.generator import Topology, generate  # noqa: E402
+
+_BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+SIZES = {
+    'small': Topology(containers=5, software=2, volumes=2),
+    'medium': Topology(containers=50, software=2, volumes=10),
+    'large': Topology(containers=200, software=3, volumes=50,
+                      connections=2.0),
+}
+
+
+class _App:
+    """ A generated application, shared by the stages. """
+
+    def __init__(self, work_dir, topology):
+        self.work_dir = work_dir
+        self.csar_path, self.config_path = generate(
+            os.path.join(work_dir, 'csar'), topology)
+
+        self.root_path = os.path.join(work_dir, 'app')
+        with open_csar(self.csar_path) as archive:
+            metadata = validate_csar(self.csar_path, archive=archive)
+            unpack_archive(archive, self.root_path)
+        self.manifest_path = os.path.join(
+            self.root_path, metadata['Entry-Definitions'])
+
+    def model(self):
+        """ Returns a toskosed model of the application. """
+
+        model = ToscaParser(strict=False).build_model(self.manifest_path)
+        _configure(self, model)
+        return model
+
+    @contextlib.contextmanager
+    def output_dir(self):
+        path = tempfile.mkdtemp(dir=self.work_dir)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _configure(app, model):
+    # the default supervisord ports are generated once per process
+    constants.port = constants.DEFAULT_SUPERVISORD_INIT_PORT
+    # the model refers to the completed configuration
+    config_path = generate_default_config(
+        model, config_path=app.config_path,
+        output_path=os.path.join(app.work_dir, 'toskose.yml'))
+    toskose_model(model, config_path)
+
+
+def _stage_validate(app):
+    return lambda: validate_csar(app.csar_path)
+
+
+def _stage_parse(app):
+    return lambda: ToscaParser().build_model(app.manifest_path)
+
+
+def _stage_parse_fast(app):
+    return lambda: ToscaParser(strict=False).build_model(app.manifest_path)
+
+
+def _stage_configure(app):
+    def run():
+        _configure(app, ToscaParser(strict=False).build_model(
+            app.manifest_path))
+    return run
+
+
+def _stage_context(app):
+    model = app.model()
+
+    def run():
+        with app.output_dir() as output_dir:
+            build_app_context(output_dir, model)
+    return run
+
+
+def _stage_compose(app):
+    model = app.model()
+
+    def run():
+        with app.output_dir() as output_dir:
+            generate_compose(tosca_model=model, output_path=output_dir)
+    return run
+
+
+def _stage_toskosed(app):
+    def run():
+        constants.port = constants.DEFAULT_SUPERVISORD_INIT_PORT
+        with mock.patch('app.toskose.DockerManager'), \
+                app.output_dir() as output_dir:
+            Toskoserizator(quiet=True).toskosed(
+                app.csar_path, app.config_path, output_path=output_dir)
+    return run
+
+
+STAGES = (
+    ('validate', _stage_validate),
+    ('parse', _stage_parse),
+    ('parse_fast', _stage_parse_fast),
+    ('configure', _stage_configure),
+    ('context', _stage_context),
+    ('compose', _stage_compose),
+    ('toskosed', _stage_toskosed),
+)
+
+
+def measure(run, repeat):
+    """ Returns the time (best of the repetitions, seconds) and the peak
+    of allocated memory (bytes) of a stage. """
+
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    # traced separately, tracing slows down the execution
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': min(times), 'memory': peak}
+
+
+def run_benchmarks(sizes, repeat, stages=None):
+    """ Run the benchmarks.
+
+    Returns:
+        The results, as size => stage => {'time', 'memory'}.
+    """
+
+    results = dict()
+    for size in sizes:
+        topology = SIZES[size]
+        work_dir = tempfile.mkdtemp(prefix='toskose-benchmark-')
+        try:
+            app = _App(work_dir, topology)
+            results[size] = dict()
+            for name, stage in STAGES:
+                if stages and name not in stages:
+                    continue
+                results[size][name] = measure(stage(app), repeat)
+                print('{0:<8} {1:<12} {2:>10.1f} ms {3:>10.1f} KiB'.format(
+                    size, name, results[size][name]['time'] * 1000,
+                    results[size][name]['memory'] / 1024))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baselines, tolerance):
+    """ Returns the regressions with respect to the baselines, as
+    (size, stage, metric, baseline, result). """
+
+    regressions = list()
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            baseline = baselines.get(size, {}).get(stage)
+            if baseline is None:
+                continue
+            for metric, value in metrics.items():
+                if value > baseline[metric] * (1 + tolerance):
+                    regressions.append(
+                        (size, stage, metric, baseline[metric], value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='small,medium',
+                        help='Comma-separated sizes among: {} \
+(default: small,medium).'.format(', '.join(SIZES)))
+    parser.add_argument('--stages',
+                        help='Comma-separated stages among: {} \
+(default: all).'.format(', '.join(name for name, _ in STAGES)))
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='The repetitions of each stage (default: 5).')
+    parser.add_argument('--baselines', default=_BASELINES,
+                        help='The file of the baselines.')
+    parser.add_argument('--save-baselines', action='store_true',
+                        help='Store the results as the new baselines.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='The tolerated slowdown/growth (default: 0.25).')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error('Unknown sizes: {}'.format(', '.join(unknown)))
+    stages = args.stages.split(',') if args.stages else None
+
+    # the pipeline logging is not part of the measurements
+    logging.disable(logging.CRITICAL)
+    results = run_benchmarks(sizes, args.repeat, stages=stages)
+
+    baselines = dict()
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    if args.save_baselines:
+        for size, stages in results.items():
+            baselines.setdefault(size, {}).update(stages)
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baselines stored in {}'.format(args.baselines))
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    for size, stage, metric, baseline, value in regressions:
+        print('REGRESSION {0}/{1} {2}: {3:.4g} -> {4:.4g} ({5:+.0%})'.format(
+            size, stage, metric, baseline, value, value / baseline - 1))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import os
 
 from app.common.commons import unpack_archive
-from app.tosca.validator import validate_csar
+from app.tosca.validator import open_csar, validate_csar
 
 
 def full_path(path):
@@ -11,6 +11,7 @@ def full_path(path):
 
 
 def compute_manifest_path(tmp_dir, archive_path):
-    csar_metadata = validate_csar(archive_path)
-    unpack_archive(archive_path, tmp_dir)
+    with open_csar(archive_path) as archive:
+        csar_metadata = validate_csar(archive_path, archive=archive)
+        unpack_archive(archive, tmp_dir)
     return os.path.join(tmp_dir, csar_metadata['Entry-Definitions'])
@@ -1,9 +1,15 @@
 import os
+import tarfile
+
 import pytest
+import ruamel.yaml
 
 import tests.commons as commons
-from app.context import build_app_context
+from app.common import constants
+from app.context import (BuildContext, build_app_context,
+                         build_app_context_archives)
 from app.tosca.model.artifacts import File
+from app.tosca.planner import dump_plan, generate_plan
 
 
 @pytest.mark.parametrize('configs', commons.apps_data, indirect=True)
@@ -31,12 +37,18 @@ class TestContextGeneration:
                 container_dir = os.path.join(root_dir, container.name)
                 assert os.path.exists(container_dir)
                 assert os.path.isfile(os.path.join(
-                    container_dir, 'supervisord.conf'))
+                    container_dir, constants.DEFAULT_UNIT_CONFIG_LAYER,
+                    constants.DEFAULT_UNIT_CONFIG_DIR, 'supervisord.conf'))
                 for software in container.hosted:
-                    software_dir = os.path.join(container_dir, software.name)
+                    software_dir = os.path.join(
+                        container_dir, constants.DEFAULT_UNIT_SCRIPTS_LAYER,
+                        constants.DEFAULT_UNIT_APPS_DIR, software.name)
                     assert os.path.exists(software_dir)
 
-                    artifacts_dir = os.path.join(software_dir, 'artifacts')
+                    artifacts_dir = os.path.join(
+                        container_dir, constants.DEFAULT_UNIT_ARTIFACTS_LAYER,
+                        constants.DEFAULT_UNIT_APPS_DIR, software.name,
+                        'artifacts')
                     assert os.path.exists(artifacts_dir)
                     for artifact in software.artifacts:
                         fname = artifact.file
@@ -68,3 +80,145 @@ class TestContextGeneration:
     def test_build_app_wrong_model(self):
         with pytest.raises(TypeError):
             build_app_context(self._context, None)
+
+    def test_build_app_context_archives(self):
+        """ Test the streamed app context against the generated one """
+
+        contexts = build_app_context_archives(self._model)
+        build_app_context(self._context, self._model)
+        root_dir = os.path.join(self._context, self._model.name)
+        dockerfile = os.path.join(str(self._context), 'Dockerfile')
+        with open(dockerfile, 'w') as f:
+            f.write('FROM scratch')
+
+        for container in self._model.containers:
+            fileobj, digest = contexts[container.name].archive(dockerfile)
+            with tarfile.open(fileobj=fileobj) as tar:
+                names = set(tar.getnames())
+            fileobj.close()
+
+            assert BuildContext.DOCKERFILE in names
+            if container.is_manager:
+                continue
+
+            container_dir = os.path.join(root_dir, container.name)
+            generated = {
+                os.path.relpath(os.path.join(dir_path, name), container_dir)
+                for dir_path, dir_names, file_names in os.walk(container_dir)
+                for name in dir_names + file_names
+            }
+            assert generated <= names
+
+            # the digest depends only on the content of the context
+            assert digest == contexts[container.name].archive(
+                dockerfile)[1]
+
+    def _unit_archives(self):
+        """ Returns the members of the streamed context of each unit, as
+        container => name => (TarInfo, content) """
+
+        contexts = build_app_context_archives(self._model)
+        dockerfile = os.path.join(str(self._context), 'Dockerfile')
+        with open(dockerfile, 'w') as f:
+            f.write('FROM scratch')
+
+        archives = dict()
+        for container in self._model.containers:
+            if container.is_manager or not container.hosted:
+                continue
+
+            fileobj, _ = contexts[container.name].archive(dockerfile)
+            with tarfile.open(fileobj=fileobj) as tar:
+                archives[container.name] = {
+                    m.name: (m, tar.extractfile(m).read()
+                             if m.isfile() else None)
+                    for m in tar.getmembers()}
+            fileobj.close()
+        return archives
+
+    @staticmethod
+    def _layer(members, layer):
+        return {name: content for name, (_, content) in members.items()
+                if name.startswith(layer)}
+
+    def test_unit_context_layers(self):
+        """ Test that the unit contexts are split in layers laid out at the
+        final paths, with the final permissions (no mv, no chmod) """
+
+        for container, members in self._unit_archives().items():
+            container = self._model[container]
+            for name, (member, _) in members.items():
+                if name in (BuildContext.DOCKERFILE, '.dockerignore'):
+                    continue
+                assert name.split('/')[0] == 'layers'
+                assert member.mtime == 0
+                if any(name.startswith(os.path.join(
+                        layer, constants.DEFAULT_UNIT_APPS_DIR))
+                        for layer in constants.DEFAULT_UNIT_LAYERS):
+                    assert member.mode == 0o777
+
+            artifacts = self._layer(
+                members, constants.DEFAULT_UNIT_ARTIFACTS_LAYER)
+            scripts = self._layer(
+                members, constants.DEFAULT_UNIT_SCRIPTS_LAYER)
+            assert os.path.join(
+                constants.DEFAULT_UNIT_CONFIG_LAYER,
+                constants.DEFAULT_UNIT_CONFIG_DIR,
+                'supervisord.conf') in members
+            for software in container.hosted:
+                for artifact in software.artifacts:
+                    assert os.path.join(
+                        constants.DEFAULT_UNIT_ARTIFACTS_LAYER,
+                        constants.DEFAULT_UNIT_APPS_DIR, software.name,
+                        'artifacts', artifact.file) in artifacts
+                assert os.path.join(
+                    constants.DEFAULT_UNIT_SCRIPTS_LAYER,
+                    constants.DEFAULT_UNIT_APPS_DIR, software.name, 'logs',
+                    '{}.log'.format(software.name)) in scripts
+                assert not any('/scripts/' in name for name in artifacts)
+
+    def test_unit_context_script_change(self):
+        """ Test that a changed script changes only the scripts layer """
+
+        before = self._unit_archives()
+        container = next(c for c in self._model.containers
+                         if not c.is_manager and c.hosted)
+        software = container.hosted[0]
+        script = next(iter(next(iter(
+            software.interfaces.values())).values()))['cmd']
+        with open(script.file_path, 'a') as f:
+            f.write('\necho changed\n')
+        after = self._unit_archives()
+
+        for layer in constants.DEFAULT_UNIT_LAYERS:
+            changed = self._layer(before[container.name], layer) != \
+                self._layer(after[container.name], layer)
+            assert changed == (layer == constants.DEFAULT_UNIT_SCRIPTS_LAYER)
+
+    def test_manager_plan(self):
+        """ Test the deployment plan shipped to the toskose-manager """
+
+        contexts = build_app_context_archives(self._model)
+        build_app_context(self._context, self._model)
+        plan_path = os.path.join(
+            constants.DEFAULT_MANAGER_CONFIG_DIR,
+            constants.DEFAULT_MANAGER_PLAN_FILENAME)
+        dockerfile = os.path.join(str(self._context), 'Dockerfile')
+        with open(dockerfile, 'w') as f:
+            f.write('FROM scratch')
+
+        for container in self._model.containers:
+            if not container.is_manager:
+                continue
+
+            with open(os.path.join(
+                    str(self._context), self._model.name,
+                    container.name, plan_path)) as f:
+                plan = ruamel.yaml.safe_load(f)
+            assert plan == dump_plan(generate_plan(self._model))
+
+            fileobj, _ = contexts[container.name].archive(dockerfile)
+            with tarfile.open(fileobj=fileobj) as tar:
+                assert ruamel.yaml.safe_load(
+                    tar.extractfile(plan_path).read()) == plan
+            fileobj.close()
@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+import tests.commons as commons
+from app.common.cache import DiskCache, evict_caches
+from app.common.exception import MalformedCsarError
+from app.context import build_app_context
+from app.tosca.csar import CsarArchive, CsarCache
+from app.tosca.diff import snapshot
+from app.tosca.parser import ToscaParser
+from app.tosca.validator import open_csar, validate_csar
+
+
+def extracted_files(root_path):
+    return {
+        os.path.relpath(os.path.join(dir_path, name), root_path)
+        for dir_path, _, names in os.walk(root_path)
+        for name in names
+    }
+
+
+@pytest.mark.parametrize('data', commons.apps_data)
+class TestCsarArchive:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, tmpdir):
+        self._root = str(tmpdir.mkdir('csar'))
+        self._context = str(tmpdir.mkdir('app_context'))
+
+    def test_extract_definitions(self, data):
+        with open_csar(data['csar_path']) as archive:
+            metadata = validate_csar(data['csar_path'], archive=archive)
+            manifest_path = CsarArchive(archive, self._root) \
+                .extract_definitions(metadata['Entry-Definitions'])
+
+            assert os.path.isfile(manifest_path)
+            assert extracted_files(self._root) == {
+                'thinking.yaml', 'tosker-types.yaml'}
+
+    def test_lazy_extraction(self, data):
+        with open_csar(data['csar_path']) as archive:
+            metadata = validate_csar(data['csar_path'], archive=archive)
+            csar = CsarArchive(archive, self._root)
+            model = ToscaParser().build_model(
+                csar.extract_definitions(metadata['Entry-Definitions']))
+
+            build_app_context(self._context, model, csar=csar)
+
+            referenced = {'thinking.yaml', 'tosker-types.yaml'}
+            for software in model.software:
+                for artifact in software.artifacts:
+                    referenced.add(csar.member_name(artifact.file_path))
+                for interfaces in software.interfaces.values():
+                    for operation in interfaces.values():
+                        referenced.add(
+                            csar.member_name(operation['cmd'].file_path))
+
+            assert extracted_files(self._root) == referenced
+
+    def test_snapshot_extracts_nothing(self, data):
+        with open_csar(data['csar_path']) as archive:
+            metadata = validate_csar(data['csar_path'], archive=archive)
+            csar = CsarArchive(archive, self._root)
+            model = ToscaParser().build_model(
+                csar.extract_definitions(metadata['Entry-Definitions']))
+
+            current = snapshot(model, csar=csar)
+            assert extracted_files(self._root) == {
+                'thinking.yaml', 'tosker-types.yaml'}
+
+            # the same digests of the extracted files
+            archive.extractall(self._root)
+            assert snapshot(model) == current
+
+    def test_missing_member(self, data):
+        with open_csar(data['csar_path']) as archive:
+            csar = CsarArchive(archive, self._root)
+            with pytest.raises(MalformedCsarError):
+                csar.extract('scripts/missing.sh')
+            with pytest.raises(MalformedCsarError):
+                csar.fetch(os.path.join(self._root, '..', 'thinking.yaml'))
+
+
+@pytest.mark.parametrize('data', commons.apps_data)
+class TestCsarCache:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, tmpdir):
+        self._cache_dir = str(tmpdir.mkdir('cache'))
+
+    def test_reuse_workspace(self, data):
+        cache = CsarCache(self._cache_dir)
+        workspace = cache.workspace(data['csar_path'])
+        assert workspace.load_metadata() is None
+
+        with open_csar(data['csar_path']) as archive:
+            metadata = validate_csar(data['csar_path'], archive=archive)
+            workspace.store_metadata(metadata)
+            manifest_path = CsarArchive(archive, workspace.root_path) \
+                .extract_definitions(metadata['Entry-Definitions'])
+        mtime = os.path.getmtime(manifest_path)
+
+        workspace = cache.workspace(data['csar_path'])
+        assert workspace.load_metadata() == metadata
+        with open_csar(data['csar_path']) as archive:
+            assert CsarArchive(archive, workspace.root_path) \
+                .extract_definitions(metadata['Entry-Definitions']) \
+                == manifest_path
+        assert os.path.getmtime(manifest_path) == mtime
+
+    def test_eviction(self, data, tmpdir):
+        cache = CsarCache(self._cache_dir, max_size=1)
+        stale = cache.workspace(data['csar_path'])
+        stale.store_metadata({'Entry-Definitions': 'stale.yaml'})
+
+        other_csar = str(tmpdir.join('other.csar'))
+        with open(data['csar_path'], 'rb') as src, \
+                open(other_csar, 'wb') as dst:
+            dst.write(src.read() + b'\0')
+        os.utime(os.path.join(os.path.dirname(stale.root_path), '.access'),
+                 (0, 0))
+        latest = cache.workspace(other_csar)
+        latest.store_metadata({'Entry-Definitions': 'latest.yaml'})
+        cache.evict()
+
+        # the most recently used entry is never evicted
+        assert os.listdir(cache.path) == [
+            os.path.basename(os.path.dirname(latest.root_path))]
+        assert latest.load_metadata() == {'Entry-Definitions': 'latest.yaml'}
+
+
+def test_shared_eviction(tmpdir):
+    cache_dir = str(tmpdir.mkdir('cache'))
+    caches = [DiskCache(cache_dir, 'first'), DiskCache(cache_dir, 'second')]
+    for i, (cache, key) in enumerate([
+            (caches[0], 'old'), (caches[1], 'older'),
+            (caches[0], 'new'), (caches[1], 'newer')]):
+        cache.write(key, 'data', b'0' * 100)
+        os.utime(os.path.join(cache.path, key, '.access'), (i, i))
+
+    # the size is bounded across the caches, evicting the least recently
+    # used entries first
+    evict_caches(caches, max_size=300)
+    assert os.listdir(caches[0].path) == ['new']
+    assert sorted(os.listdir(caches[1].path)) == ['newer', 'older']
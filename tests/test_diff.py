@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import tests.commons as commons
+from app.tosca.diff import (diff_models, dump_snapshot, load_snapshot,
+                            snapshot)
+from app.tosca.model.nodes import Software
+
+
+@pytest.mark.parametrize('configs', commons.apps_data, indirect=True)
+class TestModelDiff:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, model):
+        self._model = model
+        self._manager = next(
+            c.name for c in model.containers if c.is_manager)
+
+    def test_unchanged_model(self, tmpdir):
+        path = dump_snapshot(
+            snapshot(self._model), str(tmpdir.join('snapshot.json')))
+
+        diff = diff_models(load_snapshot(path), snapshot(self._model))
+        assert diff.empty
+        assert not diff.rebuild and not diff.recompose
+
+    def test_changed_artifact(self):
+        previous = snapshot(self._model)
+        software = next(s for s in self._model.software if s.artifacts)
+        with open(software.artifacts[0].file_path, 'a') as f:
+            f.write('changed')
+
+        diff = diff_models(previous, snapshot(self._model))
+        assert 'artifacts' in diff.changed[software.name]
+        assert diff.rebuild == {software.host_container.name, self._manager}
+
+    def test_changed_ports(self):
+        previous = snapshot(self._model)
+        container = next(
+            c for c in self._model.containers if c.ports)
+        container.add_port(12345, 12345)
+
+        diff = diff_models(previous, snapshot(self._model))
+        assert diff.changed == {container.name: ['ports']}
+        assert container.name in diff.recompose
+        assert diff.rebuild == {self._manager}
+
+    def test_added_and_removed_software(self):
+        previous = snapshot(self._model)
+        container = next(c for c in self._model.containers if c.hosted)
+        software = Software('added')
+        software.host = container
+        software.host_container = container
+        container.add_hosted_node(software)
+        self._model.push(software)
+
+        diff = diff_models(previous, snapshot(self._model))
+        assert diff.added == {'added'}
+        assert container.name in diff.rebuild
+
+        diff = diff_models(snapshot(self._model), previous)
+        assert diff.removed == {'added'}
+        assert container.name in diff.rebuild
+
+    def test_snapshot_secrets(self):
+        data = snapshot(self._model)
+        for container in self._model.containers:
+            for name, value in (container.env or {}).items():
+                if 'PASSWORD' in name:
+                    assert data['nodes'][container.name]['env'][name] \
+                        != value
+
+    def test_snapshot_paths(self):
+        data = snapshot(self._model)
+        for node in data['nodes'].values():
+            for artifact in node['artifacts']:
+                if 'file' in artifact:
+                    assert not os.path.isabs(artifact['file'])
@@ -0,0 +1,138 @@
+import base64
+import json
+import unittest.mock as mock
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.common.exception import (DockerAuthenticationFailedError,
+                                  OperationAbortedByUser, ValidationError)
+from app.configuration.completer import generate_image_name_interactive
+from app.docker.credentials import (ENV_REGISTRY, ENV_REGISTRY_PASSWORD,
+                                    ENV_REGISTRY_USERNAME, CredentialProvider)
+from app.docker.manager import DockerManager
+
+PROMPT = 'app.docker.credentials.create_auth_interactive'
+
+
+@pytest.fixture
+def docker_config(tmpdir):
+    """ A Docker configuration with the credentials of a private registry """
+
+    path = tmpdir.join('config.json')
+    path.write(json.dumps({'auths': {'registry.test:5000': {
+        'auth': base64.b64encode(b'docker:secret').decode()}}}))
+    return str(path)
+
+
+def provider(docker_config, environ=None, interactive=True):
+    return CredentialProvider(
+        interactive=interactive, environ=environ or {},
+        docker_config_path=docker_config)
+
+
+class TestCredentialProvider:
+
+    def test_docker_config(self, docker_config):
+        credentials = provider(docker_config)
+        assert credentials.credentials('registry.test:5000/user/maven') == \
+            {'username': 'docker', 'password': 'secret'}
+        assert credentials.credentials('user/maven') is None
+
+    def test_environment(self, docker_config):
+        credentials = provider(docker_config, environ={
+            ENV_REGISTRY: 'https://index.docker.io/v1/',
+            ENV_REGISTRY_USERNAME: 'env', ENV_REGISTRY_PASSWORD: 'secret'})
+        assert credentials.credentials('user/maven') == \
+            {'username': 'env', 'password': 'secret'}
+        # the other registries use the Docker configuration
+        assert credentials.credentials('registry.test:5000/user/maven') == \
+            {'username': 'docker', 'password': 'secret'}
+
+    def test_environment_scoped(self, docker_config):
+        environ = {
+            ENV_REGISTRY_USERNAME: 'env', ENV_REGISTRY_PASSWORD: 'secret'}
+        # never sent to an unknown registry
+        assert provider(docker_config, environ=environ).credentials(
+            'user/maven') is None
+        environ[ENV_REGISTRY] = 'registry.test:5000'
+        credentials = provider(docker_config, environ=environ)
+        # e.g. the public images of the Docker Hub are pulled anonymously
+        assert credentials.credentials('maven') is None
+        assert credentials.credentials('registry.test:5000/user/maven') == \
+            {'username': 'env', 'password': 'secret'}
+
+    def test_configuration(self, docker_config):
+        credentials = provider(docker_config)
+        credentials.configure('registry.test:5000/user/maven', 'password')
+        assert credentials.credentials('registry.test:5000/user/other') == \
+            {'username': 'user', 'password': 'password'}
+
+    def test_cached_per_registry(self, docker_config):
+        credentials = provider(docker_config)
+        with mock.patch('app.docker.credentials.docker_auth.load_config',
+                        wraps=__import__('docker').auth.load_config) as load:
+            for name in ('maven', 'node', 'registry.test:5000/user/maven'):
+                credentials.credentials(name)
+            credentials.credentials('registry.test:5000/user/node')
+        assert load.call_count == 1
+
+    def test_refresh(self, docker_config):
+        credentials = provider(docker_config)
+        denied = credentials.credentials('registry.test:5000/user/maven')
+        new = {'username': 'user', 'password': 'new'}
+        with mock.patch(PROMPT, return_value=new) as prompt:
+            assert credentials.refresh(
+                'registry.test:5000/user/maven', denied=denied) == new
+            # denied to a concurrent operation with the old credentials
+            assert credentials.refresh(
+                'registry.test:5000/user/node', denied=denied) == new
+        assert prompt.call_count == 1
+        assert credentials.credentials('registry.test:5000/user/maven') == new
+
+    def test_non_interactive(self, docker_config):
+        credentials = provider(docker_config, interactive=False)
+        with mock.patch(PROMPT) as prompt:
+            with pytest.raises(DockerAuthenticationFailedError):
+                credentials.refresh('user/maven')
+        assert not prompt.called
+
+
+@pytest.mark.parametrize('answer, expected', [
+    ('yes', None), ('no', OperationAbortedByUser)])
+def test_concurrent_pulls_confirm_once(docker_config, answer, expected):
+    with mock.patch('app.docker.manager.DockerClient'):
+        manager = DockerManager(credentials=provider(docker_config))
+
+    with mock.patch('builtins.input', return_value=answer) as prompt, \
+            mock.patch(PROMPT, return_value={'username': 'user'}), \
+            ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(
+            manager._image_authentication, 'user/private{}'.format(i))
+            for i in range(8)]
+        for future in futures:
+            if expected is None:
+                future.result()
+            else:
+                with pytest.raises(expected):
+                    future.result()
+    assert prompt.call_count == 1
+
+
+def test_non_interactive_pull(docker_config):
+    with mock.patch('app.docker.manager.DockerClient'):
+        manager = DockerManager(credentials=provider(
+            docker_config, interactive=False))
+    with mock.patch('builtins.input') as prompt:
+        with pytest.raises(DockerAuthenticationFailedError):
+            manager._image_authentication('user/private', 'latest')
+    assert not prompt.called
+
+
+def test_non_interactive_image_name():
+    with mock.patch('builtins.input') as prompt:
+        assert generate_image_name_interactive(
+            {'name': 'user/maven'}, interactive=False)['tag'] == 'latest'
+        with pytest.raises(ValidationError):
+            generate_image_name_interactive({}, interactive=False)
+    assert not prompt.called
@@ -0,0 +1,224 @@
+import os
+import threading
+import unittest.mock as mock
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from docker.errors import APIError
+
+from app.common.commons import digest_tree
+from app.common.exception import DockerOperationError
+from app.docker.manager import (BUILD_LOG_TAIL, TOSKOSE_FINGERPRINT_LABEL,
+                                DockerManager, PullRegistry,
+                                ToskosingProcessType)
+
+
+@pytest.fixture
+def docker_manager():
+    """ A DockerManager connected to a fake Docker Engine """
+
+    with mock.patch('app.docker.manager.DockerClient') as client:
+        manager = DockerManager()
+        manager._client = client.return_value
+        manager._client.api.build.side_effect = \
+            lambda **kwargs: build_events()
+        yield manager
+
+
+def build_events(*events):
+    """ The streamed output of a successful build (after the events). """
+
+    yield from events
+    yield {'stream': 'Step 1/1 : FROM maven:3.6\n'}
+    yield {'aux': {'ID': 'sha256:toskosed'}}
+    yield {'stream': 'Successfully built toskosed\n'}
+
+
+@pytest.fixture
+def context(tmpdir):
+    context = tmpdir.mkdir('context')
+    context.mkdir('api').join('start.sh').write('echo start')
+    context.join('supervisord.conf').write('[supervisord]')
+    return str(context)
+
+
+def toskose_unit(docker_manager, context):
+    docker_manager.toskose_image(
+        src_image='maven',
+        src_tag='3.6',
+        dst_image='test/maven-toskosed',
+        dst_tag='1.0',
+        context=context,
+        process_type=ToskosingProcessType.TOSKOSE_UNIT,
+        app_name='thinking',
+        enable_push=True)
+
+
+class TestToskosingFingerprint:
+
+    def _fingerprint(self, docker_manager, context):
+        return docker_manager._toskosing_fingerprint(
+            digest_tree(context).hexdigest(),
+            {'TOSCA_SRC_IMAGE': 'maven:3.6'})
+
+    def test_stable_fingerprint(self, docker_manager, context):
+        assert self._fingerprint(docker_manager, context) == \
+            self._fingerprint(docker_manager, context)
+
+    def test_context_change(self, docker_manager, context):
+        before = self._fingerprint(docker_manager, context)
+        with open(os.path.join(context, 'api', 'start.sh'), 'a') as f:
+            f.write('echo started')
+        assert before != self._fingerprint(docker_manager, context)
+
+    def test_source_image_change(self, docker_manager, context):
+        docker_manager._client.images.get.return_value.id = 'sha256:aaa'
+        before = self._fingerprint(docker_manager, context)
+        docker_manager._client.images.get.return_value.id = 'sha256:bbb'
+        assert before != self._fingerprint(docker_manager, context)
+
+    def test_skip_unchanged(self, docker_manager, context):
+        images = docker_manager._client.images
+
+        api = docker_manager._client.api
+
+        toskose_unit(docker_manager, context)
+        labels = api.build.call_args[1]['labels']
+        assert TOSKOSE_FINGERPRINT_LABEL in labels
+        api.build.reset_mock()
+
+        # the toskosed image is labelled with the same fingerprint
+        images.get.return_value.labels = labels
+        with mock.patch.object(docker_manager, '_push_image') as push:
+            toskose_unit(docker_manager, context)
+            assert not api.build.called
+            # a previous push may have failed
+            push.assert_called_once_with(
+                'test/maven-toskosed', tag='1.0')
+
+    def test_rebuild_changed(self, docker_manager, context):
+        images = docker_manager._client.images
+        images.get.return_value.labels = {
+            TOSKOSE_FINGERPRINT_LABEL: 'outdated'}
+
+        with mock.patch.object(docker_manager, '_push_image') as push:
+            toskose_unit(docker_manager, context)
+            assert docker_manager._client.api.build.called
+            assert push.called
+
+    def test_keep_cached_layers(self, docker_manager, context):
+        images = docker_manager._client.images
+        images.get.return_value.tags = ['test/maven-toskosed:1.0']
+        images.get.return_value.labels = {
+            TOSKOSE_FINGERPRINT_LABEL: 'outdated'}
+
+        with mock.patch.object(docker_manager, '_push_image'):
+            toskose_unit(docker_manager, context)
+        # the previous image is untagged, its layers are not pruned
+        images.remove.assert_called_once_with(
+            image='test/maven-toskosed:1.0', force=True, noprune=True)
+
+
+class TestStreamedBuild:
+
+    def test_build_streamed(self, docker_manager, context):
+        with mock.patch.object(docker_manager, '_push_image'):
+            toskose_unit(docker_manager, context)
+        kwargs = docker_manager._client.api.build.call_args[1]
+        assert kwargs['decode']
+        assert kwargs['tag'] == 'test/maven-toskosed:1.0'
+
+    def test_stop_at_first_error(self, docker_manager):
+        consumed = list()
+
+        def events():
+            for event in ({'stream': 'Step 1/3 : FROM maven\n'},
+                          {'stream': 'Step 2/3 : RUN false\n'},
+                          {'error': 'returned a non-zero code: 1',
+                           'errorDetail': {'code': 1}},
+                          {'stream': 'Step 3/3 : CMD true\n'}):
+                consumed.append(event)
+                yield event
+
+        with pytest.raises(DockerOperationError):
+            docker_manager._stream_build(events(), 'test/maven-toskosed')
+        assert len(consumed) == 3
+
+    def test_no_image(self, docker_manager):
+        with pytest.raises(DockerOperationError):
+            docker_manager._stream_build(
+                iter([{'stream': 'Step 1/1 : FROM maven\n'}]), 'test')
+
+    def test_bounded_tail(self, docker_manager):
+        chatty = ({'stream': 'line {}\n'.format(i)} for i in range(10000))
+        with mock.patch('app.docker.manager.deque', wraps=deque) as tail:
+            assert docker_manager._stream_build(
+                build_events(*chatty), 'test') == 'sha256:toskosed'
+        assert tail.call_args[1]['maxlen'] == BUILD_LOG_TAIL
+
+
+class TestPullRegistry:
+
+    def test_pull_once(self, docker_manager, context):
+        images = docker_manager._client.images
+
+        with mock.patch.object(docker_manager, '_push_image'):
+            toskose_unit(docker_manager, context)
+            toskose_unit(docker_manager, context)
+
+        # the toskose-unit base image and the source image, once each
+        assert images.pull.call_count == 2
+
+    def test_local_image_up_to_date(self, docker_manager, context):
+        images = docker_manager._client.images
+        images.get.return_value.attrs = {
+            'RepoDigests': ['maven@sha256:aaa']}
+        images.get_registry_data.return_value.id = 'sha256:aaa'
+
+        with mock.patch.object(docker_manager, '_push_image'):
+            toskose_unit(docker_manager, context)
+        assert not images.pull.called
+
+    def test_local_image_outdated(self, docker_manager, context):
+        images = docker_manager._client.images
+        images.get.return_value.attrs = {
+            'RepoDigests': ['maven@sha256:aaa']}
+        images.get_registry_data.return_value.id = 'sha256:bbb'
+
+        with mock.patch.object(docker_manager, '_push_image'):
+            toskose_unit(docker_manager, context)
+        assert images.pull.call_count == 2
+
+    def test_concurrent_pulls(self):
+        registry = PullRegistry()
+        started = threading.Event()
+        release = threading.Event()
+        pull = mock.Mock(return_value='image')
+
+        def slow_pull():
+            started.set()
+            release.wait(5)
+            return pull()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(registry.pull, 'maven', '3.6', slow_pull)
+            started.wait(5)
+            others = [executor.submit(registry.pull, 'maven', '3.6', pull)
+                      for _ in range(3)]
+            release.set()
+            results = [f.result() for f in [first] + others]
+
+        assert results == ['image'] * 4
+        assert pull.call_count == 1
+
+    def test_failed_pull(self):
+        registry = PullRegistry()
+        pull = mock.Mock(side_effect=[APIError('unavailable'), 'image'])
+
+        with pytest.raises(APIError):
+            registry.pull('maven', '3.6', pull)
+        # a failed pull is tried again
+        assert registry.pull('maven', '3.6', pull) == 'image'
+        assert registry.pull('maven', '3.6', pull) == 'image'
+        assert pull.call_count == 2
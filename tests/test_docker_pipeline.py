@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from app.docker.pipeline import StagePipeline, ToskosingStage, stage
+
+
+class StageCounter:
+    """ Track the maximum number of processes in each stage. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = {s: 0 for s in ToskosingStage}
+        self.peak = {s: 0 for s in ToskosingStage}
+
+    def process(self, name, fail=False):
+        def _process(pipeline=None):
+            for toskosing_stage in ToskosingStage:
+                with stage(pipeline, toskosing_stage, name=name):
+                    with self._lock:
+                        self.current[toskosing_stage] += 1
+                        self.peak[toskosing_stage] = max(
+                            self.peak[toskosing_stage],
+                            self.current[toskosing_stage])
+                    time.sleep(0.01)
+                    with self._lock:
+                        self.current[toskosing_stage] -= 1
+                    if fail:
+                        raise RuntimeError('{} failed'.format(name))
+        return _process
+
+
+def test_stage_limits():
+    counter = StageCounter()
+    pipeline = StagePipeline(6, stage_limits={
+        ToskosingStage.BUILD: 1,
+        ToskosingStage.PUSH: 2,
+    })
+
+    failures = pipeline.run({
+        'node-{}'.format(i): counter.process('node-{}'.format(i))
+        for i in range(12)
+    })
+
+    assert not failures
+    assert counter.peak[ToskosingStage.BUILD] == 1
+    assert counter.peak[ToskosingStage.PUSH] <= 2
+    assert counter.peak[ToskosingStage.PULL] <= 6
+
+
+def test_failures_collected():
+    counter = StageCounter()
+    pipeline = StagePipeline(2)
+
+    failures = pipeline.run({
+        'ok': counter.process('ok'),
+        'ko-1': counter.process('ko-1', fail=True),
+        'ko-2': counter.process('ko-2', fail=True),
+    })
+
+    assert set(failures.keys()) == {'ko-1', 'ko-2'}
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        StagePipeline(0)
+    with pytest.raises(ValueError):
+        StagePipeline(2, stage_limits={ToskosingStage.PULL: 0})
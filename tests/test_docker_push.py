@@ -0,0 +1,192 @@
+import random
+import threading
+import unittest.mock as mock
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from docker.errors import APIError
+from requests.exceptions import ConnectionError
+
+from app.common.exception import (DockerAuthenticationFailedError,
+                                  DockerOperationError)
+from app.docker.credentials import CredentialProvider
+from app.docker.manager import DockerManager
+from app.docker.push import (BACKOFF_CAP, PushErrorKind, PushProgress,
+                             backoff_delay, classify_exception,
+                             classify_push_error, push_image)
+
+LAYERS = ('aaa', 'bbb', 'ccc')
+
+
+class FakeRegistry:
+    """ A stand-in for a Docker Registry (behind the Docker client), which
+    fails the first pushes as scripted. """
+
+    def __init__(self, failures=(), credentials=None):
+        self._failures = list(failures)
+        self._credentials = credentials
+        self._lock = threading.Lock()
+        self.stored = set()
+        self.pushes = list()
+        self.images = self
+
+    def push(self, image, tag=None, auth_config=None, stream=False,
+             decode=False):
+        assert stream and decode
+        with self._lock:
+            self.pushes.append(auth_config)
+            failure = self._failures.pop(0) if self._failures else None
+        if isinstance(failure, Exception):
+            raise failure
+        return self._events(auth_config, failure)
+
+    def _events(self, auth, failure):
+        if self._credentials is not None and auth != self._credentials:
+            yield {'errorDetail': {'message': 'unauthorized: authentication \
+required'}, 'error': 'unauthorized: authentication required'}
+            return
+        yield {'status': 'The push refers to repository [test/maven]'}
+        for i, layer in enumerate(LAYERS):
+            if layer in self.stored:
+                yield {'status': 'Layer already exists', 'id': layer}
+                continue
+            if failure is not None and i == 1:
+                yield {'errorDetail': {'message': failure}, 'error': failure}
+                return
+            yield {'status': 'Pushing', 'id': layer,
+                   'progressDetail': {'current': 512, 'total': 1024}}
+            yield {'status': 'Pushing', 'id': layer,
+                   'progressDetail': {'current': 1024, 'total': 1024}}
+            yield {'status': 'Pushed', 'id': layer}
+            with self._lock:
+                self.stored.add(layer)
+        yield {'status': '1.0: digest: sha256:ddd size: 1234'}
+        yield {'aux': {'Tag': '1.0', 'Digest': 'sha256:ddd', 'Size': 1234}}
+
+
+def push(registry, **kwargs):
+    kwargs.setdefault('sleep', mock.Mock())
+    return push_image(registry, 'test/maven', tag='1.0', **kwargs)
+
+
+class TestErrorClassification:
+
+    @pytest.mark.parametrize('message, kind', [
+        ('denied: requested access to the resource is denied',
+         PushErrorKind.AUTHENTICATION),
+        ('unauthorized: authentication required',
+         PushErrorKind.AUTHENTICATION),
+        ('received unexpected HTTP status: 503 Service Unavailable',
+         PushErrorKind.TRANSIENT),
+        ('net/http: TLS handshake timeout', PushErrorKind.TRANSIENT),
+        ('write tcp: connection reset by peer', PushErrorKind.TRANSIENT),
+        ('toomanyrequests: rate limit exceeded', PushErrorKind.TRANSIENT),
+        ('An image does not exist locally with the tag: test/maven',
+         PushErrorKind.FATAL),
+    ])
+    def test_push_error(self, message, kind):
+        assert classify_push_error(message) == kind
+
+    def test_exceptions(self):
+        def api_error(status_code):
+            return APIError('error', response=mock.Mock(
+                status_code=status_code))
+
+        assert classify_exception(ConnectionError()) == \
+            PushErrorKind.TRANSIENT
+        assert classify_exception(api_error(503)) == PushErrorKind.TRANSIENT
+        assert classify_exception(api_error(401)) == \
+            PushErrorKind.AUTHENTICATION
+        assert classify_exception(api_error(404)) == PushErrorKind.FATAL
+
+
+def test_backoff():
+    rnd = random.Random(0)
+    for attempt in range(10):
+        delays = [backoff_delay(attempt, base=1.0, rnd=rnd)
+                  for _ in range(100)]
+        assert all(0 <= delay <= min(BACKOFF_CAP, 2 ** attempt)
+                   for delay in delays)
+        # jittered
+        assert len(set(delays)) > 1
+
+
+def test_progress():
+    clock = mock.Mock(side_effect=[0, 1, 2, 3, 4])
+    progress = PushProgress('test/maven:1.0', interval=100, clock=clock)
+    progress.update({'status': 'Pushing', 'id': 'aaa',
+                     'progressDetail': {'current': 1024, 'total': 2048}})
+    progress.update({'status': 'Pushed', 'id': 'aaa'})
+    progress.update({'status': 'Mounted from library/maven', 'id': 'bbb'})
+    assert progress.pushed == ['aaa', 'bbb']
+    assert progress.uploaded == 1024
+    assert progress.throughput() == 1024 / 4
+
+
+class TestPush:
+
+    def test_push(self):
+        registry = FakeRegistry()
+        progress = push(registry)
+        assert registry.stored == set(LAYERS)
+        assert progress.pushed == sorted(LAYERS)
+        assert progress.uploaded == 1024 * len(LAYERS)
+        assert progress.digest == 'sha256:ddd'
+
+    def test_transient_failures(self):
+        registry = FakeRegistry(failures=[
+            'received unexpected HTTP status: 502 Bad Gateway',
+            ConnectionError('Connection aborted.')])
+        sleep = mock.Mock()
+        progress = push(registry, sleep=sleep)
+        assert len(registry.pushes) == 3
+        assert sleep.call_count == 2
+        assert registry.stored == set(LAYERS)
+        # resumed, the layer pushed by the first attempt already exists
+        assert progress.layers['aaa'] == 'Layer already exists'
+
+    def test_max_attempts(self):
+        registry = FakeRegistry(failures=['i/o timeout'] * 10)
+        with pytest.raises(DockerOperationError):
+            push(registry, max_attempts=3)
+        assert len(registry.pushes) == 3
+
+    def test_fatal_failure(self):
+        registry = FakeRegistry(failures=['manifest invalid'])
+        sleep = mock.Mock()
+        with pytest.raises(DockerOperationError):
+            push(registry, sleep=sleep)
+        assert len(registry.pushes) == 1
+        assert not sleep.called
+
+    def test_authentication(self):
+        registry = FakeRegistry(credentials={'username': 'user'})
+        authenticate = mock.Mock(return_value={'username': 'user'})
+        push(registry, authenticate=authenticate)
+        authenticate.assert_called_once_with(None)
+        assert registry.pushes == [None, {'username': 'user'}]
+
+    def test_authentication_failed(self):
+        registry = FakeRegistry(credentials={'username': 'user'})
+        with pytest.raises(DockerAuthenticationFailedError):
+            push(registry)
+        authenticate = mock.Mock(return_value={'username': 'other'})
+        with pytest.raises(DockerAuthenticationFailedError):
+            push(registry, authenticate=authenticate)
+
+
+def test_concurrent_pushes_authenticate_once(tmpdir):
+    registry = FakeRegistry(credentials={'username': 'user'})
+    credentials = CredentialProvider(
+        environ={}, docker_config_path=str(tmpdir.join('config.json')))
+    with mock.patch('app.docker.manager.DockerClient'):
+        manager = DockerManager(credentials=credentials)
+    manager._client = registry
+
+    with mock.patch('app.docker.credentials.create_auth_interactive',
+                    return_value={'username': 'user'}) as prompt, \
+            ThreadPoolExecutor(max_workers=4) as executor:
+        for future in [executor.submit(manager._push_image, 'test/maven',
+                                       tag=str(i)) for i in range(8)]:
+            future.result()
+    assert prompt.call_count == 1
@@ -0,0 +1,70 @@
+import pytest
+
+import tests.commons as commons
+from app.common.exception import PlanningError
+from app.tosca.model.nodes import Container, Software
+from app.tosca.model.template import Template
+from app.tosca.parser import ToscaParser
+from app.tosca.planner import generate_plan
+
+
+def _position(waves):
+    return {
+        (node, operation): index
+        for index, wave in enumerate(waves)
+        for node, operation in wave
+    }
+
+
+@pytest.mark.parametrize('configs', commons.apps_data, indirect=True)
+class TestPlanner:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, model):
+        self._model = model
+
+    def test_generate_plan(self):
+        waves = generate_plan(self._model)
+        position = _position(waves)
+
+        nodes = [node for node in self._model.nodes
+                 if not getattr(node, 'is_manager', False)]
+        assert {node for node, _ in position} == \
+            {node.name for node in nodes}
+        assert sum(len(wave) for wave in waves) == len(position)
+
+        for node in nodes:
+            # the node's protocol is left untouched
+            assert node.protocol.is_reset()
+
+            for rel in node.relationships:
+                if rel.requirement in ('host', 'alive'):
+                    assert position[(node.name, 'Standard.create')] > \
+                        position[(rel.to.name, 'Standard.create')]
+                if rel.requirement in ('connection', 'dependency', 'host'):
+                    assert position[(node.name, 'Standard.start')] > \
+                        position[(rel.to.name, 'Standard.start')]
+
+    def test_parallel_waves(self):
+        waves = generate_plan(self._model)
+
+        # the nodes without requirements are created in the first wave
+        assert {node for node, _ in waves[0]} == {
+            node.name for node in self._model.nodes
+            if not getattr(node, 'is_manager', False) and
+            not isinstance(node, Software)}
+
+
+class TestPlannerErrors:
+
+    def test_cyclic_requirements(self):
+        tpl = Template('cyclic')
+        first, second = Container('first'), Container('second')
+        first.add_connection('second')
+        second.add_connection('first')
+        tpl.push(first)
+        tpl.push(second)
+        ToscaParser._add_pointer(tpl)
+
+        with pytest.raises(PlanningError):
+            generate_plan(tpl)
@@ -0,0 +1,87 @@
+import pickle
+
+import pytest
+
+from app.tosca.model import protocol
+from app.tosca.model.nodes import Container, Software, Volume
+
+
+class TestProtocol:
+
+    def test_shared_definition(self):
+        first, second = Software('first'), Software('second')
+        assert first.protocol is not second.protocol
+        assert first.protocol.definition is protocol.SOFTWARE_PROTOCOL
+        assert first.protocol.states is second.protocol.states
+
+        assert Container('c').protocol.definition is \
+            protocol.CONTAINER_PROTOCOL
+        assert Volume('v').protocol.definition is protocol.VOLUME_PROTOCOL
+
+    def test_independent_cursors(self):
+        first, second = Software('first'), Software('second')
+
+        state = first.protocol.execute_operation('Standard.create')
+        assert state.name == protocol.SOFTWARE_STATE_CREATED
+        assert first.protocol.current_state == state
+        assert second.protocol.is_reset()
+
+        assert first.protocol.execute_operation('Standard.start') is None
+        assert first.protocol.execute_operation('Standard.configure').name \
+            == protocol.SOFTWARE_STATE_CONFIGURED
+
+        first.protocol.reset()
+        assert first.protocol.is_reset()
+
+    def test_immutable_definition(self):
+        definition = protocol.CONTAINER_PROTOCOL
+        with pytest.raises(AttributeError):
+            definition.initial_state = definition.states[1]
+        with pytest.raises(AttributeError):
+            definition.states[0].transitions = ()
+        assert definition.find_state('created').transitions == tuple(
+            t for t in definition.transitions
+            if t.source.name == 'created')
+
+    def test_pickled_protocol(self):
+        node = Container('container')
+        node.protocol.execute_operation('Standard.create')
+
+        node = pickle.loads(pickle.dumps(node))
+        assert node.protocol.definition is protocol.CONTAINER_PROTOCOL
+        assert node.protocol.current_state is \
+            protocol.CONTAINER_PROTOCOL.find_state(
+                protocol.CONTAINER_STATE_CREATED)
+
+    def test_transition_lookup(self):
+        definition = protocol.SOFTWARE_PROTOCOL
+        configured = definition.find_state(protocol.SOFTWARE_STATE_CONFIGURED)
+
+        transition = configured.next_transition('Standard.delete')
+        assert transition.source is configured
+        assert transition.target is definition.find_state('deleted')
+        assert configured.next_transition('Standard.create') is None
+        assert definition.find_state('missing') is None
+
+    def test_simulate(self):
+        nodes = [Software('sw-{}'.format(i)) for i in range(3)] + \
+            [Container('container'), Volume('volume')]
+        nodes[0].protocol.execute_operation('Standard.create')
+
+        reached = protocol.simulate(
+            (node.protocol for node in nodes),
+            ['Standard.create', 'Standard.configure', 'Standard.start'])
+
+        assert reached[0] is None
+        assert [state.name for state in reached[1:3]] == \
+            [protocol.SOFTWARE_STATE_RUNNING] * 2
+        assert reached[3] is None and reached[4] is None
+        # the simulation doesn't change the current state
+        assert nodes[0].protocol.current_state.name == \
+            protocol.SOFTWARE_STATE_CREATED
+        assert all(node.protocol.is_reset() for node in nodes[1:])
+
+        assert [state.name for state in protocol.simulate(
+            [nodes[3].protocol, nodes[4].protocol], ['Standard.create'])] \
+            == [protocol.CONTAINER_STATE_CREATED,
+                protocol.VOLUME_STATE_CREATED]
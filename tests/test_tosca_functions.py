@@ -0,0 +1,110 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.common.exception import ParsingError
+from app.tosca.functions import resolve_functions
+from app.tosca.model.artifacts import File
+
+
+def _tosca(tpl):
+    return SimpleNamespace(topology_template=SimpleNamespace(tpl=tpl))
+
+
+class TestFunctionResolver:
+
+    def test_resolve(self):
+        tpl = {
+            'inputs': {
+                'port': {'default': 8000},
+                'branch': {'default': 'master'},
+            },
+            'node_templates': {
+                # referencing functions resolved later in the walk
+                'gui': {'properties': {
+                    'api_url': {'get_property': ['api', 'url']},
+                    'api_port': {'get_property': ['api', 'ports', 'api']},
+                }},
+                'api': {
+                    'properties': {
+                        'url': {'get_property': ['SELF', 'host']},
+                        'host': {'get_input': 'branch'},
+                        'ports': {'api': {'get_input': 'port'}},
+                    },
+                    'artifacts': {'data': 'data/db.json'},
+                    'interfaces': {'Standard': {'create': {'inputs': {
+                        'data': {'get_artifact': ['SELF', 'data']},
+                    }}}},
+                },
+            },
+            'outputs': {
+                'url': {'value': {'get_property': ['gui', 'api_url']}},
+            },
+        }
+
+        resolve_functions(_tosca(tpl), {'branch': 'dev'}, '/app')
+
+        nodes = tpl['node_templates']
+        assert nodes['api']['properties'] == {
+            'url': 'dev', 'host': 'dev', 'ports': {'api': 8000}}
+        assert nodes['gui']['properties'] == {
+            'api_url': 'dev', 'api_port': 8000}
+        data = nodes['api']['interfaces']['Standard']['create']['inputs']
+        assert isinstance(data['data'], File)
+        assert data['data'].file_path == os.path.abspath('/app/data/db.json')
+        assert tpl['outputs']['url']['value'] == 'dev'
+
+    def test_resolve_nested_value(self):
+        tpl = {'node_templates': {
+            'a': {'properties': {'copy': {'get_property': ['b', 'env']}}},
+            'b': {'properties': {'env': {'x': {'y': {'get_input': 'x'}}}}},
+        }}
+
+        resolve_functions(_tosca(tpl), {'x': 1}, '/app')
+        assert tpl['node_templates']['a']['properties']['copy'] == \
+            {'x': {'y': 1}}
+
+    def test_deep_templates(self):
+        depth = 5000
+        value = {'get_input': 'x'}
+        for _ in range(depth):
+            value = {'nested': value}
+        tpl = {'node_templates': {'a': {'properties': {'p': value}}}}
+
+        resolve_functions(_tosca(tpl), {'x': 1}, '/app')
+
+        value = tpl['node_templates']['a']['properties']['p']
+        for _ in range(depth):
+            value = value['nested']
+        assert value == 1
+
+    def test_long_chains(self):
+        size = 5000
+        properties = {'p0': {'get_input': 'x'}}
+        for i in range(1, size):
+            properties['p{}'.format(i)] = \
+                {'get_property': ['SELF', 'p{}'.format(i - 1)]}
+        tpl = {'node_templates': {'a': {'properties': properties}}}
+
+        resolve_functions(_tosca(tpl), {'x': 1}, '/app')
+        assert set(properties.values()) == {1}
+
+    def test_cyclic_references(self):
+        tpl = {'node_templates': {
+            'a': {'properties': {'p': {'get_property': ['b', 'p']}}},
+            'b': {'properties': {'p': {'get_property': ['a', 'p']}}},
+        }}
+
+        with pytest.raises(ParsingError) as err:
+            resolve_functions(_tosca(tpl), {}, '/app')
+        assert 'node_templates.a.properties.p' in str(err.value)
+        assert 'node_templates.b.properties.p' in str(err.value)
+
+    def test_missing_reference(self):
+        tpl = {'node_templates': {
+            'a': {'properties': {'p': {'get_property': ['b', 'p']}}},
+        }}
+
+        with pytest.raises(ParsingError):
+            resolve_functions(_tosca(tpl), {}, '/app')
@@ -1,8 +1,24 @@
+import hashlib
+import os
+import unittest.mock as mock
+
 import pytest
+import yaml
+from toscaparser.tosca_template import ToscaTemplate
+from toscaparser.utils.yamlparser import load_yaml
 
 import tests.helpers as helpers
 import tests.commons as commons
 
+from benchmarks.generator import Topology, generate
+
+from app.common.exception import ParsingError
+from app.tosca.definitions import DefinitionCache
+from app.tosca import tosker_profile
+from app.tosca.model import fingerprint
+from app.tosca.model.nodes import Container, Software, Volume
+from app.tosca.model.template import Template
+from app.tosca.model_cache import ModelCache
 from app.tosca.parser import ToscaParser
 
 
@@ -20,3 +36,318 @@ class TestToscaParser:
             data['csar_path'])
 
         ToscaParser().build_model(manifest_path)
+
+    def test_tosca_parser_cached_definitions(self, data, tmpdir):
+        manifest_path = helpers.compute_manifest_path(
+            self._context,
+            data['csar_path'])
+        cache = DefinitionCache(str(tmpdir.mkdir('cache')))
+
+        expected = ToscaParser().build_model(manifest_path)
+        ToscaParser(definition_cache=cache).build_model(manifest_path)
+
+        # a new cache on the same dir (i.e. a later run) never parses
+        # the unchanged imports
+        cache = DefinitionCache(os.path.dirname(cache.path))
+        with mock.patch('app.tosca.definitions.load_yaml') as load_yaml:
+            model = ToscaParser(definition_cache=cache).build_model(
+                manifest_path)
+            load_yaml.assert_not_called()
+
+        assert {str(node) for node in model.nodes} == \
+            {str(node) for node in expected.nodes}
+
+    def test_tosca_parser_changed_definitions(self, data, tmpdir):
+        manifest_path = helpers.compute_manifest_path(
+            self._context,
+            data['csar_path'])
+        cache = DefinitionCache(str(tmpdir.mkdir('cache')))
+        ToscaParser(definition_cache=cache).build_model(manifest_path)
+
+        for entry in ToscaParser().build_model(manifest_path).imports:
+            for import_path in entry.values():
+                with open(import_path, 'a') as f:
+                    f.write('\n# changed\n')
+
+        cache = DefinitionCache(os.path.dirname(cache.path))
+        with mock.patch('app.tosca.definitions.load_yaml',
+                        wraps=load_yaml) as loader:
+            ToscaParser(definition_cache=cache).build_model(manifest_path)
+            assert loader.called
+
+    def test_tosca_parser_cached_model(self, data, tmpdir):
+        cache = ModelCache(str(tmpdir.mkdir('cache')))
+        ToscaParser(model_cache=cache).build_model(
+            helpers.compute_manifest_path(
+                str(tmpdir.mkdir('first_run')), data['csar_path']))
+
+        # a later run, extracted in another dir
+        manifest_path = helpers.compute_manifest_path(
+            self._context, data['csar_path'])
+        with mock.patch('app.tosca.parser.ToscaTemplate',
+                        wraps=ToscaTemplate) as tosca:
+            model = ToscaParser(model_cache=cache).build_model(manifest_path)
+            tosca.assert_not_called()
+        expected = ToscaParser().build_model(manifest_path)
+
+        assert model.tmp_dir == expected.tmp_dir
+        assert model.imports == expected.imports
+        assert {str(node) for node in model.nodes} == \
+            {str(node) for node in expected.nodes}
+        for software in model.software:
+            assert software.host_container in model.containers
+            for artifact in software.artifacts:
+                assert os.path.isfile(artifact.file_path)
+        for container in expected.containers:
+            assert model[container.name]['ports'] == container['ports']
+
+    def test_tosca_parser_cached_model_inputs(self, data, tmpdir):
+        manifest_path = helpers.compute_manifest_path(
+            self._context, data['csar_path'])
+        cache = ModelCache(str(tmpdir.mkdir('cache')))
+        ToscaParser(model_cache=cache).build_model(manifest_path)
+
+        assert cache.load(manifest_path) is not None
+        assert cache.load(manifest_path, inputs={'port': 1}) is None
+
+    def test_tosca_parser_indexes(self, data):
+        manifest_path = helpers.compute_manifest_path(
+            self._context,
+            data['csar_path'])
+        model = ToscaParser().build_model(manifest_path)
+
+        nodes = list(model.nodes)
+        assert list(model.containers) == \
+            [n for n in nodes if isinstance(n, Container)]
+        assert list(model.software) == \
+            [n for n in nodes if isinstance(n, Software)]
+        assert list(model.volumes) == \
+            [n for n in nodes if isinstance(n, Volume)]
+        for container in model.containers:
+            assert container.hosted == [
+                n for n in model.software if n.host_container == container]
+
+
+class TestTemplateIndexes:
+
+    def test_push(self):
+        template = Template('app')
+        container = Container('container')
+        software = Software('software')
+        software.host = 'container'
+        template.push(container)
+        template.push(software)
+        template.push(Volume('volume'))
+
+        assert list(template.containers) == [container]
+        assert list(template.software) == [software]
+
+        # replacing a node replaces it in the index of its kind
+        software = Software('software')
+        template.push(software)
+        assert list(template.software) == [software]
+        template.push(Volume('software'))
+        assert list(template.software) == []
+        assert [v.name for v in template.volumes] == ['volume', 'software']
+
+
+class TestTemplateFingerprints:
+
+    @staticmethod
+    def _template(nodes_order=None):
+        container = Container('container')
+        volume = Volume('volume')
+        api = Software('api')
+        api.host = 'container'
+        api.add_depend('volume')
+        gui = Software('gui')
+        gui.host = 'container'
+        gui.add_connection('api')
+        api.add_connection('gui')  # a cycle
+
+        template = Template('app')
+        nodes = [container, volume, api, gui]
+        for i in nodes_order or range(len(nodes)):
+            template.push(nodes[i])
+        return template
+
+    def test_stable(self):
+        expected = self._template()
+        template = self._template(nodes_order=[3, 2, 1, 0])
+
+        # whatever node the computation starts from
+        assert template.fingerprint('gui') == expected.fingerprint('gui')
+        assert template.fingerprint() == expected.fingerprint()
+        for node in template.nodes:
+            assert template.fingerprint(node.name) == \
+                expected.fingerprint(node.name)
+
+    def test_dependencies(self):
+        template = self._template()
+        fingerprints = {node.name: template.fingerprint(node.name)
+                        for node in template.nodes}
+        root = template.fingerprint()
+
+        template['volume'].size = '1G'
+        template.invalidate_fingerprints()
+
+        # the volume and its (transitive) dependents changed
+        assert template.fingerprint('container') == fingerprints['container']
+        for name in ('volume', 'api', 'gui'):
+            assert template.fingerprint(name) != fingerprints[name]
+        assert template.fingerprint() != root
+
+    def test_memoized(self):
+        template = self._template()
+        with mock.patch.object(fingerprint, 'describe_node',
+                               wraps=fingerprint.describe_node) as describe:
+            template.fingerprint('gui')
+            template.fingerprint()
+            assert describe.call_count == 4
+
+            # pushing a node drops the memoized fingerprints
+            template.push(Volume('other'))
+            template.fingerprint('gui')
+            assert describe.call_count == 8
+
+    def test_unknown_node(self):
+        with pytest.raises(ValueError):
+            self._template().fingerprint('unknown')
+
+
+def _describe_model(model):
+    """ Returns the description of a model, for comparing models. """
+
+    return {
+        'name': model.name,
+        'description': model.description,
+        'imports': model.imports,
+        'outputs': [(o.name, o.value) for o in model.outputs],
+        'nodes': [
+            (node.name, type(node).__name__,
+             node.protocol.definition.name if node.protocol else None,
+             model.describe_node(node.name))
+            for node in model.nodes],
+        'hosted': {c.name: [s.name for s in c.hosted]
+                   for c in model.containers},
+    }
+
+
+_parity_csars = [
+    helpers.full_path('thinking/thinking.csar'),
+    helpers.full_path('thinking-v2/thinking-v2.csar'),
+]
+
+
+@pytest.mark.parametrize('csar_path', _parity_csars)
+class TestFastParser:
+
+    def test_parity(self, csar_path, tmpdir):
+        manifest_path = helpers.compute_manifest_path(
+            str(tmpdir.mkdir('app')), csar_path)
+
+        expected = ToscaParser().build_model(manifest_path)
+        model = ToscaParser(strict=False).build_model(manifest_path)
+        assert _describe_model(model) == _describe_model(expected)
+
+    def test_parity_software_host(self, csar_path, tmpdir):
+        # a software node hosted on another software node
+        manifest_path = helpers.compute_manifest_path(
+            str(tmpdir.mkdir('app')), csar_path)
+        tpl = load_yaml(manifest_path)
+        nodes = tpl['topology_template']['node_templates']
+        nodes['gui']['requirements'] = [
+            {'host': 'api'} if 'host' in requirement else requirement
+            for requirement in nodes['gui']['requirements']]
+        with open(manifest_path, 'w') as f:
+            yaml.safe_dump(tpl, f)
+
+        expected = ToscaParser().build_model(manifest_path)
+        model = ToscaParser(strict=False).build_model(manifest_path)
+        assert model['gui'].host_container.name == \
+            expected['api'].host_container.name
+        assert _describe_model(model) == _describe_model(expected)
+
+    def test_cached_model_mode(self, csar_path, tmpdir):
+        manifest_path = helpers.compute_manifest_path(
+            str(tmpdir.mkdir('app')), csar_path)
+        cache = ModelCache(str(tmpdir.mkdir('cache')))
+
+        ToscaParser(model_cache=cache, strict=False).build_model(
+            manifest_path)
+        with mock.patch('app.tosca.parser.ToscaTemplate',
+                        wraps=ToscaTemplate) as tosca:
+            ToscaParser(model_cache=cache).build_model(manifest_path)
+        # the strict mode never reuses the models of the fast mode
+        assert tosca.called
+
+
+class TestFastParserValidation:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, tmpdir):
+        self._manifest_path = helpers.compute_manifest_path(
+            str(tmpdir.mkdir('app')), _parity_csars[0])
+        self._tpl = load_yaml(self._manifest_path)
+
+    def _parse(self):
+        with open(self._manifest_path, 'w') as f:
+            yaml.safe_dump(self._tpl, f)
+        return ToscaParser(strict=False).build_model(self._manifest_path)
+
+    def _nodes(self):
+        return self._tpl['topology_template']['node_templates']
+
+    def test_unknown_node_type(self):
+        self._nodes()['api']['type'] = 'tosker.nodes.Unknown'
+        with pytest.raises(ParsingError):
+            self._parse()
+
+    def test_unknown_property(self):
+        self._nodes()['maven'].setdefault('properties', {})['unknown'] = 1
+        with pytest.raises(ParsingError):
+            self._parse()
+
+    def test_missing_requirement_target(self):
+        self._nodes()['api']['requirements'] = [{'host': 'unknown'}]
+        with pytest.raises(ParsingError):
+            self._parse()
+
+    def test_invalid_requirement_target(self):
+        # software nodes are hosted on container or software nodes only
+        self._nodes()['api']['requirements'] = [{'host': 'dbvolume'}]
+        with pytest.raises(ParsingError):
+            self._parse()
+
+    def test_too_many_hosts(self):
+        self._nodes()['api']['requirements'] += [{'host': 'node'}]
+        with pytest.raises(ParsingError):
+            self._parse()
+
+    def test_invalid_version(self):
+        self._tpl['tosca_definitions_version'] = 'tosca_simple_yaml_0_1'
+        with pytest.raises(ParsingError):
+            self._parse()
+
+
+def test_tosker_profile():
+    path = helpers.full_path('tosker-types.yaml')
+    with open(path, 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == \
+            tosker_profile.TOSKER_TYPES_DIGEST
+
+    # the precompiled profile is up-to-date
+    assert tosker_profile.compile_node_types(load_yaml(path)) == \
+        tosker_profile.TOSKER_NODE_TYPES
+
+
+def test_fast_parser_generated_app(tmpdir):
+    csar_path, _ = generate(str(tmpdir.mkdir('csar')), Topology(
+        containers=4, software=3, volumes=2, connections=1.5))
+    manifest_path = helpers.compute_manifest_path(
+        str(tmpdir.mkdir('app')), csar_path)
+
+    expected = ToscaParser().build_model(manifest_path)
+    model = ToscaParser(strict=False).build_model(manifest_path)
+    assert len(list(model.nodes)) == 4 + 4 * 3 + 2
+    assert _describe_model(model) == _describe_model(expected)
@@ -3,7 +3,8 @@ import pytest
 import os
 
 import tests.commons as commons
-from app.tosca.validator import validate_csar
+from app.common.exception import FileNotFoundError
+from app.tosca.validator import open_csar, validate_csar
 
 
 base_path = os.path.join(
@@ -25,3 +26,25 @@ def test_validate_tosca_manifest(data):
     except Exception as err:
         print(err)
         assert False
+
+
+@pytest.mark.parametrize('data', commons.apps_data)
+def test_validate_opened_csar(data):
+    """ Test the validation of an archive shared with the extraction. """
+
+    with open_csar(data['csar_path']) as archive:
+        csar_metadata = validate_csar(data['csar_path'], archive=archive)
+        assert csar_metadata['Entry-Definitions'] == 'thinking.yaml'
+
+        # the archive is still open and can be extracted
+        assert archive.read(csar_metadata['Entry-Definitions'])
+
+
+def test_open_invalid_csar(tmpdir):
+    with pytest.raises(FileNotFoundError):
+        open_csar(str(tmpdir.join('missing.csar')))
+
+    not_an_archive = tmpdir.join('thinking.csar')
+    not_an_archive.write('not an archive')
+    with pytest.raises(FileNotFoundError):
+        open_csar(str(not_an_archive))
@@ -1,9 +1,15 @@
+import os
+import unittest.mock as mock
+
 import pytest
 
 import tests.commons as commons
+from app.common import constants
+from app.common.exception import DockerOperationError, FatalError
 
 from app.toskose import Toskoserizator
 from app.toskose import ToscaParser
+from app.tosca.validator import validate_csar
 
 
 @pytest.fixture
@@ -22,3 +28,119 @@ class TestToskoserizatorPipeline:
             data['toskose_config'],
             enable_push=False
         )
+
+
+@pytest.mark.parametrize('data', commons.apps_data)
+class TestToskoserizatorConcurrentPipeline:
+
+    @pytest.fixture(autouse=True)
+    def initializer(self, tmpdir):
+        self._output = str(tmpdir.mkdir('toskose_out'))
+
+    def test_toskoserizator_jobs(self, data):
+        with mock.patch('app.toskose.DockerManager') as manager:
+            Toskoserizator().toskosed(
+                data['csar_path'],
+                data['toskose_config'],
+                output_path=self._output,
+                enable_push=False,
+                jobs=4
+            )
+
+            calls = manager.return_value.toskose_image.call_args_list
+            toskosed = {call[1]['dst_image'] for call in calls}
+            assert len(calls) == len(toskosed)
+            assert os.path.isfile(os.path.join(
+                self._output, constants.DEFAULT_DOCKER_COMPOSE_FILENAME))
+
+    @pytest.mark.parametrize('jobs', [1, 4])
+    def test_toskoserizator_jobs_failures(self, data, jobs):
+        with mock.patch('app.toskose.DockerManager') as manager:
+            manager.return_value.toskose_image.side_effect = \
+                DockerOperationError('Failed to build image')
+
+            with pytest.raises(FatalError):
+                Toskoserizator().toskosed(
+                    data['csar_path'],
+                    data['toskose_config'],
+                    output_path=self._output,
+                    enable_push=False,
+                    jobs=jobs
+                )
+
+            # every container node is toskosed, even after a failure
+            assert manager.return_value.toskose_image.call_count > 1
+            assert not os.path.exists(os.path.join(
+                self._output, constants.DEFAULT_DOCKER_COMPOSE_FILENAME))
+
+    def test_toskoserizator_cache(self, data, tmpdir):
+        cache_dir = str(tmpdir.mkdir('cache'))
+        with mock.patch('app.toskose.DockerManager'), \
+                mock.patch('app.toskose.validate_csar',
+                           wraps=validate_csar) as validate:
+            for _ in range(2):
+                Toskoserizator(cache_dir=cache_dir).toskosed(
+                    data['csar_path'],
+                    data['toskose_config'],
+                    output_path=self._output,
+                    enable_push=False
+                )
+
+            # the second run reuses the cached validation
+            assert validate.call_count == 1
+
+        # the completed configuration is never written in the cache
+        for _, _, names in os.walk(cache_dir):
+            assert constants.DEFAULT_TOSKOSE_CONFIG_FILENAME not in names
+
+    def test_toskoserizator_cache_failure(self, data, tmpdir):
+        cache_dir = str(tmpdir.mkdir('cache'))
+        with mock.patch('app.toskose.DockerManager') as manager, \
+                mock.patch('app.toskose.evict_caches') as evict:
+            manager.return_value.toskose_image.side_effect = \
+                DockerOperationError('Failed to build image')
+
+            with pytest.raises(FatalError):
+                Toskoserizator(cache_dir=cache_dir).toskosed(
+                    data['csar_path'],
+                    data['toskose_config'],
+                    output_path=self._output,
+                    enable_push=False
+                )
+
+            # the cache is bounded even when the run fails
+            assert evict.called
+
+    def test_toskoserizator_previous_snapshot(self, data):
+        # the default supervisord ports are generated once per process
+        port = constants.port
+        with mock.patch('app.toskose.DockerManager') as manager:
+            Toskoserizator().toskosed(
+                data['csar_path'],
+                data['toskose_config'],
+                output_path=self._output,
+                enable_push=False
+            )
+            snapshot_path = os.path.join(
+                self._output, constants.DEFAULT_SNAPSHOT_FILENAME)
+            assert os.path.isfile(snapshot_path)
+            assert manager.return_value.toskose_image.called
+            compose_path = os.path.join(
+                self._output, constants.DEFAULT_DOCKER_COMPOSE_FILENAME)
+            with open(compose_path) as f:
+                compose = f.read()
+
+            # nothing changed since the previous run
+            manager.reset_mock()
+            constants.port = port
+            Toskoserizator().toskosed(
+                data['csar_path'],
+                data['toskose_config'],
+                output_path=self._output,
+                enable_push=False,
+                previous_snapshot=snapshot_path
+            )
+            manager.return_value.toskose_image.assert_not_called()
+            # the unaffected container nodes are still in the compose file
+            with open(compose_path) as f:
+                assert f.read() == compose